@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+"""
+Gemeinsame Hilfen der Benchmarks: Zeitmessung, Ersatz-Hardware, Berichte.
+
+Die Benchmarks werden aus dem Projektverzeichnis als Modul gestartet:
+    python -m benchmarks.microbench
+    python -m benchmarks.soak --cycles 2000
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# =============================================
+# Ersatz für Kamera, GUI und serielle Verbindung
+# =============================================
+
+
+class StubCamera:
+    """Kamera-Ersatz, der Aufnahmen nur zählt (ohne Liste, damit nichts wächst)."""
+
+    started = True
+    sensor_resolution = (4056, 3040)
+
+    def __init__(self):
+        self.capture_count = 0
+
+    def set_controls(self, controls):
+        pass
+
+    def capture_file(self, filepath):
+        self.capture_count += 1
+
+    def capture_array(self, stream="main"):
+        return None
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StubRequest:
+    """Ersatz für den CompletedRequest von Picamera2.capture_request()."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def make_array(self, stream="main"):
+        return self.array
+
+    def get_metadata(self):
+        return {}
+
+    def release(self):
+        pass
+
+
+class StubImageCamera(StubCamera):
+    """
+    Kamera-Ersatz, der kleine echte Bilder liefert, damit Registrierung,
+    Taktsteuerung, Würfel und Encoder mitlaufen. Der Bildinhalt wandert von
+    Aufnahme zu Aufnahme um wenige Pixel, wie durch das Umkehrspiel.
+    """
+
+    camera_config = {"main": {"format": "BGR888"}}
+
+    def __init__(self, size=(160, 120)):
+        super().__init__()
+        self.size = size
+        rng = np.random.default_rng(0)
+        self._scene = rng.integers(0, 256, (size[1] + 4, size[0] + 4, 3), np.uint8)
+
+    def frame(self):
+        self.capture_count += 1
+        dy, dx = self.capture_count % 5, self.capture_count // 5 % 5
+        return self._scene[dy : dy + self.size[1], dx : dx + self.size[0]]
+
+    def capture_file(self, filepath):
+        Image.fromarray(self.frame()).save(filepath, format="JPEG", quality=80)
+
+    def capture_array(self, stream="main"):
+        return self.frame()
+
+    def capture_request(self):
+        return StubRequest(self.frame())
+
+
+class FakeText:
+    """Minimaler Ersatz für das Tk-Text-Widget der GUI."""
+
+    def __init__(self, retain):
+        self.retain = retain
+        self.lines = 0
+        self.chars = 0
+        self._content = []
+
+    def winfo_exists(self):
+        return True
+
+    def insert(self, index, text):
+        self.lines += 1
+        self.chars += len(text)
+        if self.retain:
+            # Das echte Widget behält jede Zeile bis zum Programmende
+            self._content.append(text)
+
+    def see(self, index):
+        pass
+
+
+class FakeGui:
+    """
+    Stellt log_text/after für den TextWidgetHandler sowie get_repeats/
+    get_pause_minutes für den CameraSerialManager bereit. after() führt
+    sofort aus, statt auf die Tk-Hauptschleife zu warten.
+    """
+
+    def __init__(self, repeats=2, pause_minutes=1, retain=False):
+        self.repeats = repeats
+        self.pause_minutes = pause_minutes
+        self.log_text = FakeText(retain)
+
+    def after(self, ms, func, *args):
+        func(*args)
+
+    def get_repeats(self):
+        return self.repeats
+
+    def get_pause_minutes(self):
+        return self.pause_minutes
+
+
+class LineSerial:
+    """Serieller Ersatz, der vorgegebene Zeilen liefert und Gesendetes zählt."""
+
+    def __init__(self, lines):
+        self.is_open = True
+        self.lines = [line.encode("utf-8") + b"\r\n" for line in lines]
+        self.position = 0
+        self.sent = 0
+
+    def rewind(self):
+        self.position = 0
+
+    @property
+    def in_waiting(self):
+        if self.position < len(self.lines):
+            return len(self.lines[self.position])
+        return 0
+
+    def readline(self):
+        line = self.lines[self.position]
+        self.position += 1
+        return line
+
+    def write(self, data):
+        self.sent += 1
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def make_manager(workdir, serial_connection, gui=None, clock=None, picam=None):
+    """CameraSerialManager mit Ersatz-Hardware und Journal/Bildern in workdir."""
+    from packages.camera_serial_manager import CameraSerialManager
+    from packages.journal import EventJournal
+
+    manager = CameraSerialManager(
+        gui=gui or FakeGui(),
+        serial_connection=serial_connection,
+        picam=picam or StubCamera(),
+        clock=clock,
+        journal=EventJournal(os.path.join(workdir, "journal"), clock=clock or time),
+    )
+    manager.images_dir = workdir
+    return manager
+
+
+def attach_gui(gui):
+    """Hängt die (Ersatz-)GUI an den Logger, wie es Paparazzo.__init__ tut."""
+    from packages.logger import set_gui_instance, setup_logging
+
+    setup_logging()
+    set_gui_instance(gui)
+
+
+# =============================================
+# Messung und Berichte
+# =============================================
+
+
+def measure(func, number, repeat=5, setup=None):
+    """
+    Ruft func number-mal auf, repeat Durchgänge. Gibt Zeiten je Aufruf in
+    Mikrosekunden zurück (bester Durchgang und Median).
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    best = min(timings)
+    median = statistics.median(timings)
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_us": round(best * 1e6, 3),
+        "median_us": round(median * 1e6, 3),
+        "ops_per_s": round(1 / median) if median > 0 else None,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(report, output=None):
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def compare(report, baseline_path, key="median_us"):
+    """Gibt die Veränderung gegenüber einem früheren Bericht aus."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nVergleich mit {baseline_path} ({baseline.get('env', {}).get('commit')}):")
+    for name, result in report.get("cases", {}).items():
+        old = baseline.get("cases", {}).get(name)
+        if not old or not old.get(key):
+            print(f"  {name:<24} neu")
+            continue
+        change = (result[key] - old[key]) / old[key] * 100
+        print(
+            f"  {name:<24} {old[key]:>10.2f} -> {result[key]:>10.2f} µs ({change:+.1f} %)"
+        )
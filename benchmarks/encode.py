@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+Vergleich der Bild-Encoder (packages/encoders.py) an einem synthetischen
+Well-Bild in Ausgabegröße der Platte. Je Backend und Anzahl Worker wird
+eine Platte voll Bilder über den Pool kodiert und berichtet:
+
+    ms je Bild, MB/s (unkomprimierte Eingabe), Bytes je Bild, Kompression
+
+    python -m benchmarks.encode --workers 1,3 --output encode.json
+    python -m benchmarks.encode --backends jpeg,png --compare encode.json
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import compare, environment, write_report
+from packages.config import PLATE_OUTPUT_SIZES, PLATE_TYPE, TOTAL_STATIONS
+from packages.encoders import ENCODERS, ImageEncoder
+
+
+def synthetic_frame(width, height, seed=0):
+    """Heller Hintergrund mit Verlauf, dunklen Kolonien und Sensorrauschen."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = 180 + 30 * (x / width) - 20 * (y / height)
+    for _ in range(40):
+        cy, cx = rng.uniform(0, height), rng.uniform(0, width)
+        radius = rng.uniform(10, 60)
+        image -= 90 * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * radius**2))
+    image = image[..., None] * np.array([1.0, 0.95, 0.85], dtype=np.float32)
+    image += rng.normal(0, 3, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def bench_backend(frame, backend, workers, pool, images, repeat, workdir):
+    encoder = ImageEncoder(backend, workers=workers, pool=pool)
+    timings = []
+    sizes = []
+    try:
+        for run in range(repeat):
+            start = time.perf_counter()
+            futures = [
+                encoder.submit(
+                    frame, encoder.path_for(os.path.join(workdir, f"{run}_{i}.x"))
+                )
+                for i in range(images)
+            ]
+            sizes = [future.result() for future in futures]
+            timings.append((time.perf_counter() - start) / images)
+    finally:
+        encoder.shutdown()
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+
+    median = statistics.median(timings)
+    mean_bytes = sum(sizes) / len(sizes)
+    return {
+        "backend": backend,
+        "workers": workers,
+        "pool": pool,
+        "number": images,
+        "repeat": repeat,
+        "best_us": round(min(timings) * 1e6, 1),
+        "median_us": round(median * 1e6, 1),
+        "mb_per_s": round(frame.nbytes / median / 1e6, 1),
+        "bytes_per_image": round(mean_bytes),
+        "compression_ratio": round(frame.nbytes / mean_bytes, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergleich der Bild-Encoder")
+    parser.add_argument("--backends", default=",".join(ENCODERS), help="kommagetrennt")
+    parser.add_argument(
+        "--workers",
+        default=f"1,{max(1, (os.cpu_count() or 1) - 1)}",
+        help="kommagetrennte Anzahl Worker",
+    )
+    parser.add_argument("--pool", choices=("thread", "process"), default="thread")
+    parser.add_argument(
+        "--size",
+        default="x".join(map(str, PLATE_OUTPUT_SIZES[PLATE_TYPE])),
+        help="Breite x Höhe des Testbilds",
+    )
+    parser.add_argument(
+        "--images", type=int, default=TOTAL_STATIONS, help="Bilder je Durchgang"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Bericht zusätzlich als JSON speichern")
+    parser.add_argument("--compare", help="früheren JSON-Bericht vergleichen")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    frame = synthetic_frame(width, height)
+    worker_counts = sorted({int(value) for value in args.workers.split(",")})
+
+    cases = {}
+    with tempfile.TemporaryDirectory(prefix="paparazzo_encode_") as tmp:
+        for backend in args.backends.split(","):
+            for workers in worker_counts:
+                cases[f"{backend}_w{workers}"] = bench_backend(
+                    frame, backend, workers, args.pool, args.images, args.repeat, tmp
+                )
+
+    report = {
+        "benchmark": "encode",
+        "env": environment(),
+        "frame": {"width": width, "height": height, "bytes": frame.nbytes},
+        "cases": cases,
+    }
+    write_report(report, args.output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
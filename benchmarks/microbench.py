@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Mikro-Benchmarks der Python-Pfade, die pro Station bzw. Zeile laufen:
+
+    log_message     mit Datei- und GUI-Handler (Ersatz-Widget)
+    poll_frames     Zeilen lesen, Rahmen <...> erkennen, Journal-Eintrag
+    photo_path      Position aus MOVE_COUNT und Dateiname der Aufnahme
+    take_photo      über den Kameradienst mit Ersatz-Kamera
+
+    python -m benchmarks.microbench --output bench.json
+    python -m benchmarks.microbench --compare bench.json
+"""
+
+import argparse
+import tempfile
+
+from benchmarks.common import (FakeGui, LineSerial, attach_gui, compare,
+                               environment, make_manager, measure,
+                               write_report)
+from packages.config import TOTAL_STATIONS
+
+
+def bench_log_message(number, repeat):
+    from packages.logger import log_message
+
+    return measure(lambda: log_message("Benchmark-Meldung", "info"), number, repeat)
+
+
+def bench_poll_frames(manager, number, repeat):
+    # Je Durchlauf number Zeilen: Rauschen, unbekannte und bekannte Rahmen
+    pattern = ["Debug-Ausgabe ohne Rahmen", "<PROFILE_SET>", "<>", "<STATUS_IDLE>"]
+    lines = [pattern[i % len(pattern)] for i in range(number - 1)] + ["<ABORTED>"]
+    link = LineSerial(lines)
+    manager.serial_connection = link
+
+    result = measure(manager.poll_arduino, 1, repeat, setup=link.rewind)
+    for key in ("best_us", "median_us"):
+        result[key] = round(result[key] / number, 3)
+    result["ops_per_s"] = round(1e6 / result["median_us"])
+    result["number"] = number
+    return result
+
+
+def bench_photo_path(manager, number, repeat):
+    def step():
+        manager.MOVE_COUNT = (manager.MOVE_COUNT + 1) % TOTAL_STATIONS
+        manager.photo_path()
+
+    return measure(step, number, repeat)
+
+
+def bench_take_photo(manager, number, repeat):
+    def step():
+        manager.MOVE_COUNT = (manager.MOVE_COUNT + 1) % TOTAL_STATIONS
+        manager.take_photo()
+
+    return measure(step, number, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mikro-Benchmarks")
+    parser.add_argument("--output", help="Bericht zusätzlich als JSON speichern")
+    parser.add_argument("--compare", help="früheren JSON-Bericht vergleichen")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Faktor für die Anzahl der Aufrufe"
+    )
+    args = parser.parse_args()
+
+    def n(count):
+        return max(1, int(count * args.scale))
+
+    gui = FakeGui()
+    attach_gui(gui)
+
+    cases = {}
+    with tempfile.TemporaryDirectory(prefix="paparazzo_bench_") as tmp:
+        manager = make_manager(tmp, LineSerial([]), gui=gui)
+        manager.setup_run_directory()
+        manager.setup_cycle_directory()
+        # Auswertung der Bilder gehört nicht zu diesen Pfaden
+        manager.registrar = None
+        manager.cube_writer = None
+        manager.cadence = None
+        manager.eta = None
+        if manager.encoder is not None:
+            manager.encoder.shutdown()
+            manager.encoder = None
+
+        cases["log_message"] = bench_log_message(n(20000), args.repeat)
+        cases["poll_frames"] = bench_poll_frames(manager, n(20000), args.repeat)
+        cases["photo_path"] = bench_photo_path(manager, n(100000), args.repeat)
+        cases["take_photo"] = bench_take_photo(manager, n(2000), args.repeat)
+
+        manager.camera.shutdown()
+        manager.journal.close()
+
+    report = {"benchmark": "microbench", "env": environment(), "cases": cases}
+    write_report(report, args.output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+"""
+Dauertest: spielt tausende simulierte Cycles über die virtuelle Uhr in einen
+CameraSerialManager ein (Ersatz-Kamera, Ersatz-GUI) und misst unter
+tracemalloc in regelmäßigen Abständen:
+
+    Python-Heap (aktuell/Spitze), RSS, offene Dateideskriptoren,
+    Threads, Handler am Logger "Paparazzo" und Zeilen im GUI-Log
+
+Der Bericht enthält das Speicherwachstum je Cycle (lineare Regression nach
+der Einschwingphase), die größten Zuwächse nach Quelltextzeile und ob
+Threads, Handler oder Dateideskriptoren mehr geworden sind.
+
+Standardmäßig ist die Auswertung der Bilder abgeschaltet. Mit --features
+laufen Registrierung, Taktsteuerung, Würfel (in kleiner Auflösung), Restzeit
+und Encoder mit kleinen Ersatzbildern mit; die Bilder vorletzter Cycles
+werden dabei gelöscht, damit der Test nicht die Platte füllt.
+
+    python -m benchmarks.soak --cycles 2000 --output soak.json
+    python -m benchmarks.soak --cycles 500 --features --encoder jpeg
+"""
+
+import argparse
+import gc
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.common import (FakeGui, StubImageCamera, attach_gui,
+                               environment, make_manager, write_report)
+from packages.config import ENCODER_BACKEND
+from packages.serial_transcript import (ReplaySerial, VirtualClock,
+                                        load_transcript, synthesize_transcript)
+
+
+def open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def slope(points):
+    """Steigung der Ausgleichsgeraden durch (x, y)-Punkte."""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+class Sampler:
+    def __init__(self, manager, gui, every):
+        self.manager = manager
+        self.gui = gui
+        self.every = every
+        self.samples = []
+        self.snapshot = None
+        self.logger = logging.getLogger("Paparazzo")
+
+    def sample(self, cycle):
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        self.samples.append(
+            {
+                "cycle": cycle,
+                "traced_bytes": current,
+                "traced_peak_bytes": peak,
+                "rss_bytes": rss_bytes(),
+                "fds": open_fds(),
+                "threads": threading.active_count(),
+                "handlers": len(self.logger.handlers),
+                "gui_log_lines": self.gui.log_text.lines,
+            }
+        )
+
+    def on_cycle(self, cycle, warmup):
+        if cycle == warmup:
+            gc.collect()
+            self.snapshot = tracemalloc.take_snapshot()
+        if cycle % self.every == 0:
+            self.sample(cycle)
+
+
+def disable_features(manager):
+    manager.registrar = None
+    manager.cube_writer = None
+    manager.cadence = None
+    manager.eta = None
+    if manager.encoder is not None:
+        manager.encoder.shutdown()
+        manager.encoder = None
+
+
+def enable_features(manager, workdir, encoder_backend):
+    """Schaltet die Auswertung unabhängig von config.py ein."""
+    from packages.cadence import AdaptiveCadence
+    from packages.encoders import CAMERA_BACKEND, ImageEncoder
+    from packages.planner import learn_run
+    from packages.registration import WellRegistrar
+    from packages.timeseries_cube import CubeWriter
+
+    manager.registrar = WellRegistrar(manager.RUN_DIR)
+    # Eigenes Verzeichnis, der Würfel des Laufs hat schon die volle Auflösung
+    manager.cube_writer = CubeWriter(
+        os.path.join(workdir, "soak_cube"), size=(32, 24), channels=1
+    )
+    manager.cadence = AdaptiveCadence(manager.RUN_DIR, manager.run_pause_minutes * 60)
+    if manager.encoder is not None:
+        manager.encoder.shutdown()
+        manager.encoder = None
+    if encoder_backend != CAMERA_BACKEND:
+        manager.encoder = ImageEncoder(encoder_backend, workers=1)
+
+    def update_timing_model():
+        # Zeitmodell im Testverzeichnis statt neben dem Programm
+        learn_run(
+            manager.journal.directory,
+            manager.run_id,
+            path=os.path.join(workdir, "timing_model.json"),
+        )
+
+    manager.update_timing_model = update_timing_model
+
+
+def run_soak(
+    cycles,
+    every,
+    warmup,
+    retain_gui_log,
+    top,
+    features=False,
+    encoder_backend=ENCODER_BACKEND,
+):
+    gui = FakeGui(repeats=cycles, pause_minutes=1, retain=retain_gui_log)
+    attach_gui(gui)
+
+    with tempfile.TemporaryDirectory(prefix="paparazzo_soak_") as tmp:
+        transcript = os.path.join(tmp, "soak.jsonl")
+        synthesize_transcript(transcript, cycles, pause_ms=60000)
+        header, events = load_transcript(transcript)
+        started = header.get("started", 0.0)
+        clock = VirtualClock(started)
+        link = ReplaySerial(events, clock, started=started)
+        del events
+
+        # Logger, Kameradienst und Journal vor der ersten Messung anlegen
+        picam = StubImageCamera() if features else None
+        manager = make_manager(tmp, link, gui=gui, clock=clock, picam=picam)
+        manager.setup_run_directory()
+        if features:
+            enable_features(manager, tmp, encoder_backend)
+        else:
+            disable_features(manager)
+
+        tracemalloc.start()
+        sampler = Sampler(manager, gui, every)
+        sampler.sample(0)
+        baseline = dict(sampler.samples[0])
+
+        setup_cycle_directory = manager.setup_cycle_directory
+
+        def setup_and_sample():
+            setup_cycle_directory()
+            # Gesendete Befehle sammelt ReplaySerial nur für den Abgleich
+            # der Wiedergabe; sie sollen nicht als Wachstum erscheinen
+            link.sent.clear()
+            if features:
+                # Auswertung und Encoder sind mit dem vorletzten Cycle fertig
+                shutil.rmtree(
+                    os.path.join(
+                        manager.RUN_DIR, f"cycle_{manager.CYCLE_COUNT - 2:02d}"
+                    ),
+                    ignore_errors=True,
+                )
+            sampler.on_cycle(manager.CYCLE_COUNT, warmup)
+
+        manager.setup_cycle_directory = setup_and_sample
+
+        wall_start = time.perf_counter()
+        manager.setup_cycle_directory()
+        manager.send_command("START")
+        manager.poll_arduino()
+        manager.collect_analysis(wait=True)
+        wall = time.perf_counter() - wall_start
+
+        sampler.sample(manager.CYCLE_COUNT)
+        growth = []
+        if sampler.snapshot is not None:
+            diff = tracemalloc.take_snapshot().compare_to(sampler.snapshot, "lineno")
+            for stat in diff[:top]:
+                frame = stat.traceback[0]
+                growth.append(
+                    {
+                        "location": f"{frame.filename}:{frame.lineno}",
+                        "size_diff_bytes": stat.size_diff,
+                        "count_diff": stat.count_diff,
+                    }
+                )
+        tracemalloc.stop()
+
+        manager.camera.shutdown()
+        if manager.encoder is not None:
+            manager.encoder.shutdown()
+        manager.journal.close()
+
+    final = sampler.samples[-1]
+    steady = [s for s in sampler.samples if s["cycle"] >= warmup]
+    if features and steady:
+        # Die Threads von Encoder- und Auswertungs-Pool entstehen erst mit
+        # der ersten Aufnahme
+        baseline = steady[0]
+    return {
+        "cycles": manager.CYCLE_COUNT,
+        "features": features,
+        "captures": manager.camera.picam.capture_count,
+        "wall_duration_s": round(wall, 3),
+        "cycles_per_s": round(manager.CYCLE_COUNT / wall, 1) if wall else None,
+        "traced_growth_per_cycle_bytes": round(
+            slope([(s["cycle"], s["traced_bytes"]) for s in steady]), 1
+        ),
+        "rss_growth_per_cycle_bytes": round(
+            slope([(s["cycle"], s["rss_bytes"] or 0) for s in steady]), 1
+        ),
+        "leaks": {
+            "threads": final["threads"] - baseline["threads"],
+            "handlers": final["handlers"] - baseline["handlers"],
+            "fds": (
+                final["fds"] - baseline["fds"]
+                if final["fds"] is not None and baseline["fds"] is not None
+                else None
+            ),
+        },
+        "gui_log_lines_per_cycle": round(final["gui_log_lines"] / max(1, cycles), 1),
+        "top_growth": growth,
+        "samples": sampler.samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dauertest mit Speichermessung")
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--every", type=int, default=50, help="Messung alle n Cycles")
+    parser.add_argument(
+        "--warmup", type=int, default=100, help="Cycles bis zur Referenzmessung"
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--retain-gui-log",
+        action="store_true",
+        help="GUI-Log-Zeilen behalten wie das echte Text-Widget",
+    )
+    parser.add_argument(
+        "--features",
+        action="store_true",
+        help="Registrierung, Takt, Würfel, Restzeit und Encoder mit Ersatzbildern",
+    )
+    parser.add_argument(
+        "--encoder",
+        default=ENCODER_BACKEND,
+        help="Encoder-Backend bei --features (camera = capture_file)",
+    )
+    parser.add_argument("--output", help="Bericht zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    result = run_soak(
+        args.cycles,
+        args.every,
+        args.warmup,
+        args.retain_gui_log,
+        args.top,
+        features=args.features,
+        encoder_backend=args.encoder,
+    )
+    report = {"benchmark": "soak", "env": environment(), **result}
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,8 +15,10 @@
 #define ENA_PIN_ROW 11
 
 // Motorbewegung
-#define MAX_SPEED 8000
-#define ACCEL 3200
+#define MAX_SPEED_COLUMN 8000
+#define ACCEL_COLUMN 3200
+#define MAX_SPEED_ROW 8000
+#define ACCEL_ROW 3200
 #define STEPS_BASE_VALUE 200
 #define MICROSTEPS_PER_STEP 16
 #define DISTANCE_COLS 1.2
@@ -25,6 +27,10 @@
 #define COLUMNS 6
 #define ROWS 4
 
+// Korrektur je Well in Schritten [Reihe][Spalte] (aus well_calibration.json)
+#define WELL_OFFSETS_COLUMN {{0, 0, 0, 0, 0, 0}, {0, 0, 0, 0, 0, 0}, {0, 0, 0, 0, 0, 0}, {0, 0, 0, 0, 0, 0}}
+#define WELL_OFFSETS_ROW {{0, 0, 0, 0, 0, 0}, {0, 0, 0, 0, 0, 0}, {0, 0, 0, 0, 0, 0}, {0, 0, 0, 0, 0, 0}}
+
 #define RESPONSE_TIMEOUT 3500
 
 // Laufeinstellungen 
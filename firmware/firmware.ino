@@ -2,6 +2,7 @@
 #include <Wire.h>
 #include <RTClib.h>
 #include <AccelStepper.h>
+#include <EEPROM.h>
 
 // === RTC ===
 RTC_DS3231 rtc;
@@ -14,6 +15,20 @@ void resetSystemState();
 void stopAllMotors();
 void sendStatus(String status);
 String getTimestamp();
+String getField(String input, int index);
+void handleProfileCommand(String command);
+void handleTestMoveCommand(String command);
+void handleMoveToWellCommand(String command);
+void handleSetPositionCommand(String command);
+bool parseWell(String well, int &row, int &column);
+void moveToWell(int row, int column);
+void handleResumeCommand(String command);
+void trackPosition(int cycle, int row, int column);
+void sendState();
+void storePark(byte station);
+int loadPark();
+byte stationAtPosition();
+void restoreParkedPosition();
 
 // === AccelStepper-Objekte ===
 AccelStepper stepper_column(AccelStepper::DRIVER, STEP_PIN_COLUMN, DIR_PIN_COLUMN);
@@ -31,11 +46,33 @@ const long distance_rows = DISTANCE_ROWS * steps_per_revolution;
 // === Positionsspeicher ===
 long positions_column[COLUMNS];
 long positions_row[ROWS];
+// Korrekturen je Well aus der Kalibrierung, per SET_POS_ änderbar
+long offsets_column[ROWS][COLUMNS] = WELL_OFFSETS_COLUMN;
+long offsets_row[ROWS][COLUMNS] = WELL_OFFSETS_ROW;
 
 // === System Variablen ===
 int currentCycle = 0;
 int currentRow = 0;
 int currentColumn = 0;
+unsigned long nextPauseMs = PAUSE_MS;  // per NEXT_CYCLE_<ms> anpassbar
+String phase = "IDLE";  // IDLE, MOVE, CYCLE; Antwort auf STATUS
+
+// === Fortsetzung nach Neustart (RESUME_) ===
+int startCycle = 0;
+int startRow = 0;
+int startColumn = 0;
+unsigned long resumeDelayMs = 0;
+
+// === Parkposition im EEPROM ===
+// Das Öffnen des Ports setzt den Uno zurück; damit ein Lauf danach an der
+// richtigen Stelle weiterfährt, wird jede erreichte Station in einem Ring
+// von PARK_SLOTS Bytes abgelegt (verteilt die Schreibzyklen). Der Eintrag
+// vor dem ersten leeren Slot ist der aktuelle.
+const int PARK_SLOTS = 128;
+const byte PARK_EMPTY = 0xFF;
+const byte PARK_MOVING = 0xFE;  // Fahrt unterbrochen: Position unbekannt
+const byte PARK_HOME = ROWS * COLUMNS;
+int parkSlot = -1;  // Slot des aktuellen Eintrags, -1 = noch nicht gesucht
 
 // === Serielle Kommunikation ===
 String serialBuffer = "";
@@ -55,37 +92,47 @@ void setup() {
     setupSteppers();
     calculatePositions();
     setupPins();
+    restoreParkedPosition();
 
     waitForStartCommand();
 }
 
 void loop() {
-    for (int run = 0; run < REPEATS; run++) {
-        for (int currentRow = 0; currentRow < ROWS; currentRow++) {
-            for (int currentColumn = 0; currentColumn < COLUMNS; currentColumn++) {
+    delay(resumeDelayMs);
+    resumeDelayMs = 0;
+
+    for (int run = startCycle; run < REPEATS; run++) {
+        for (int currentRow = startRow; currentRow < ROWS; currentRow++) {
+            for (int currentColumn = startColumn; currentColumn < COLUMNS; currentColumn++) {
+                trackPosition(run, currentRow, currentColumn);
                 moveToNextColumn(currentColumn, currentRow);
                 waitForNextMoveCommand();
             }
+            startColumn = 0;
+            storePark(PARK_MOVING);
             stepper_column.runToNewPosition(0);
             if (currentRow < ROWS - 1) {
                 moveToNextRow(currentRow + 1);
             }
         }
+        startRow = 0;
+        trackPosition(run, ROWS - 1, COLUMNS - 1);
         returnToHome();
         waitForNextCycleCommand();
 
-        Serial.println("✅ Cycle " + String(run + 1) + " finished at " + getTimestamp() + ". Pausing for " + String(PAUSE_MS) + " ms.");
-        delay(PAUSE_MS);
+        Serial.println("✅ Cycle " + String(run + 1) + " finished at " + getTimestamp() + ". Pausing for " + String(nextPauseMs) + " ms.");
+        delay(nextPauseMs);
+        nextPauseMs = PAUSE_MS;
     }
     Serial.println("✅ ALL cycles completed at " + getTimestamp() + ". Run completed. Halting execution.");
     while (true);
 }
 
 void setupSteppers() {
-    stepper_column.setAcceleration(ACCEL);
-    stepper_column.setMaxSpeed(MAX_SPEED);
-    stepper_row.setAcceleration(ACCEL);
-    stepper_row.setMaxSpeed(MAX_SPEED);
+    stepper_column.setAcceleration(ACCEL_COLUMN);
+    stepper_column.setMaxSpeed(MAX_SPEED_COLUMN);
+    stepper_row.setAcceleration(ACCEL_ROW);
+    stepper_row.setMaxSpeed(MAX_SPEED_ROW);
 
     stepper_column.setCurrentPosition(0);
     stepper_row.setCurrentPosition(0);
@@ -110,7 +157,7 @@ void setupPins() {
 
 void moveToNextColumn(int currentColumn, int currentRow) {
     Serial.println("Moving to column: " + String(currentColumn) + "/" + String(currentRow));
-    stepper_column.runToNewPosition(positions_column[currentColumn]);
+    moveToWell(currentRow, currentColumn);
     sendStatus("MOVE_COMPLETED");
 }
 
@@ -122,12 +169,15 @@ void moveToNextRow(int currentRow) {
 
 void returnToHome() {
     Serial.println("🏠 Returning to home position...");
+    storePark(PARK_MOVING);
     stepper_column.runToNewPosition(0);
     stepper_row.runToNewPosition(0);
+    storePark(PARK_HOME);
     sendStatus("HOME_POSITION");
 }
 
 void waitForStartCommand() {
+    phase = "IDLE";
     serialBuffer = "";
     while (true) {
         if (Serial.available()) {
@@ -137,6 +187,21 @@ void waitForStartCommand() {
             if (serialBuffer == "START") {
                 Serial.println("✅ Command 'START' received at " + getTimestamp() + ".");
                 break;
+            } else if (serialBuffer.startsWith("RESUME_")) {
+                handleResumeCommand(serialBuffer);
+                break;
+            } else if (serialBuffer == "STATUS") {
+                sendState();
+            } else if (serialBuffer.startsWith("PROFILE_")) {
+                handleProfileCommand(serialBuffer);
+            } else if (serialBuffer.startsWith("TEST_MOVE_")) {
+                handleTestMoveCommand(serialBuffer);
+            } else if (serialBuffer.startsWith("MOVE_")) {
+                handleMoveToWellCommand(serialBuffer);
+            } else if (serialBuffer.startsWith("SET_POS_")) {
+                handleSetPositionCommand(serialBuffer);
+            } else if (serialBuffer == "HOME") {
+                returnToHome();
             } else {
                 Serial.println("❌ Non-functional input: " + serialBuffer);
                 serialBuffer = "";
@@ -146,6 +211,7 @@ void waitForStartCommand() {
 }
 
 void waitForNextMoveCommand() {
+    phase = "MOVE";
     serialBuffer = "";
     unsigned long startMillis = millis();
 
@@ -157,6 +223,10 @@ void waitForNextMoveCommand() {
             if (serialBuffer == "NEXT_MOVE") {
                 Serial.println("✅ Command NEXT_MOVE received at " + getTimestamp() + ".");
                 return;
+            } else if (serialBuffer == "STATUS") {
+                // Host hat die Verbindung neu aufgebaut: Zustand melden, Frist neu starten
+                sendState();
+                startMillis = millis();
             } else if (serialBuffer == "ABORT") {
                 Serial.println("🛑 ABORT received at " + getTimestamp() + ". Shutting down.");
                 returnToHome();
@@ -174,6 +244,7 @@ void waitForNextMoveCommand() {
 }
 
 void waitForNextCycleCommand() {
+    phase = "CYCLE";
     sendStatus("CYCLE_COMPLETED");
 
     serialBuffer = "";
@@ -187,6 +258,15 @@ void waitForNextCycleCommand() {
             if (serialBuffer == "NEXT_CYCLE") {
                 Serial.println("✅ Command 'NEXT_CYCLE' received at " + getTimestamp() + ".");
                 return;
+            } else if (serialBuffer.startsWith("NEXT_CYCLE_")) {
+                // NEXT_CYCLE_<ms>: Pause bis zum nächsten Cycle (adaptive Taktsteuerung)
+                long pauseMs = getField(serialBuffer, 2).toInt();
+                nextPauseMs = pauseMs > 0 ? (unsigned long)pauseMs : PAUSE_MS;
+                Serial.println("✅ Command 'NEXT_CYCLE' received at " + getTimestamp() + ", pause " + String(nextPauseMs) + " ms.");
+                return;
+            } else if (serialBuffer == "STATUS") {
+                sendState();
+                startMillis = millis();
             } else if (serialBuffer == "ABORT") {
                 Serial.println("🛑 ABORT received at " + getTimestamp() + ". Shutting down.");
                 returnToHome();
@@ -212,6 +292,7 @@ void resetSystemState() {
     currentRow = 0;
     currentColumn = 0;
     currentCycle = 0;
+    phase = "IDLE";
     Serial.println("✅ Systemzustand zurückgesetzt bei " + getTimestamp() + ".");
 }
 
@@ -231,6 +312,234 @@ void handleTimeout() {
     return;
 }
 
+// === Bewegungsprofil-Optimierung (nur vor START) ===
+
+// PROFILE_<COL|ROW>_<maxSpeed>_<accel>
+void handleProfileCommand(String command) {
+    String axis = getField(command, 1);
+    long speed = getField(command, 2).toInt();
+    long accel = getField(command, 3).toInt();
+
+    if (speed <= 0 || accel <= 0) {
+        Serial.println("❌ Invalid profile: " + command);
+        sendStatus("PROFILE_INVALID");
+        return;
+    }
+
+    if (axis == "COL") {
+        stepper_column.setMaxSpeed(speed);
+        stepper_column.setAcceleration(accel);
+    } else if (axis == "ROW") {
+        stepper_row.setMaxSpeed(speed);
+        stepper_row.setAcceleration(accel);
+    } else {
+        Serial.println("❌ Unknown axis: " + axis);
+        sendStatus("PROFILE_INVALID");
+        return;
+    }
+    sendStatus("PROFILE_SET");
+}
+
+// TEST_MOVE_<COL|ROW>_<steps>_<repetitions>
+// Fährt die Achse mehrfach zwischen 0 und <steps> hin und her und meldet
+// die benötigte Zeit in Millisekunden.
+void handleTestMoveCommand(String command) {
+    String axis = getField(command, 2);
+    long steps = getField(command, 3).toInt();
+    int repetitions = getField(command, 4).toInt();
+
+    AccelStepper *stepper;
+    if (axis == "COL") {
+        stepper = &stepper_column;
+    } else if (axis == "ROW") {
+        stepper = &stepper_row;
+    } else {
+        Serial.println("❌ Unknown axis: " + axis);
+        sendStatus("TEST_MOVE_INVALID");
+        return;
+    }
+
+    storePark(PARK_MOVING);
+    unsigned long startMillis = millis();
+    for (int i = 0; i < repetitions; i++) {
+        stepper->runToNewPosition(steps);
+        stepper->runToNewPosition(0);
+    }
+    unsigned long elapsed = millis() - startMillis;
+    // Die andere Achse steht noch, z. B. an einem Well oder in Home
+    storePark(stationAtPosition());
+    sendStatus("TEST_MOVE_DONE_" + String(elapsed));
+}
+
+// === Einzelne Wells anfahren (Experiment-Planung, manuelle Steuerung) ===
+
+// MOVE_<Reihe><Spalte>, z. B. MOVE_B3. Antwort <POSITION_B3>.
+void handleMoveToWellCommand(String command) {
+    String well = command.substring(5);
+    int row, column;
+
+    if (!parseWell(well, row, column)) {
+        Serial.println("❌ Unknown well: " + well);
+        sendStatus("MOVE_INVALID");
+        return;
+    }
+
+    moveToWell(row, column);
+    sendStatus("POSITION_" + well);
+}
+
+// SET_POS_<Well>_<Spalte>_<Reihe>: Korrektur in Schritten, z. B. SET_POS_B3_-40_12.
+// Antwort <POS_SET_B3>; gilt ab der nächsten Anfahrt.
+void handleSetPositionCommand(String command) {
+    String well = getField(command, 2);
+    int row, column;
+
+    if (!parseWell(well, row, column) || getField(command, 4).length() == 0) {
+        Serial.println("❌ Invalid position command: " + command);
+        sendStatus("POS_INVALID");
+        return;
+    }
+
+    offsets_column[row][column] = getField(command, 3).toInt();
+    offsets_row[row][column] = getField(command, 4).toInt();
+    sendStatus("POS_SET_" + well);
+}
+
+// === Fortsetzung nach Verbindungsabbruch ===
+
+// RESUME_<Cycle>_<Station>_<PauseMs>: Lauf nach einem Neustart des Boards
+// (Port neu geöffnet) an der Station fortsetzen, an der der Host steht.
+// Station = Reihe * COLUMNS + Spalte; COLUMNS * ROWS = Ende des Cycles.
+void handleResumeCommand(String command) {
+    int cycle = getField(command, 1).toInt();
+    int station = getField(command, 2).toInt();
+    long pauseMs = getField(command, 3).toInt();
+
+    startCycle = constrain(cycle, 0, REPEATS - 1);
+    station = constrain(station, 0, ROWS * COLUMNS);
+    startRow = station / COLUMNS;
+    startColumn = station % COLUMNS;
+    resumeDelayMs = pauseMs > 0 ? (unsigned long)pauseMs : 0;
+    trackPosition(startCycle, min(startRow, ROWS - 1), startColumn);
+    Serial.println("✅ Command 'RESUME' received at " + getTimestamp() + ": cycle " + String(startCycle) + ", station " + String(station) + ".");
+    sendStatus("RESUMED");
+}
+
+// Nach einem Neustart steht der Tisch noch an der gespeicherten Station,
+// auch im Leerlauf (MOVE_<Well>, HOME)
+void restoreParkedPosition() {
+    int parked = loadPark();
+    if (parked >= 0 && parked < PARK_HOME) {
+        int row = parked / COLUMNS;
+        int column = parked % COLUMNS;
+        stepper_column.setCurrentPosition(positions_column[column] + offsets_column[row][column]);
+        stepper_row.setCurrentPosition(positions_row[row] + offsets_row[row][column]);
+    }
+}
+
+// Station an der aktuellen Position der Achsen: Home, Well oder unbekannt
+byte stationAtPosition() {
+    long column_position = stepper_column.currentPosition();
+    long row_position = stepper_row.currentPosition();
+    if (column_position == 0 && row_position == 0) {
+        return PARK_HOME;
+    }
+    for (int row = 0; row < ROWS; row++) {
+        for (int column = 0; column < COLUMNS; column++) {
+            if (column_position == positions_column[column] + offsets_column[row][column] &&
+                row_position == positions_row[row] + offsets_row[row][column]) {
+                return row * COLUMNS + column;
+            }
+        }
+    }
+    return PARK_MOVING;
+}
+
+// Position für STATUS merken (loop() verdeckt die globalen Zähler)
+void trackPosition(int cycle, int row, int column) {
+    currentCycle = cycle;
+    currentRow = row;
+    currentColumn = column;
+}
+
+// STATUS: <STATE_<Phase>_<Cycle>_<Station>_<Park>>, z. B. <STATE_MOVE_3_14_14>
+// Park: gespeicherte Station, ROWS * COLUMNS = Home, -1 = unbekannt
+void sendState() {
+    sendStatus("STATE_" + phase + "_" + String(currentCycle) + "_" + String(currentRow * COLUMNS + currentColumn) + "_" + String(loadPark()));
+}
+
+void storePark(byte station) {
+    if (parkSlot < 0) {
+        loadPark();
+    }
+    int next = (parkSlot + 1) % PARK_SLOTS;
+    // Erst den Folgeslot leeren, dann schreiben: ein Neustart dazwischen
+    // hinterlässt den vorherigen Eintrag als gültig
+    EEPROM.update((next + 1) % PARK_SLOTS, PARK_EMPTY);
+    EEPROM.update(next, station);
+    parkSlot = next;
+}
+
+// Gespeicherte Station; ohne Eintrag (neues Board) Home, -1 = unbekannt
+int loadPark() {
+    if (parkSlot < 0) {
+        parkSlot = PARK_SLOTS - 1;
+        for (int i = 0; i < PARK_SLOTS; i++) {
+            int previous = (i + PARK_SLOTS - 1) % PARK_SLOTS;
+            if (EEPROM.read(i) == PARK_EMPTY && EEPROM.read(previous) != PARK_EMPTY) {
+                parkSlot = previous;
+                break;
+            }
+        }
+    }
+    byte station = EEPROM.read(parkSlot);
+    if (station == PARK_EMPTY) {
+        return PARK_HOME;
+    }
+    if (station == PARK_MOVING || station > PARK_HOME) {
+        return -1;
+    }
+    return station;
+}
+
+// Reihe/Spalte (ab 0) aus z. B. "B3"
+bool parseWell(String well, int &row, int &column) {
+    if (well.length() < 2) {
+        return false;
+    }
+    row = well.charAt(0) - 'A';
+    column = well.substring(1).toInt() - 1;
+    return row >= 0 && row < ROWS && column >= 0 && column < COLUMNS;
+}
+
+// Beide Achsen gleichzeitig fahren, damit die Fahrzeit der längeren Achse zählt
+void moveToWell(int row, int column) {
+    storePark(PARK_MOVING);
+    stepper_column.moveTo(positions_column[column] + offsets_column[row][column]);
+    stepper_row.moveTo(positions_row[row] + offsets_row[row][column]);
+    while (stepper_column.distanceToGo() != 0 || stepper_row.distanceToGo() != 0) {
+        stepper_column.run();
+        stepper_row.run();
+    }
+    storePark(row * COLUMNS + column);
+}
+
+// Liefert das index-te, durch '_' getrennte Feld eines Befehls
+String getField(String input, int index) {
+    int found = 0;
+    int start = 0;
+    for (int i = 0; i <= (int)input.length(); i++) {
+        if (i == (int)input.length() || input.charAt(i) == '_') {
+            if (found == index) {
+                return input.substring(start, i);
+            }
+            found++;
+            start = i + 1;
+        }
+    }
+    return "";
+}
+
 void sendStatus(String status) {
     Serial.println("<" + status + ">");
 }
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Adaptive Aufnahmefrequenz: die Pause bis zum nächsten Cycle richtet sich
+nach der beobachteten Veränderung der Wells.
+
+Jede Aufnahme wird stark verkleinert als Graustufenbild gemerkt. Am Ende
+eines Cycles wird für alle Wells zugleich die mittlere absolute Differenz
+zur vorigen Aufnahme desselben Wells berechnet (helligkeitsbereinigt,
+0 = unverändert). Das Well mit der größten Veränderung bestimmt den Takt:
+
+    neue Pause = Pause * ADAPTIVE_TARGET_CHANGE / Veränderung
+
+begrenzt auf den Faktor ADAPTIVE_MAX_STEP je Cycle und auf
+ADAPTIVE_MIN_PAUSE_MIN bis ADAPTIVE_MAX_PAUSE_MIN. In der Lag-Phase wird
+die Pause so länger, bei exponentiellem Wachstum kürzer. Veränderung und
+gewählte Pause landen in den Laufdaten (Typ "cadence").
+"""
+
+import numpy as np
+
+from packages.config import (ADAPTIVE_FRAME_SIZE, ADAPTIVE_MAX_PAUSE_MIN,
+                             ADAPTIVE_MAX_STEP, ADAPTIVE_MIN_PAUSE_MIN,
+                             ADAPTIVE_TARGET_CHANGE)
+from packages.logger import log_message
+from packages.registration import load_frame
+from packages.run_data import RunData
+
+
+class AdaptiveCadence:
+    def __init__(
+        self,
+        run_dir,
+        pause_s,
+        min_pause_s=ADAPTIVE_MIN_PAUSE_MIN * 60,
+        max_pause_s=ADAPTIVE_MAX_PAUSE_MIN * 60,
+        target_change=ADAPTIVE_TARGET_CHANGE,
+        max_step=ADAPTIVE_MAX_STEP,
+        frame_size=ADAPTIVE_FRAME_SIZE,
+    ):
+        self.min_pause_s = min_pause_s
+        self.max_pause_s = max_pause_s
+        self.pause_s = min(max(pause_s, min_pause_s), max_pause_s)
+        self.target_change = target_change
+        self.max_step = max_step
+        self.frame_size = frame_size
+        self.run_data = RunData(run_dir)
+        self.previous = {}  # Well -> Bild der letzten Auswertung
+        self.current = {}  # Well -> Bild des laufenden Cycles
+
+    def add(self, well, path):
+        """Merkt sich die Aufnahme eines Wells (im Polling-Thread)."""
+        try:
+            frame, _, _ = load_frame(path, self.frame_size)
+        except (OSError, ValueError) as e:
+            log_message(f"Taktsteuerung {well}: Bild nicht lesbar: {e}", "debug")
+            return
+        self.current[well] = frame
+
+    def change_metrics(self):
+        """Veränderung je Well gegenüber der vorigen Aufnahme (vektorisiert)."""
+        wells = sorted(
+            well
+            for well in self.current
+            if well in self.previous
+            and self.previous[well].shape == self.current[well].shape
+        )
+        if not wells:
+            return {}
+        current = np.stack([self.current[well] for well in wells])
+        previous = np.stack([self.previous[well] for well in wells])
+        # Mittelwertfrei je Bild, damit Belichtungsschwankungen nicht zählen
+        current -= current.mean(axis=(1, 2), keepdims=True)
+        previous -= previous.mean(axis=(1, 2), keepdims=True)
+        changes = np.abs(current - previous).mean(axis=(1, 2)) / 255.0
+        return {well: round(float(value), 5) for well, value in zip(wells, changes)}
+
+    def next_pause(self, cycle):
+        """Wertet den abgeschlossenen Cycle aus und liefert die Pause in s."""
+        changes = self.change_metrics()
+        metric = max(changes.values()) if changes else None
+        previous_pause = self.pause_s
+
+        if metric is not None:
+            factor = self.target_change / max(metric, 1e-6)
+            factor = min(max(factor, 1 / self.max_step), self.max_step)
+            self.pause_s = min(
+                max(self.pause_s * factor, self.min_pause_s), self.max_pause_s
+            )
+
+        self.run_data.append(
+            {
+                "type": "cadence",
+                "cycle": cycle,
+                "change": changes,
+                "metric": metric,
+                "pause_s": round(self.pause_s, 1),
+            }
+        )
+        if metric is not None:
+            log_message(
+                f"Taktsteuerung: Veränderung {metric:.4f}, Pause "
+                f"{previous_pause / 60:.1f} -> {self.pause_s / 60:.1f} min",
+                "info",
+            )
+
+        # Wells ohne neue Aufnahme behalten ihr letztes Bild als Vergleich
+        self.previous.update(self.current)
+        self.current = {}
+        return self.pause_s
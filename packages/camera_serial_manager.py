@@ -1,33 +1,102 @@
 #!/usr/bin/env python3
 
 import os
-import subprocess
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import serial
-from picamera2 import Picamera2
 
-from packages.config import (ARDUINO_CLI_PATH, BAUD_RATE, CONFIG_FILE,
-                             FIRMWARE_DIR, FQBN, IMAGES_DIR, POSITIONS_COLUMN,
-                             POSITIONS_ROW, SERIAL_PORT, TEMPLATE_FILE,
-                             TOTAL_STATIONS)
+from packages.camera_service import PRIORITY_RUN, CameraService
+from packages.config import (ADAPTIVE_CADENCE_ENABLED, ARDUINO_CLI_PATH,
+                             BAUD_RATE, CALIBRATED_CROP, CAMERA_TIMEOUT,
+                             CONFIG_FILE, CROP_FRACTION, CUBE_ENABLED,
+                             DISTANCE_COLS, DISTANCE_ROWS, ENCODER_BACKEND,
+                             FIRMWARE_DIR, FQBN, IMAGES_DIR, JOURNAL_ENABLED,
+                             MICROSTEPS_PER_STEP, PLANNER_ENABLED, PLATE_TYPE,
+                             POSITIONS_COLUMN, POSITIONS_ROW,
+                             REGISTRATION_ALIGNED_OUTPUT, REGISTRATION_ENABLED,
+                             SENSOR_MODE_SELECTION, SERIAL_TRANSCRIPT_ENABLED,
+                             STEPS_BASE_VALUE, TEMPLATE_FILE, TOTAL_STATIONS,
+                             TRANSCRIPTS_DIR)
+from packages.encoders import CAMERA_BACKEND, ImageEncoder
+from packages.jobs import run_streaming
+from packages.journal import EventJournal
 from packages.logger import log_message
+from packages.motion_tuning import load_motion_profile
+from packages.sensor_modes import still_configuration
+from packages.serial_link import LinkSupervisor, SerialLinkError, find_port
+from packages.serial_transcript import SerialRecorder
+from packages.well_calibration import calibrated_crop_fraction, offset_table
+
+
+class FirmwareError(Exception):
+    pass
 
 
 class CameraSerialManager:
-    def __init__(self, gui=None):
-        """Initialisiert Kamera und serielle Verbindung."""
+    def __init__(
+        self, gui=None, serial_connection=None, picam=None, clock=None, journal=None
+    ):
+        """
+        Initialisiert Kamera und serielle Verbindung.
+
+        serial_connection, picam, clock und journal können von außen übergeben
+        werden (z. B. für die Wiedergabe aufgezeichneter Transkripte),
+        ansonsten werden echte Hardware, die Systemzeit und das Journal unter
+        JOURNAL_DIR verwendet.
+        """
         self.gui = gui
+        self.clock = clock if clock is not None else time
         self.CYCLE_COUNT = 0  # Startwert
         self.MOVE_COUNT = 0  # Startwert
-        self.picam = None
+        self.camera = None
         self.serial_connection = None
+        self.link = None  # Überwachung der Verbindung (nur bei eigenem Port)
         self.polling_thread = None
         self.polling_active = None
-        self.run_id = time.strftime("%Y%m%d_%H%M%S")  # Setzen der run_id
-        self.init_camera()
-        self.init_serial()
+        self.run_open = False  # Lauf begonnen, run_end noch nicht vermerkt
+        self.stop_status = "stopped"  # run_end-Status, wenn das Polling gestoppt wird
+        self.images_dir = IMAGES_DIR
+        self.registrar = None
+        self.cube_writer = None
+        self.cadence = None
+        self.encoder = None
+        self.eta = None  # Restzeit des laufenden Laufs (packages/planner.py)
+        self.pending_photos = []  # (well, filepath, cycle, times, future)
+        # Auswertung der Aufnahmen (Registrierung, Würfel) außerhalb des Polling-
+        # Threads; ein Worker, damit sie in Aufnahmereihenfolge läuft
+        self.analysis = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        self.pending_analysis = []  # (well, source, future)
+        self.run_repeats = None
+        self.run_pause_minutes = None
+        self.next_cycle_at = None
+        self.last_station = None  # (Cycle, Station) der letzten Aufnahme
+        self.latest_images = {}  # Well -> Pfad der letzten Aufnahme
+        self.run_id = self.strftime("%Y%m%d_%H%M%S")  # Setzen der run_id
+
+        # Bildausschnitt je Well, nach der Kalibrierung enger
+        self.crop_fraction = CROP_FRACTION
+        if CALIBRATED_CROP:
+            self.crop_fraction = calibrated_crop_fraction() or CROP_FRACTION
+
+        if journal is None and JOURNAL_ENABLED:
+            journal = EventJournal(clock=self.clock)
+        self.journal = journal
+
+        if ENCODER_BACKEND != CAMERA_BACKEND:
+            self.encoder = ImageEncoder()
+
+        self.init_camera(picam)
+
+        if serial_connection is None:
+            self.init_serial()
+        else:
+            self.serial_connection = serial_connection
+
+    # Zeitstempel über die (ggf. virtuelle) Uhr
+    def strftime(self, fmt):
+        return time.strftime(fmt, time.localtime(self.clock.time()))
 
     # Counter Value Managment
     def get_repeats(self):
@@ -65,62 +134,147 @@ class CameraSerialManager:
         return self.CYCLE_COUNT
 
     # Kamera initialisieren
-    def init_camera(self):
-        """Sichere Initialisierung der Kamera mit Fehlerprüfung."""
-        log_message("Starte init_camera...", "info")
-        try:
-            self.picam = Picamera2()
-            time.sleep(2)  # Wartezeit für Kamera-Initialisierung
-
-            if self.picam is None:
-                log_message("Kamera konnte nicht initialisiert werden!", "error")
-                return
+    def init_camera(self, picam=None):
+        """Startet den Kameradienst, der die Kamera exklusiv besitzt."""
+        self.camera = CameraService(picam=picam, clock=self.clock)
+        self.camera.start()
 
-            log_message("Kamera erfolgreich erstellt.", "info")
+        # Nur bei echter Kamera: Sensormodus passend zum Ausschnitt wählen
+        if picam is None and SENSOR_MODE_SELECTION and self.camera.available:
+            try:
+                self.configure_camera().result(timeout=CAMERA_TIMEOUT)
+            except Exception:
+                pass  # bereits in configure_camera protokolliert
 
-            # DEBUG: Liste der Kamera-Modi abrufen
-            # log_message(f"Kamera-Modi: {self.picam.sensor_modes}", "debug")
+    def configure_camera(self):
+        """
+        Wählt den Sensormodus für den aktuellen Ausschnitt (crop_fraction),
+        z. B. nach einer neuen Well-Kalibrierung. Gibt das Future zurück.
+        """
 
-            # Prüfen, ob Kamera verfügbar ist
-            if not hasattr(self.picam, "camera_config"):
-                log_message("Kamera-Konfiguration ist nicht verfügbar!", "error")
+        def done(future):
+            try:
+                config = future.result()
+            except Exception as e:
+                log_message(f"Fehler bei der Wahl des Sensormodus: {e}", "error")
                 return
+            log_message(
+                f"Kamera konfiguriert: Sensor {config['raw']['size']}, "
+                f"Ausgabe {config['main']['size']}",
+                "info",
+            )
 
-            log_message("Kamera wird konfiguriert...", "info")
-            self.picam.configure(self.picam.create_still_configuration())
-
-            if self.picam.started:
-                log_message("Kamera läuft bereits, überspringe start().", "info")
-            else:
-                log_message("Kamera wird gestartet...", "info")
-                self.picam.start()
-
-            log_message("Kamera erfolgreich gestartet.", "info")
+        future = self.camera.reconfigure(
+            still_configuration(self.crop_fraction), priority=PRIORITY_RUN
+        )
+        future.add_done_callback(done)
+        return future
 
-        except Exception as e:
-            log_message(f"Kamera-Fehler: {e}", "error")
-            self.picam = None
+    @property
+    def picam(self):
+        return self.camera.picam if self.camera is not None else None
 
     # Serielle Verbindung
     def init_serial(self):
-        """Öffnet die serielle Verbindung zum Arduino."""
+        """Sucht den Arduino per USB-Kennung und öffnet die Verbindung."""
+        self.link = LinkSupervisor(self)
         try:
-            self.serial_connection = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.1)
+            self.serial_connection = self.link.open()
             time.sleep(2)  # Arduino-Reset abwarten
-            log_message(f"Serielle Verbindung geöffnet: {SERIAL_PORT}")
-        except serial.SerialException as e:
+            log_message(f"Serielle Verbindung geöffnet: {self.link.port}")
+        except (serial.SerialException, SerialLinkError) as e:
             log_message(f"Fehler beim Öffnen des seriellen Ports: {e}", "error")
             self.serial_connection = None
+            return
+
+        if SERIAL_TRANSCRIPT_ENABLED:
+            os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
+            path = os.path.join(
+                TRANSCRIPTS_DIR, f"transcript_{self.strftime('%Y%m%d_%H%M%S')}.jsonl"
+            )
+            self.serial_connection = SerialRecorder(
+                self.serial_connection, path, port=self.link.port, baud_rate=BAUD_RATE
+            )
+            log_message(f"Serielles Transkript wird aufgezeichnet: {path}")
+
+    # Ereignis im Transkript vermerken (falls Aufzeichnung aktiv)
+    def annotate_transcript(self, event, **fields):
+        annotate = getattr(self.serial_connection, "annotate", None)
+        if annotate is not None:
+            annotate(event, **fields)
+
+    # Ereignis im Journal vermerken (mit run_id und aktueller Position)
+    def record_event(self, event, **fields):
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(
+                event,
+                run_id=self.run_id,
+                cycle=self.CYCLE_COUNT,
+                move=self.MOVE_COUNT,
+                **fields,
+            )
+        except OSError as e:
+            log_message(f"Fehler beim Schreiben des Journals: {e}", "error")
 
     # Befehle an Raspberry senden und loggen
     def send_command(self, command):
         """Sendet einen Befehl an den Arduino (z. B. 'START', 'NEXT_MOVE', 'ABORT')."""
+        message = "Verbindung nicht verfügbar"
         if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.write((command + "\n").encode("utf-8"))
-            self.serial_connection.flush()
-            log_message(f"=> Arduino: '{command}'")
-        else:
-            log_message("Serielle Verbindung nicht verfügbar!", "error")
+            try:
+                self.write_command(command)
+                return
+            except (serial.SerialException, OSError) as e:
+                message = str(e)
+        log_message("Serielle Verbindung nicht verfügbar!", "error")
+        self.record_event("error", source="serial", message=message)
+        # Der Polling-Thread stellt die Verbindung wieder her
+        if self.link is not None:
+            self.link.lost = True
+
+    def write_command(self, command):
+        """Wie send_command, Fehler der Verbindung werden aber weitergereicht."""
+        self.serial_connection.write((command + "\n").encode("utf-8"))
+        self.serial_connection.flush()
+        log_message(f"=> Arduino: '{command}'")
+        self.record_event("command_sent", command=command)
+
+    # Befehl im Leerlauf der Firmware senden und auf die Antwort warten
+    def send_and_wait(self, command, prefix, timeout):
+        """
+        Sendet einen Befehl und wartet auf den Status <prefix...>.
+
+        Nur außerhalb eines Laufs verwenden (kein Polling-Thread aktiv), da
+        die Antwort direkt von der seriellen Verbindung gelesen wird.
+        """
+        connection = self.serial_connection
+        if not (connection and connection.is_open):
+            raise FirmwareError("Serielle Verbindung nicht verfügbar!")
+
+        while connection.in_waiting > 0:
+            connection.readline()
+        self.send_command(command)
+        if self.link is not None and self.link.lost:
+            raise FirmwareError(f"Verbindung beim Senden von '{command}' verloren")
+        deadline = self.clock.monotonic() + timeout
+
+        while self.clock.monotonic() < deadline:
+            if connection.in_waiting > 0:
+                line = connection.readline().decode("utf-8", errors="ignore").strip()
+                if line.startswith("<") and line.endswith(">"):
+                    status = line[1:-1].strip()
+                    if status.startswith(prefix):
+                        self.record_event("frame_received", frame=status)
+                        return status
+                    if status.endswith("_INVALID"):
+                        raise FirmwareError(f"Firmware lehnt ab: {command}")
+            else:
+                self.clock.sleep(0.01)
+
+        self.record_event("error", source="serial", message=f"Keine Antwort: {command}")
+        raise FirmwareError(f"Keine Antwort auf '{command}' ({timeout}s)")
 
     # Konfigurationsdatei generieren
     def generate_config_file(self, repeats, pause_ms):
@@ -135,46 +289,92 @@ class CameraSerialManager:
             content = content.replace("{{REPEATS_PLACEHOLDER}}", str(repeats))
             content = content.replace("{{PAUSE_PLACEHOLDER}}", str(pause_ms))
 
+            # Mechanik nur in config.py pflegen, Planer und Tuning rechnen damit
+            for name, value in (
+                ("STEPS_BASE_VALUE", STEPS_BASE_VALUE),
+                ("MICROSTEPS_PER_STEP", MICROSTEPS_PER_STEP),
+                ("DISTANCE_COLS", DISTANCE_COLS),
+                ("DISTANCE_ROWS", DISTANCE_ROWS),
+            ):
+                content = content.replace(f"{{{{{name}_PLACEHOLDER}}}}", str(value))
+
+            # Bewegungsprofil je Achse (optimiert oder Standardwerte)
+            profile = load_motion_profile()
+            for axis, name in (("column", "COLUMN"), ("row", "ROW")):
+                content = content.replace(
+                    f"{{{{MAX_SPEED_{name}_PLACEHOLDER}}}}",
+                    str(profile[axis]["max_speed"]),
+                )
+                content = content.replace(
+                    f"{{{{ACCEL_{name}_PLACEHOLDER}}}}", str(profile[axis]["accel"])
+                )
+
+            # Positionstabelle aus der Well-Kalibrierung (sonst ohne Korrektur)
+            columns, rows = offset_table()
+            content = content.replace("{{WELL_OFFSETS_COLUMN_PLACEHOLDER}}", columns)
+            content = content.replace("{{WELL_OFFSETS_ROW_PLACEHOLDER}}", rows)
+
             with open(CONFIG_FILE, "w") as config:
                 config.write(content)
 
             log_message("config.h wurde erfolgreich generiert.")
+            return True
 
         except FileNotFoundError:
             log_message(f"FEHLER: {TEMPLATE_FILE} wurde nicht gefunden.", "error")
+            return False
 
     # Arduino Sketch kompilieren
-    def compile_sketch(self):
-        """Ruft arduino-cli compile auf."""
+    def compile_sketch(self, job=None):
+        """Ruft arduino-cli compile auf, Ausgabe erscheint zeilenweise im Log."""
         log_message("Kompiliere Sketch...", "info")
         try:
-            subprocess.run(
-                [ARDUINO_CLI_PATH, "compile", "--fqbn", FQBN, FIRMWARE_DIR], check=True
+            returncode = run_streaming(
+                [ARDUINO_CLI_PATH, "compile", "--fqbn", FQBN, FIRMWARE_DIR],
+                job,
+                prefix="[compile] ",
             )
-            log_message("Kompilierung erfolgreich.", "info")
-        except subprocess.CalledProcessError as e:
+        except OSError as e:
             log_message(f"Fehler bei der Kompilierung: {e}", "error")
+            return False
+
+        if returncode != 0:
+            log_message(f"Fehler bei der Kompilierung (Code {returncode}).", "error")
+            return False
+        log_message("Kompilierung erfolgreich.", "info")
+        return True
 
     # Arduino Sketch hochladen
-    def upload_sketch(self):
-        """Ruft arduino-cli upload auf."""
+    def upload_sketch(self, job=None):
+        """Ruft arduino-cli upload auf, Ausgabe erscheint zeilenweise im Log."""
         log_message("Lade hoch...", "info")
+        port = self.link.port if self.link and self.link.port else find_port()
+        if port is None:
+            log_message("Fehler beim Upload: Kein Arduino an USB gefunden.", "error")
+            return False
         try:
-            subprocess.run(
+            returncode = run_streaming(
                 [
                     ARDUINO_CLI_PATH,
                     "upload",
                     "-p",
-                    SERIAL_PORT,
+                    port,
                     "--fqbn",
                     FQBN,
                     FIRMWARE_DIR,
                 ],
-                check=True,
+                job,
+                prefix="[upload] ",
             )
-            log_message("Upload erfolgreich.", "info")
-        except subprocess.CalledProcessError as e:
+        except OSError as e:
             log_message(f"Fehler beim Upload: {e}", "error")
+            return False
+
+        if returncode != 0:
+            log_message(f"Fehler beim Upload (Code {returncode}).", "error")
+            return False
+        log_message("Upload erfolgreich.", "info")
+        return True
 
     # Polling Start Helper
     def start_polling(self):
@@ -189,18 +389,27 @@ class CameraSerialManager:
         self.polling_thread.start()
 
     # Polling Stop Helper
-    def stop_polling(self):
-        """Stoppt den Polling-Thread sicher und wartet auf dessen Ende."""
+    def stop_polling(self, status="stopped", timeout=2):
+        """
+        Stoppt den Polling-Thread sicher und wartet auf dessen Ende. Ein
+        offener Lauf wird dort mit end_run(status) abgeschlossen.
+        """
         log_message("Beende Daten-Abfrage-Thread...", "info")
+        self.stop_status = status
         self.polling_active = False
 
         if (
             self.polling_thread
             and threading.current_thread() is not self.polling_thread
         ):
-            self.polling_thread.join(timeout=2)
+            self.polling_thread.join(timeout=timeout)
             self.polling_thread = None
 
+    def abort_run(self):
+        """Bricht den Lauf ab (GUI, Status-Server) und schließt ihn ab."""
+        self.send_command("ABORT")
+        self.stop_polling("aborted")
+
     # Polling
     def poll_arduino(self):
         log_message("Daten-Abfrage gestartet.", "info")
@@ -208,86 +417,205 @@ class CameraSerialManager:
 
         while self.polling_active:
             try:
-                if self.serial_connection and self.serial_connection.is_open:
-                    if self.serial_connection.in_waiting > 0:
-                        raw_line = (
-                            self.serial_connection.readline()
-                            .decode("utf-8", errors="ignore")
-                            .strip()
-                        )
-
-                        if (
-                            raw_line.startswith("<")
-                            and raw_line.endswith(">")
-                            and len(raw_line) > 2
-                        ):
-                            command = raw_line[1:-1].strip()
-                        else:
-                            continue
-
-                        if command == "MOVE_COMPLETED":
-                            log_message("<= Raspberry: 'MOVE_COMPLETED'", "info")
-                            self.take_photo()
-
-                            if self.get_current_move_count() + 1 >= TOTAL_STATIONS:
-                                # Warte auf <CYCLE_COMPLETED> vom Arduino
-                                log_message(
-                                    "Alle Positionen erreicht, warte auf CYCLE_COMPLETED.",
-                                    "info",
-                                )
-                            else:
-                                self.increment_move_count()
-                                self.send_command("NEXT_MOVE")
-
-                        elif command == "CYCLE_COMPLETED":
-                            log_message("Arduino meldet CYCLE_COMPLETED.", "info")
-                            log_message(
-                                f"Pausiere {self.get_pause_minutes()} Minuten bis zum nächsten Lauf.",
-                                "info",
-                            )
-                            self.increment_cycle_count()
-
-                            if self.get_current_cycle_count() >= self.get_repeats():
-                                log_message(
-                                    f"Alle Läufe ({self.get_repeats()}) abgeschlossen.",
-                                    "info",
-                                )
-                                log_message("Beende Arduino", "info")
-                                self.send_command("END")
-                                self.polling_active = False
-                                break
-                            else:
-                                self.reset_move_count()
-                                self.setup_cycle_directory()
-                                self.send_command("NEXT_CYCLE")
-
-                        elif command == "ABORTED":
-                            log_message("Daten-Abbruch bestätigt (ABORTED).", "info")
-                            self.polling_active = False
-                            break
-
-                        elif command == "TIMEOUT":
-                            log_message("Arduino hat TIMEOUT gemeldet!", "error")
-                            self.polling_active = False
-                            break
-                else:
-                    log_message("Serielle Verbindung nicht verfügbar!", "error")
-                    self.polling_active = False
+                try:
+                    command = self.read_frame()
+                except (serial.SerialException, OSError) as e:
+                    # Während eines Laufs neu verbinden statt aufzuhören
+                    if self.recover_link(e):
+                        continue
+                    raise
+                if command is None:
+                    continue
+
+                self.record_event("frame_received", frame=command)
+                self.handle_frame(command)
 
             except Exception as e:
                 log_message(f"Fehler im Polling: {e}", "error")
-                self.polling_active = False
+                self.record_event("error", source="polling", message=str(e))
+                lost = isinstance(e, (serial.SerialException, OSError))
+                self.end_run("link_failed" if lost else "error")
 
+        if self.run_open:
+            # Von außen gestoppt (Abbruch über GUI oder Status-Server)
+            self.end_run(self.stop_status)
         log_message("Daten-Abfrage beendet.", "info")
 
+    def read_frame(self):
+        """Nächster Rahmen <...> vom Arduino oder None, wenn keiner anliegt."""
+        connection = self.serial_connection
+        if not (connection and connection.is_open):
+            raise serial.SerialException("Serielle Verbindung nicht verfügbar!")
+        if self.link is not None:
+            self.link.check()
+        if connection.in_waiting <= 0:
+            return None
+
+        raw_line = connection.readline().decode("utf-8", errors="ignore").strip()
+        if raw_line.startswith("<") and raw_line.endswith(">") and len(raw_line) > 2:
+            return raw_line[1:-1].strip()
+        return None
+
+    def recover_link(self, reason):
+        """Stellt die Verbindung während eines Laufs wieder her; False = aufgeben."""
+        if self.link is None or not self.polling_active:
+            return False
+        return self.link.recover(reason)
+
+    def handle_frame(self, command):
+        """Reagiert auf einen Statusrahmen der Firmware."""
+        if command == "MOVE_COMPLETED":
+            log_message("<= Raspberry: 'MOVE_COMPLETED'", "info")
+            self.last_station = (self.CYCLE_COUNT, self.MOVE_COUNT)
+            self.take_photo()
+            if self.eta is not None:
+                self.eta.station_done(
+                    self.get_current_cycle_count(),
+                    self.get_current_move_count(),
+                )
+
+            if self.get_current_move_count() + 1 >= TOTAL_STATIONS:
+                # Warte auf <CYCLE_COMPLETED> vom Arduino
+                log_message(
+                    "Alle Positionen erreicht, warte auf CYCLE_COMPLETED.",
+                    "info",
+                )
+            else:
+                self.increment_move_count()
+                self.send_command("NEXT_MOVE")
+
+        elif command == "CYCLE_COMPLETED":
+            log_message("Arduino meldet CYCLE_COMPLETED.", "info")
+            self.collect_photos(wait=True)
+            log_message(
+                f"Pausiere {self.get_pause_minutes()} Minuten bis zum nächsten Lauf.",
+                "info",
+            )
+            self.increment_cycle_count()
+
+            if self.get_current_cycle_count() >= self.get_repeats():
+                log_message(
+                    f"Alle Läufe ({self.get_repeats()}) abgeschlossen.",
+                    "info",
+                )
+                log_message("Beende Arduino", "info")
+                self.send_command("END")
+                self.end_run("completed")
+            elif self.cadence is not None:
+                # Pause aus der beobachteten Veränderung aller Wells des Cycles
+                self.collect_analysis(wait=True, only="cadence")
+                pause_s = self.cadence.next_pause(self.get_current_cycle_count() - 1)
+                self.record_event("cadence", pause_s=round(pause_s, 1))
+                # Für die Wiedergabe: dieselbe Pause statt neu berechnet
+                self.annotate_transcript(
+                    "cadence",
+                    cycle=self.get_current_cycle_count() - 1,
+                    pause_ms=int(pause_s * 1000),
+                )
+                self.next_cycle_at = self.clock.time() + pause_s
+                if self.eta is not None:
+                    self.eta.cycle_done(pause_s)
+                self.reset_move_count()
+                self.setup_cycle_directory()
+                self.send_command(f"NEXT_CYCLE_{int(pause_s * 1000)}")
+            else:
+                self.next_cycle_at = self.clock.time() + self.get_pause_minutes() * 60
+                if self.eta is not None:
+                    self.eta.cycle_done(self.get_pause_minutes() * 60)
+                self.reset_move_count()
+                self.setup_cycle_directory()
+                self.send_command("NEXT_CYCLE")
+
+        elif command == "ABORTED":
+            log_message("Daten-Abbruch bestätigt (ABORTED).", "info")
+            self.end_run("aborted")
+
+        elif command == "TIMEOUT":
+            log_message("Arduino hat TIMEOUT gemeldet!", "error")
+            self.end_run("timeout")
+
+    def end_run(self, status):
+        """Beendet den Lauf, ohne bereits aufgenommene Bilder zu verlieren."""
+        self.collect_photos(wait=True)
+        self.collect_analysis(wait=True)
+        self.run_open = False
+        self.record_event("run_end", status=status)
+        self.update_timing_model()
+        self.next_cycle_at = None
+        self.polling_active = False
+
     # Laufverzeichnis erstellen
     def setup_run_directory(self):
         """Erstellt den Run-Ordner."""
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        timestamp = self.strftime("%Y%m%d_%H%M%S")
         self.run_id = f"run_{timestamp}"
-        self.RUN_DIR = os.path.join(IMAGES_DIR, self.run_id)
+        self.RUN_DIR = os.path.join(self.images_dir, self.run_id)
         os.makedirs(self.RUN_DIR, exist_ok=True)
         log_message(f"Laufverzeichnis erstellt: {self.RUN_DIR}")
+        self.run_repeats = self.get_repeats()
+        self.run_pause_minutes = self.get_pause_minutes()
+        self.next_cycle_at = None
+        self.last_station = None
+        self.latest_images = {}
+        self.run_open = True
+        self.stop_status = "stopped"
+
+        if REGISTRATION_ENABLED:
+            # Import hier, da die Registrierung NumPy/Pillow benötigt
+            from packages.registration import WellRegistrar
+
+            self.registrar = WellRegistrar(
+                self.RUN_DIR, aligned_output=REGISTRATION_ALIGNED_OUTPUT
+            )
+
+        if CUBE_ENABLED:
+            from packages.timeseries_cube import CubeWriter
+
+            self.cube_writer = CubeWriter(self.RUN_DIR)
+
+        self.cadence = None
+        if ADAPTIVE_CADENCE_ENABLED:
+            from packages.cadence import AdaptiveCadence
+
+            self.cadence = AdaptiveCadence(self.RUN_DIR, self.run_pause_minutes * 60)
+
+        prediction = {}
+        self.eta = None
+        if PLANNER_ENABLED:
+            from packages.planner import EtaTracker, predict_run
+
+            prediction = predict_run(self.run_repeats, self.run_pause_minutes)
+            self.eta = EtaTracker(prediction, self.run_repeats, clock=self.clock)
+        self.annotate_transcript(
+            "run_start",
+            run_id=self.run_id,
+            repeats=self.run_repeats,
+            pause_minutes=self.run_pause_minutes,
+        )
+        self.record_event(
+            "run_start",
+            repeats=self.run_repeats,
+            pause_minutes=self.run_pause_minutes,
+            run_dir=self.RUN_DIR,
+            plate_type=PLATE_TYPE,
+            encoder=ENCODER_BACKEND,
+            predicted_cycle_s=prediction.get("cycle_s"),
+            predicted_total_s=prediction.get("total_s"),
+        )
+
+    def update_timing_model(self):
+        """Führt das Zeitmodell der Laufplanung mit diesem Lauf nach."""
+        if self.eta is None or self.journal is None:
+            return
+        from packages.planner import learn_run, log_file_size
+
+        log_bytes = None
+        if self.eta.log_size is not None and log_file_size() is not None:
+            log_bytes = log_file_size() - self.eta.log_size
+        try:
+            learn_run(self.journal.directory, self.run_id, log_bytes)
+        except (OSError, ValueError) as e:
+            log_message(f"Zeitmodell nicht aktualisiert: {e}", "warning")
 
     # Rundenverzeichnis erstellen
     def setup_cycle_directory(self):
@@ -309,6 +637,17 @@ class CameraSerialManager:
 
         return col_value, row_value
 
+    # Dateiname der nächsten Aufnahme
+    def photo_path(self):
+        """Gibt (well, filepath) für die aktuelle Position zurück."""
+        timestamp = self.strftime("%Y%m%d_%H%M%S")
+        col_value, row_value = self.get_current_position()
+        well = f"{row_value}{col_value}"
+        filepath = os.path.join(self.CURRENT_CYCLE_DIR, f"{timestamp}_{well}.jpg")
+        if self.encoder is not None:
+            filepath = self.encoder.path_for(filepath)
+        return well, filepath
+
     # Bild aufnehmen
     def take_photo(self):
         log_message("Nehme Bild auf...")
@@ -316,27 +655,124 @@ class CameraSerialManager:
             log_message("🚨 Kamera nicht initialisiert!", "error")
             return
 
-        sensor_size = self.picam.sensor_resolution
-        width, height = sensor_size
+        well, filepath = self.photo_path()
+        start = time.perf_counter()
+        try:
+            # Aufnahme mit höchster Priorität über den Kameradienst
+            if self.encoder is None:
+                self.camera.capture_file(
+                    filepath, crop_fraction=self.crop_fraction, priority=PRIORITY_RUN
+                ).result(timeout=CAMERA_TIMEOUT)
+            else:
+                array, metadata = self.camera.capture_frame(
+                    crop_fraction=self.crop_fraction, priority=PRIORITY_RUN
+                ).result(timeout=CAMERA_TIMEOUT)
+        except Exception as e:
+            log_message(f"Fehler bei der Bildaufnahme: {e}", "error")
+            self.record_event(
+                "error", source="camera", well=well, message=str(e) or repr(e)
+            )
+            return
 
-        new_width, new_height = int(width * 0.6), int(height * 0.6)
-        x = (width - new_width) // 2
-        y = (height - new_height) // 2
+        captured = time.perf_counter()
+        if self.encoder is None:
+            log_message(f"Bild aufgenommen: {filepath}")
+            self.record_event(
+                "capture_done",
+                well=well,
+                path=filepath,
+                duration_ms=round((captured - start) * 1000, 1),
+                capture_ms=round((captured - start) * 1000, 1),
+            )
+            self.process_photo(well, filepath, self.CYCLE_COUNT)
+            return
 
-        self.picam.set_controls({"ScalerCrop": (x, y, new_width, new_height)})
-        log_message(
-            f"Bildausschnitt: x={x}, y={y}, width={new_width}, height={new_height}"
+        # Kodieren im Pool, währenddessen fährt der Tisch weiter; die Zeiten
+        # je Phase (Kamera, Kodieren samt Wartezeit im Pool) gehen ins Journal
+        times = {"start": start, "captured": captured}
+        future = self.encoder.submit(array, filepath, metadata)
+        future.add_done_callback(
+            lambda _: times.setdefault("encoded", time.perf_counter())
         )
+        self.pending_photos.append((well, filepath, self.CYCLE_COUNT, times, future))
+        self.collect_photos()
 
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        col_value, row_value = self.get_current_position()
-        filename = f"{timestamp}_{row_value}{col_value}.jpg"
-        filepath = os.path.join(self.CURRENT_CYCLE_DIR, filename)
+    def collect_photos(self, wait=False):
+        """
+        Übernimmt fertig kodierte Aufnahmen (im Polling-Thread); mit wait=True
+        wird auf alle ausstehenden gewartet, z. B. am Ende eines Cycles.
+        """
+        pending = []
+        for well, filepath, cycle, times, future in self.pending_photos:
+            if not wait and not future.done():
+                pending.append((well, filepath, cycle, times, future))
+                continue
+            try:
+                size = future.result(timeout=CAMERA_TIMEOUT)
+            except Exception as e:
+                log_message(f"Fehler beim Kodieren ({well}): {e}", "error")
+                self.record_event(
+                    "error", source="encoder", well=well, message=str(e) or repr(e)
+                )
+                continue
+            log_message(f"Bild aufgenommen: {filepath}")
+            now = time.perf_counter()
+            encoded = times.get("encoded", now)
+            self.record_event(
+                "capture_done",
+                well=well,
+                path=filepath,
+                bytes=size,
+                duration_ms=round((now - times["start"]) * 1000, 1),
+                capture_ms=round((times["captured"] - times["start"]) * 1000, 1),
+                encode_ms=round((encoded - times["captured"]) * 1000, 1),
+            )
+            self.process_photo(well, filepath, cycle)
+        self.pending_photos = pending
 
-        time.sleep(0.2)
+    def collect_analysis(self, wait=False, only=None):
+        """
+        Meldet Fehler abgeschlossener Auswertungen; mit wait=True wird auf
+        alle ausstehenden gewartet (bzw. nur auf die der Quelle only), z. B.
+        am Ende eines Laufs.
+        """
+        pending = []
+        for well, source, future in self.pending_analysis:
+            waiting = wait and only in (None, source)
+            if not waiting and not future.done():
+                pending.append((well, source, future))
+                continue
+            try:
+                future.result()
+            except Exception as e:
+                log_message(
+                    f"Fehler bei der Auswertung ({source}, {well}): {e}", "error"
+                )
+                self.record_event(
+                    "error", source=source, well=well, message=str(e) or repr(e)
+                )
+        self.pending_analysis = pending
+
+    def process_photo(self, well, filepath, cycle):
+        """Reicht eine fertige Aufnahme an Registrierung, Takt und Würfel weiter."""
+        self.latest_images[well] = filepath
+
+        # Die Firmware wartet nur RESPONSE_TIMEOUT auf NEXT_MOVE, daher laufen
+        # Registrierung, Takt und Würfel im Analyse-Thread
+        if self.registrar is not None:
+            future = self.analysis.submit(
+                self.registrar.register, well, filepath, cycle
+            )
+            self.pending_analysis.append((well, "registration", future))
 
-        try:
-            self.picam.capture_file(filepath)
-            log_message(f"Bild aufgenommen: {filepath}")
-        except Exception as e:
-            log_message(f"Fehler bei der Bildaufnahme: {e}", "error")
+        if self.cadence is not None:
+            future = self.analysis.submit(self.cadence.add, well, filepath)
+            self.pending_analysis.append((well, "cadence", future))
+
+        if self.cube_writer is not None:
+            future = self.analysis.submit(
+                self.cube_writer.add, cycle, well, filepath, self.clock.time()
+            )
+            self.pending_analysis.append((well, "cube", future))
+
+        self.collect_analysis()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+"""
+Kameradienst: genau ein Thread besitzt die Picamera2-Instanz.
+
+Alle Zugriffe (automatische Aufnahmen des Laufs, manuelle Fotos aus der
+GUI, Vorschaubilder, Umkonfiguration) werden als Aufträge in eine
+Prioritäts-Warteschlange gestellt und liefern ein Future zurück:
+
+    PRIORITY_RUN     automatischer Lauf (immer zuerst)
+    PRIORITY_MANUAL  manuelle Bedienung
+    PRIORITY_PREVIEW Vorschau (höchstens ein offener Auftrag)
+
+Die Kamera wird einmal geöffnet, gestartet und bis zum shutdown()
+wiederverwendet.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from packages.encoders import to_rgb
+from packages.logger import log_message
+from packages.sensor_modes import crop_rect
+
+PRIORITY_SHUTDOWN = -1
+PRIORITY_RUN = 0
+PRIORITY_MANUAL = 1
+PRIORITY_PREVIEW = 2
+
+
+class CameraUnavailable(Exception):
+    pass
+
+
+class CameraService:
+    def __init__(self, picam=None, clock=time, settle_s=0.2):
+        """
+        picam: bereits geöffnete Kamera (z. B. Ersatz bei der Wiedergabe);
+        ohne Angabe wird Picamera2 im Besitzer-Thread geöffnet.
+        """
+        self.picam = picam
+        self.clock = clock
+        self.settle_s = settle_s
+        self._external = picam is not None
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._thread = None
+        self._ready = threading.Event()
+        self._preview_lock = threading.Lock()
+        self._pending_preview = None
+        self._current_controls = {}
+
+    # =============================================
+    # Lebenszyklus
+    # =============================================
+
+    def start(self, timeout=15):
+        """Startet den Besitzer-Thread und wartet, bis die Kamera bereit ist."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=timeout)
+
+    @property
+    def available(self):
+        return self.picam is not None
+
+    def shutdown(self, timeout=5):
+        """Beendet den Dienst; offene Aufträge werden abgebrochen."""
+        if self._thread is None:
+            return
+        self._queue.put((PRIORITY_SHUTDOWN, next(self._counter), None))
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _open_camera(self):
+        """Sichere Initialisierung der Kamera mit Fehlerprüfung."""
+        # Import hier, damit der Dienst auch ohne Kamera-Bibliothek nutzbar ist
+        from picamera2 import Picamera2
+
+        log_message("Starte init_camera...", "info")
+        try:
+            self.picam = Picamera2()
+            time.sleep(2)  # Wartezeit für Kamera-Initialisierung
+
+            log_message("Kamera erfolgreich erstellt.", "info")
+
+            # Prüfen, ob Kamera verfügbar ist
+            if not hasattr(self.picam, "camera_config"):
+                log_message("Kamera-Konfiguration ist nicht verfügbar!", "error")
+                self.picam = None
+                return
+
+            log_message("Kamera wird konfiguriert...", "info")
+            self.picam.configure(self.picam.create_still_configuration())
+
+            if self.picam.started:
+                log_message("Kamera läuft bereits, überspringe start().", "info")
+            else:
+                log_message("Kamera wird gestartet...", "info")
+                self.picam.start()
+
+            log_message("Kamera erfolgreich gestartet.", "info")
+
+        except Exception as e:
+            log_message(f"Kamera-Fehler: {e}", "error")
+            self.picam = None
+
+    def _close_camera(self):
+        if self.picam is None or self._external:
+            return
+        try:
+            log_message("Stoppe Kamera...", "info")
+            self.picam.stop()
+            self.picam.close()
+            log_message("Kamera gestoppt.", "info")
+        except Exception as e:
+            log_message(f"Fehler beim Schließen der Kamera: {e}", "error")
+        self.picam = None
+
+    def _run(self):
+        if self.picam is None:
+            self._open_camera()
+        self._ready.set()
+
+        while True:
+            priority, _, request = self._queue.get()
+            if request is None:
+                break
+            future, func = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.picam is None:
+                    raise CameraUnavailable("Kamera nicht initialisiert!")
+                future.set_result(func(self.picam))
+            except Exception as e:
+                future.set_exception(e)
+
+        # Verbliebene Aufträge abbrechen
+        while True:
+            try:
+                _, _, request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[0].cancel()
+        self._close_camera()
+
+    # =============================================
+    # Aufträge
+    # =============================================
+
+    def submit(self, func, priority=PRIORITY_MANUAL):
+        """Führt func(picam) im Besitzer-Thread aus und liefert ein Future."""
+        future = Future()
+        if self._thread is None:
+            future.set_exception(CameraUnavailable("Kameradienst nicht gestartet!"))
+            return future
+        self._queue.put((priority, next(self._counter), (future, func)))
+        return future
+
+    def _apply_controls(self, picam, controls):
+        """Setzt geänderte Controls und wartet, bis sie greifen."""
+        changed = {
+            key: value
+            for key, value in (controls or {}).items()
+            if self._current_controls.get(key) != value
+        }
+        if changed:
+            log_message(f"Kamera-Controls: {changed}")
+            picam.set_controls(changed)
+            self._current_controls.update(changed)
+            self.clock.sleep(self.settle_s)
+
+    def crop_controls(self, picam, crop_fraction):
+        """ScalerCrop für einen zentrierten Ausschnitt des Sensors."""
+        return {"ScalerCrop": crop_rect(picam.sensor_resolution, crop_fraction)}
+
+    def capture_file(
+        self, filepath, crop_fraction=None, controls=None, priority=PRIORITY_RUN
+    ):
+        def capture(picam):
+            merged = dict(controls or {})
+            if crop_fraction is not None:
+                merged.update(self.crop_controls(picam, crop_fraction))
+            self._apply_controls(picam, merged)
+            picam.capture_file(filepath)
+            return filepath
+
+        return self.submit(capture, priority)
+
+    def capture_array(self, stream="main", controls=None, priority=PRIORITY_MANUAL):
+        def capture(picam):
+            self._apply_controls(picam, controls)
+            return picam.capture_array(stream)
+
+        return self.submit(capture, priority)
+
+    def capture_frame(
+        self, stream="main", crop_fraction=None, controls=None, priority=PRIORITY_RUN
+    ):
+        """
+        Nimmt ein Bild als Array samt Metadaten desselben Frames auf, zum
+        Kodieren außerhalb des Kamera-Threads. Liefert (array, metadata).
+        """
+
+        def capture(picam):
+            merged = dict(controls or {})
+            if crop_fraction is not None:
+                merged.update(self.crop_controls(picam, crop_fraction))
+            self._apply_controls(picam, merged)
+            request = picam.capture_request()
+            try:
+                array = request.make_array(stream)
+                metadata = dict(request.get_metadata())
+            finally:
+                request.release()
+            metadata["PixelFormat"] = picam.camera_config[stream]["format"]
+            return array, metadata
+
+        return self.submit(capture, priority)
+
+    def preview_frame(self, stream="main", max_size=None):
+        """
+        Vorschaubild (RGB-Array) mit niedrigster Priorität, mit max_size
+        schon im Kamera-Thread grob verkleinert. Ist bereits eine Vorschau
+        offen, wird deren Future zurückgegeben statt einen weiteren Auftrag
+        einzureihen.
+        """
+
+        def capture(picam):
+            array = picam.capture_array(stream)
+            if max_size:
+                step = max(1, -(-max(array.shape[:2]) // max_size))
+                array = array[::step, ::step]
+            return to_rgb(array, picam.camera_config[stream]["format"])
+
+        with self._preview_lock:
+            pending = self._pending_preview
+            if pending is not None and not pending.done():
+                return pending
+            future = self.submit(capture, PRIORITY_PREVIEW)
+            self._pending_preview = future
+            return future
+
+    def reconfigure(self, make_config, priority=PRIORITY_MANUAL):
+        """
+        Konfiguriert die Kamera neu; make_config(picam) liefert die neue
+        Konfiguration (z. B. picam.create_still_configuration(...)).
+        """
+
+        def apply(picam):
+            picam.stop()
+            picam.configure(make_config(picam))
+            picam.start()
+            self._current_controls = {}
+            return picam.camera_config
+
+        return self.submit(apply, priority)
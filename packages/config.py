@@ -16,9 +16,129 @@ FIRMWARE_DIR = os.path.join(BASE_DIR, "firmware")
 # Arduino
 ARDUINO_CLI_PATH = "arduino-cli"  # Pfad zur arduino-cli
 FQBN = "arduino:avr:uno"  # Board-Typ
-SERIAL_PORT = "/dev/ttyACM0"  # Arduino-Port (/dev/ttyACM0 für Linux)
+SERIAL_PORT = "/dev/ttyACM0"  # Ersatz, falls kein Gerät per USB-Kennung gefunden wird
+SERIAL_USB_VID = 0x2341  # Arduino SA (Nachbauten mit CH340: 0x1A86); None = beliebig
+SERIAL_USB_PID = None  # z. B. 0x0043 für den Uno R3; None = beliebig
+SERIAL_USB_SERIAL = None  # Seriennummer des Boards, falls mehrere angeschlossen sind
 BAUD_RATE = 9600  # Muss zum Sketch passen
 TEMPLATE_FILE = os.path.join(BASE_DIR, "templates", "config_template.h")
 CONFIG_FILE = os.path.join(FIRMWARE_DIR, "config.h")
 
 RESPONSE_TIMEOUT = 3500
+
+# Wiederherstellung der seriellen Verbindung während eines Laufs
+SERIAL_RECONNECT_TIMEOUT_S = 600  # danach wird der Lauf wie bisher beendet
+SERIAL_RECONNECT_BACKOFF_S = (0.5, 10)  # erste und längste Wartezeit zwischen Versuchen
+SERIAL_HANDSHAKE_TIMEOUT_S = 6  # Neustart des Boards (Bootloader) eingeschlossen
+SERIAL_CHECK_INTERVAL_S = 1  # so oft wird geprüft, ob das Gerät noch vorhanden ist
+
+# Serielles Transkript (Aufzeichnung aller Bytes für Wiedergabe/Regression)
+SERIAL_TRANSCRIPT_ENABLED = True
+TRANSCRIPTS_DIR = os.path.join(LOGS_DIR, "transcripts")
+SERIAL_TRANSCRIPT_MAX_BYTES = 8 * 1024 * 1024  # Größe, ab der ein Segment komprimiert wird
+SERIAL_TRANSCRIPT_KEEP_SEGMENTS = 50  # älteste Segmente darüber hinaus löschen
+
+# Motorbewegung (Standardprofil, falls keine Optimierung vorliegt)
+# Mechanik: wird beim Generieren von config.h in das Template eingesetzt
+STEPS_BASE_VALUE = 200  # Vollschritte je Umdrehung
+MICROSTEPS_PER_STEP = 16
+STEPS_PER_REVOLUTION = STEPS_BASE_VALUE * MICROSTEPS_PER_STEP
+DISTANCE_COLS = 1.2  # Umdrehungen zwischen zwei Spalten
+DISTANCE_ROWS = 0.24  # Umdrehungen zwischen zwei Reihen
+DEFAULT_MAX_SPEED = 8000
+DEFAULT_ACCEL = 3200
+MOTION_PROFILE_FILE = os.path.join(BASE_DIR, "motion_profile.json")
+
+# Bewegungsprofil-Optimierung
+TUNING_SPEED_STEP = 1.25  # Faktor je Stufe für Geschwindigkeit und Beschleunigung
+TUNING_MAX_SPEED = 20000
+TUNING_MAX_ACCEL = 20000
+TUNING_REPETITIONS = 5  # Hin- und Rückfahrten je Stufe
+TUNING_MAX_OFFSET_PX = 2.0  # Erlaubter Versatz des Referenzbildes
+TUNING_SAFETY_FACTOR = 0.85  # Abschlag auf das schnellste bestandene Profil
+
+# Registrierung (Ausrichtung der Well-Bilder über die Cycles)
+REGISTRATION_ENABLED = True
+REGISTRATION_ALIGNED_OUTPUT = False  # ausgerichtete, eng beschnittene Kopien
+REGISTRATION_ALIGNED_CROP = 0.8  # Anteil des aufgenommenen Bildes
+REGISTRATION_MAX_SIZE = 256  # Kantenlänge der verkleinerten Vergleichsbilder
+REGISTRATION_WORKERS = os.cpu_count() or 1
+
+# Zeitreihen-Würfel (alle Wells eines Laufs als memmap-Array)
+# Unkomprimiert ca. 147 KB je Well und Cycle (RGB), daher nur auf Wunsch
+CUBE_ENABLED = False
+CUBE_SIZE = (256, 192)  # Analyseauflösung (Breite, Höhe) je Well
+CUBE_CHANNELS = 3  # 3 = RGB, 1 = Graustufen
+
+# Status-Server (Fernüberwachung per Browser)
+STATUS_SERVER_ENABLED = False
+STATUS_SERVER_HOST = "0.0.0.0"
+STATUS_SERVER_PORT = 8080
+STATUS_SERVER_TOKEN = None  # Token für POST /api/abort, None = Abbruch gesperrt
+STATUS_SERVER_CLIENT_RATE = 256 * 1024  # Bytes/s je Client
+
+# Kamera
+CROP_FRACTION = 0.6  # zentrierter Bildausschnitt (ScalerCrop) je Well
+CAMERA_TIMEOUT = 30  # Sekunden, die auf eine Aufnahme gewartet wird
+PREVIEW_SIZE = (640, 480)  # Vorschaufenster (packages/preview.py)
+PREVIEW_INTERVAL_MS = 250  # Abstand der Vorschaubilder, Läufe haben Vorrang
+
+# Ereignis-Journal (strukturierte Laufhistorie, siehe packages/journal.py)
+JOURNAL_ENABLED = True
+JOURNAL_DIR = os.path.join(LOGS_DIR, "journal")
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024  # Größe, ab der ein Segment komprimiert wird
+JOURNAL_KEEP_SEGMENTS = 500  # älteste Segmente darüber hinaus löschen
+
+# Sensormodus und Ausgabegröße (siehe packages/sensor_modes.py)
+SENSOR_MODE_SELECTION = True  # kleinsten passenden Sensormodus wählen
+PLATE_TYPE = "24well"
+PLATE_OUTPUT_SIZES = {  # Zielauflösung (Breite, Höhe) des Ausschnitts je Well
+    "6well": (2028, 1520),
+    "12well": (1600, 1200),
+    "24well": (1200, 900),
+    "48well": (960, 720),
+    "96well": (640, 480),
+}
+JPEG_BYTES_PER_PIXEL = 0.3  # Erfahrungswert für die Schätzung der Dateigröße
+
+# Experimente (mehrere Well-Gruppen mit eigenem Intervall, siehe packages/experiments.py)
+EXPERIMENTS_FILE = os.path.join(BASE_DIR, "experiments.json")
+EXPERIMENT_MERGE_WINDOW_S = 120  # bald fällige Experimente in denselben Durchgang
+EXPERIMENT_MOVE_TIMEOUT = 30  # Sekunden je Anfahrt eines Wells
+EXPERIMENT_HOME_BETWEEN_BATCHES = True
+
+# Adaptive Taktsteuerung (Pause je nach Veränderung der Wells, siehe packages/cadence.py)
+ADAPTIVE_CADENCE_ENABLED = False
+ADAPTIVE_MIN_PAUSE_MIN = 5
+ADAPTIVE_MAX_PAUSE_MIN = 240
+ADAPTIVE_TARGET_CHANGE = 0.02  # angestrebte Veränderung je Cycle (0..1)
+ADAPTIVE_MAX_STEP = 2.0  # höchstens halbieren bzw. verdoppeln je Cycle
+ADAPTIVE_FRAME_SIZE = 64  # Kantenlänge der Vergleichsbilder
+
+# Bild-Encoder (siehe packages/encoders.py)
+ENCODER_BACKEND = "camera"  # camera (capture_file), jpeg, webp, png, tiff, raw
+ENCODER_QUALITY = 90  # jpeg/webp
+ENCODER_WEBP_LOSSLESS = False
+ENCODER_PNG_LEVEL = 1  # zlib-Stufe 0-9, 1 = schnell
+ENCODER_TIFF_COMPRESSION = None  # None = unkomprimiert, sonst z. B. "tiff_deflate"
+ENCODER_WORKERS = max(1, (os.cpu_count() or 1) - 1)  # Kamera-Thread bleibt frei
+ENCODER_POOL = "thread"  # "thread" oder "process"
+
+# Well-Kalibrierung (Zentrierung je Well, siehe packages/well_calibration.py)
+CALIBRATION_FILE = os.path.join(BASE_DIR, "well_calibration.json")
+CALIBRATION_FRAME_SIZE = 256  # Kantenlänge des Suchbilds
+CALIBRATION_RADIUS_RANGE = (0.2, 0.5)  # Well-Radius relativ zur kürzeren Bildseite
+CALIBRATION_MIN_CONTRAST = 1.5  # Rand muss sich so deutlich vom Rest abheben
+CALIBRATION_RIM_SAMPLES = 180  # Strahlen für die Kreisanpassung des Rands
+CALIBRATION_PROBE_STEPS = 400  # Testversatz zur Bestimmung von Pixel je Schritt
+CALIBRATION_ITERATIONS = 3  # Durchgänge: anfahren, messen, korrigieren
+CALIBRATION_TOLERANCE_PX = 4  # Restversatz, ab dem ein Well als zentriert gilt
+CALIBRATION_CROP_MARGIN = 1.1  # Ausschnitt = Well-Durchmesser * Reserve
+CALIBRATED_CROP = True  # kalibrierten Ausschnitt statt CROP_FRACTION verwenden
+
+# Laufplanung (Dauer, Speicher und Restzeit aus gemessenen Zeiten, siehe packages/planner.py)
+PLANNER_ENABLED = True
+PLANNER_MODEL_FILE = os.path.join(BASE_DIR, "timing_model.json")
+PLANNER_LEARNING_RATE = 0.3  # Gewicht eines neuen Laufs im Zeitmodell
+PLANNER_DEFAULT_STATION_S = 2.0  # Aufnahme und Kommunikation je Station ohne Messwerte
+PLANNER_DISK_RESERVE = 1024**3  # Bytes, die nach einem Lauf frei bleiben sollen
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Austauschbare Bild-Encoder für die Aufnahmen.
+
+Mit ENCODER_BACKEND = "camera" schreibt picam.capture_file() wie bisher ein
+JPEG im Kamera-Thread. Alle anderen Backends bekommen das Bild als Array
+aus dem Kameradienst und kodieren es in einem Pool (ENCODER_WORKERS), der
+die freien Kerne des Pi nutzt, während der Tisch schon weiterfährt:
+
+    jpeg  Pillow, Qualität ENCODER_QUALITY
+    webp  Pillow, Qualität ENCODER_QUALITY oder verlustfrei
+    png   verlustfrei, zlib-Stufe ENCODER_PNG_LEVEL
+    tiff  verlustfrei, ENCODER_TIFF_COMPRESSION
+    raw   NumPy-Array (.npy) mit Metadaten der Aufnahme (.json daneben)
+
+Einstellungen lassen sich je Aufruf überschreiben, z. B. je Experiment.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from packages.config import (ENCODER_BACKEND, ENCODER_PNG_LEVEL, ENCODER_POOL,
+                             ENCODER_QUALITY, ENCODER_TIFF_COMPRESSION,
+                             ENCODER_WEBP_LOSSLESS, ENCODER_WORKERS)
+
+CAMERA_BACKEND = "camera"
+
+
+class EncoderError(Exception):
+    pass
+
+
+def default_options():
+    return {
+        "quality": ENCODER_QUALITY,
+        "lossless": ENCODER_WEBP_LOSSLESS,
+        "png_level": ENCODER_PNG_LEVEL,
+        "tiff_compression": ENCODER_TIFF_COMPRESSION,
+    }
+
+
+def to_rgb(array, pixel_format=None):
+    """Bringt ein Picamera2-Array in RGB-Reihenfolge ohne Füllkanal."""
+    array = np.asarray(array)
+    if array.ndim == 3:
+        if array.shape[2] == 4:
+            array = array[..., :3]
+        # "RGB888"/"XRGB8888" liegen bei Picamera2 als [B, G, R] im Speicher
+        if pixel_format in ("RGB888", "XRGB8888"):
+            array = array[..., ::-1]
+    return np.ascontiguousarray(array)
+
+
+def encode_jpeg(array, path, options):
+    Image.fromarray(array).save(path, format="JPEG", quality=options["quality"])
+
+
+def encode_webp(array, path, options):
+    Image.fromarray(array).save(
+        path,
+        format="WEBP",
+        quality=options["quality"],
+        lossless=options["lossless"],
+    )
+
+
+def encode_png(array, path, options):
+    Image.fromarray(array).save(path, format="PNG", compress_level=options["png_level"])
+
+
+def encode_tiff(array, path, options):
+    Image.fromarray(array).save(
+        path, format="TIFF", compression=options["tiff_compression"]
+    )
+
+
+def encode_raw(array, path, options):
+    np.save(path, array, allow_pickle=False)
+
+
+# Backend -> (Dateiendung, Funktion)
+ENCODERS = {
+    "jpeg": ("jpg", encode_jpeg),
+    "webp": ("webp", encode_webp),
+    "png": ("png", encode_png),
+    "tiff": ("tiff", encode_tiff),
+    "raw": ("npy", encode_raw),
+}
+
+
+def extension(backend):
+    if backend == CAMERA_BACKEND:
+        return "jpg"
+    if backend not in ENCODERS:
+        raise EncoderError(f"Unbekannter Encoder: {backend!r}")
+    return ENCODERS[backend][0]
+
+
+def metadata_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def encode_file(backend, array, path, options, metadata=None):
+    """
+    Kodiert array nach path (im Pool-Worker). Gibt die geschriebenen Bytes
+    zurück; bei raw einschließlich der Metadaten-Datei.
+    """
+    metadata = metadata or {}
+    array = to_rgb(array, metadata.get("PixelFormat"))
+    ENCODERS[backend][1](array, path, options)
+    size = os.path.getsize(path)
+    if backend == "raw":
+        with open(metadata_path(path), "w", encoding="utf-8") as f:
+            json.dump(
+                dict(metadata, shape=list(array.shape), dtype=str(array.dtype)),
+                f,
+                indent=2,
+                default=str,
+            )
+        size += os.path.getsize(metadata_path(path))
+    return size
+
+
+def open_image(path):
+    """Öffnet eine Aufnahme als PIL-Bild, auch im raw-Format (.npy)."""
+    if path.endswith(".npy"):
+        return Image.fromarray(np.load(path, allow_pickle=False))
+    return Image.open(path)
+
+
+class ImageEncoder:
+    def __init__(
+        self,
+        backend=ENCODER_BACKEND,
+        workers=ENCODER_WORKERS,
+        pool=ENCODER_POOL,
+        **options,
+    ):
+        # Wer ein Array kodieren muss, kann nicht auf capture_file ausweichen
+        if backend == CAMERA_BACKEND:
+            backend = "jpeg"
+        extension(backend)
+        self.backend = backend
+        self.options = dict(default_options(), **options)
+        self.workers = workers
+        if pool == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="encoder"
+            )
+
+    def settings(self, backend=None, **options):
+        """Backend und Optionen mit den Vorgaben dieses Encoders aufgefüllt."""
+        backend = backend or self.backend
+        if backend == CAMERA_BACKEND:
+            backend = "jpeg"
+        extension(backend)
+        return backend, dict(self.options, **options)
+
+    def path_for(self, path, backend=None):
+        """Ersetzt die Dateiendung passend zum Backend."""
+        return f"{os.path.splitext(path)[0]}.{extension(backend or self.backend)}"
+
+    def submit(self, array, path, metadata=None, backend=None, **options):
+        """Kodiert im Pool; das Future liefert die geschriebenen Bytes."""
+        backend, options = self.settings(backend, **options)
+        return self._executor.submit(
+            encode_file, backend, array, path, options, metadata
+        )
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
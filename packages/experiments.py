@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+
+"""
+Mehrere Experimente auf einer Platte mit eigenen Wells und Intervallen.
+
+Die Experimente stehen in EXPERIMENTS_FILE, z. B.:
+    {"experiments": [
+        {"name": "wachstum", "wells": "A1-B6", "interval_minutes": 10, "cycles": 144},
+        {"name": "kontrolle", "wells": ["C1", "D1-D6"], "interval_minutes": 60,
+         "cycles": 24, "encoder": {"backend": "png", "png_level": 6}}
+    ]}
+
+"encoder" ist optional (Backend-Name oder Backend mit Optionen, siehe
+packages/encoders.py); ohne Angabe gilt ENCODER_BACKEND.
+
+Der Planer hält die Fälligkeiten aller Experimente in einer Prioritäts-
+Warteschlange. Was innerhalb von EXPERIMENT_MERGE_WINDOW_S fällig wird,
+wird zu einem Durchgang zusammengefasst; dessen Wells werden in der
+Reihenfolge mit der kürzesten Fahrzeit einzeln angefahren (Firmware-
+Befehl MOVE_<Well> im Leerlauf). Nicht benötigte Wells werden nie
+angefahren.
+
+Ausgabe je Experiment, im selben Aufbau wie ein normaler Lauf:
+    <IMAGES_DIR>/experiments_<ts>/<name>/manifest.json
+    <IMAGES_DIR>/experiments_<ts>/<name>/run_data.jsonl
+    <IMAGES_DIR>/experiments_<ts>/<name>/cycle_<n>/<ts>_<Well>.<ext>
+Registrierung und Würfel laufen je Experiment wie im normalen Lauf mit
+(REGISTRATION_ENABLED, CUBE_ENABLED). Bricht die serielle Verbindung ab,
+wird sie wie im Lauf wiederhergestellt und die Anfahrt wiederholt.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import shutil
+import time
+
+import serial
+
+from packages.camera_serial_manager import FirmwareError
+from packages.camera_service import PRIORITY_RUN
+from packages.config import (CAMERA_TIMEOUT, CUBE_ENABLED, DISTANCE_COLS,
+                             DISTANCE_ROWS, EXPERIMENT_HOME_BETWEEN_BATCHES,
+                             EXPERIMENT_MERGE_WINDOW_S,
+                             EXPERIMENT_MOVE_TIMEOUT, EXPERIMENTS_FILE,
+                             POSITIONS_COLUMN, POSITIONS_ROW,
+                             REGISTRATION_ALIGNED_OUTPUT, REGISTRATION_ENABLED,
+                             STEPS_PER_REVOLUTION)
+from packages.encoders import (EncoderError, ImageEncoder, extension,
+                               metadata_path)
+from packages.logger import log_message
+from packages.motion_tuning import load_motion_profile
+from packages.run_data import WELLS, RunData
+
+
+class ExperimentError(Exception):
+    pass
+
+
+def well_position(well):
+    """(Reihenindex, Spaltenindex) eines Wells, z. B. B3 -> (1, 2)."""
+    return POSITIONS_ROW.index(well[0]), POSITIONS_COLUMN.index(int(well[1:]))
+
+
+def parse_wells(spec):
+    """
+    Wandelt "A1-B6", "C3" oder Listen davon in eine sortierte Well-Liste um.
+    Ein Bereich umfasst das Rechteck zwischen den beiden Ecken.
+    """
+    tokens = spec if isinstance(spec, list) else str(spec).split(",")
+    wells = set()
+    for token in tokens:
+        token = str(token).strip().upper()
+        if not token:
+            continue
+        first, _, last = token.partition("-")
+        last = last or first
+        for well in (first, last):
+            if well not in WELLS:
+                raise ExperimentError(f"Unbekanntes Well: {well}")
+        (row_a, col_a), (row_b, col_b) = well_position(first), well_position(last)
+        for row in range(min(row_a, row_b), max(row_a, row_b) + 1):
+            for col in range(min(col_a, col_b), max(col_a, col_b) + 1):
+                wells.add(f"{POSITIONS_ROW[row]}{POSITIONS_COLUMN[col]}")
+    if not wells:
+        raise ExperimentError(f"Keine Wells angegeben: {spec!r}")
+    return sorted(wells, key=WELLS.index)
+
+
+class Experiment:
+    def __init__(self, name, wells, interval_minutes, cycles, encoder=None):
+        if not name or os.sep in name or name.startswith("."):
+            raise ExperimentError(f"Ungültiger Experimentname: {name!r}")
+        if interval_minutes <= 0 or cycles < 1:
+            raise ExperimentError(f"{name}: Intervall und Cycles müssen > 0 sein")
+        if isinstance(encoder, str):
+            encoder = {"backend": encoder}
+        try:
+            if encoder is not None:
+                extension(encoder.get("backend"))
+        except (AttributeError, EncoderError) as e:
+            raise ExperimentError(f"{name}: {e}")
+        self.name = name
+        self.wells = parse_wells(wells)
+        self.interval_s = interval_minutes * 60
+        self.cycles = int(cycles)
+        self.encoder = encoder
+        self.completed = 0
+        self.run_dir = None
+        self.run_data = None
+        self.registrar = None
+        self.cube_writer = None
+
+    @property
+    def done(self):
+        return self.completed >= self.cycles
+
+    def manifest(self):
+        return {
+            "name": self.name,
+            "wells": self.wells,
+            "interval_minutes": self.interval_s / 60,
+            "cycles": self.cycles,
+            "encoder": self.encoder,
+            "completed_cycles": self.completed,
+        }
+
+
+def load_experiments(path=EXPERIMENTS_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise ExperimentError(f"Keine Experimente definiert: {path}")
+    except ValueError as e:
+        raise ExperimentError(f"{path} ist kein gültiges JSON: {e}")
+
+    experiments = [
+        Experiment(
+            entry.get("name"),
+            entry.get("wells", []),
+            float(entry.get("interval_minutes", 0)),
+            int(entry.get("cycles", 0)),
+            entry.get("encoder"),
+        )
+        for entry in data.get("experiments", [])
+    ]
+    names = [experiment.name for experiment in experiments]
+    if not experiments:
+        raise ExperimentError(f"Keine Experimente in {path}")
+    if len(set(names)) != len(names):
+        raise ExperimentError("Experimentnamen müssen eindeutig sein")
+    return experiments
+
+
+# =============================================
+# Fahrwege
+# =============================================
+
+
+def travel_model(profile=None):
+    """Sekunden je Spalten- bzw. Reihenschritt bei Höchstgeschwindigkeit."""
+    profile = profile or load_motion_profile()
+    return (
+        DISTANCE_ROWS * STEPS_PER_REVOLUTION / profile["row"]["max_speed"],
+        DISTANCE_COLS * STEPS_PER_REVOLUTION / profile["column"]["max_speed"],
+    )
+
+
+def travel_time(a, b, model):
+    """Beide Achsen fahren gleichzeitig: es zählt die längere Fahrt."""
+    row_s, col_s = model
+    return max(abs(a[0] - b[0]) * row_s, abs(a[1] - b[1]) * col_s)
+
+
+def plan_batch(wells, start=(0, 0), model=None):
+    """
+    Reihenfolge mit kurzer Fahrzeit: schlangenförmig Reihe für Reihe
+    (bzw. Spalte für Spalte), beginnend an der günstigsten Ecke.
+    """
+    model = model or travel_model()
+    positions = {well: well_position(well) for well in wells}
+    candidates = []
+    for major in (0, 1):  # 0 = reihenweise, 1 = spaltenweise
+        minor = 1 - major
+        groups = {}
+        for well, position in positions.items():
+            groups.setdefault(position[major], []).append(well)
+        for reverse_major, reverse_first in itertools.product((False, True), repeat=2):
+            order = []
+            reverse = reverse_first
+            for key in sorted(groups, reverse=reverse_major):
+                line = sorted(groups[key], key=lambda w: positions[w][minor])
+                order.extend(reversed(line) if reverse else line)
+                reverse = not reverse
+            candidates.append(order)
+
+    def cost(order):
+        total, current = 0.0, start
+        for well in order:
+            total += travel_time(current, positions[well], model)
+            current = positions[well]
+        return total
+
+    return min(candidates, key=cost)
+
+
+# =============================================
+# Planer
+# =============================================
+
+
+class ExperimentScheduler:
+    def __init__(self, manager, experiments, job=None):
+        self.manager = manager
+        self.experiments = experiments
+        self.job = job
+        self.clock = manager.clock
+        self.model = travel_model()
+        self.position = (0, 0)  # Firmware startet in der Home-Position
+        self._queue = []
+        self._counter = itertools.count()
+        self.session_id = f"experiments_{manager.strftime('%Y%m%d_%H%M%S')}"
+        self.session_dir = os.path.join(manager.images_dir, self.session_id)
+        self.encoder = manager.encoder
+        self._own_encoder = False
+        if self.encoder is None and any(e.encoder for e in experiments):
+            self.encoder = ImageEncoder()
+            self._own_encoder = True
+        self.pending = []  # (well, start, [(future, [(experiment, path), ...])])
+
+    def setup(self):
+        os.makedirs(self.session_dir, exist_ok=True)
+        for experiment in self.experiments:
+            experiment.run_dir = os.path.join(self.session_dir, experiment.name)
+            os.makedirs(experiment.run_dir, exist_ok=True)
+            experiment.run_data = RunData(experiment.run_dir)
+            self.write_manifest(experiment)
+            if REGISTRATION_ENABLED:
+                # Import hier, da die Registrierung NumPy/Pillow benötigt
+                from packages.registration import WellRegistrar
+
+                experiment.registrar = WellRegistrar(
+                    experiment.run_dir, aligned_output=REGISTRATION_ALIGNED_OUTPUT
+                )
+            if CUBE_ENABLED:
+                from packages.timeseries_cube import CubeWriter
+
+                experiment.cube_writer = CubeWriter(experiment.run_dir)
+
+        now = self.clock.time()
+        for experiment in self.experiments:
+            self.schedule(experiment, now)
+
+        self.manager.run_id = self.session_id
+        self.manager.latest_images = {}
+        log_message(f"Experimente gestartet: {self.session_dir}", "info")
+        self.manager.record_event(
+            "run_start",
+            mode="experiments",
+            experiments=[e.manifest() for e in self.experiments],
+            run_dir=self.session_dir,
+        )
+
+    def write_manifest(self, experiment):
+        manifest = dict(experiment.manifest(), session=self.session_id)
+        path = os.path.join(experiment.run_dir, "manifest.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def schedule(self, experiment, due):
+        heapq.heappush(
+            self._queue, (due, next(self._counter), self.experiments.index(experiment))
+        )
+
+    def _check_cancelled(self):
+        if self.job is not None:
+            self.job.check_cancelled()
+
+    def wait_until(self, due):
+        """Wartet bis due, prüft dabei jede Sekunde auf Abbruch."""
+        self.manager.next_cycle_at = due
+        while True:
+            self._check_cancelled()
+            remaining = due - self.clock.time()
+            if remaining <= 0:
+                break
+            self.clock.sleep(min(1.0, remaining))
+        self.manager.next_cycle_at = None
+
+    def next_batch(self):
+        """Entnimmt alle Experimente, die im Zeitfenster fällig werden."""
+        due = self._queue[0][0]
+        self.wait_until(due)
+        window_end = self.clock.time() + EXPERIMENT_MERGE_WINDOW_S
+        batch = []
+        while self._queue and self._queue[0][0] <= window_end:
+            planned, _, index = heapq.heappop(self._queue)
+            batch.append((planned, self.experiments[index]))
+        return batch
+
+    def command(self, command, prefix):
+        """
+        send_and_wait mit Wiederverbindung. MOVE_<Well> und HOME fahren
+        absolute Positionen an und dürfen daher wiederholt werden.
+        """
+        while True:
+            try:
+                return self.manager.send_and_wait(
+                    command, prefix, EXPERIMENT_MOVE_TIMEOUT
+                )
+            except (serial.SerialException, OSError, FirmwareError) as e:
+                link = self.manager.link
+                lost = not isinstance(e, FirmwareError) or (link and link.lost)
+                if not lost or not self.reconnect(e):
+                    raise
+
+    def reconnect(self, reason):
+        """Stellt die Verbindung wieder her; False = aufgeben."""
+        link = self.manager.link
+        if link is None:
+            return False
+        restored, state = link.restore(
+            reason, active=lambda: self.job is None or not self.job.cancelled
+        )
+        if not restored:
+            return False
+        if state is not None and state["parked"] < 0:
+            log_message(
+                "Firmware neu gestartet, Tischposition unbekannt – Experimente beendet.",
+                "error",
+            )
+            self.manager.record_event("link_failed", reason="position unknown")
+            return False
+        return True
+
+    def capture(self, well, experiments):
+        """Fährt well an, nimmt einmal auf und legt das Bild je Experiment ab."""
+        self.command(f"MOVE_{well}", f"POSITION_{well}")
+        self.position = well_position(well)
+
+        timestamp = self.manager.strftime("%Y%m%d_%H%M%S")
+        paths = []
+        for experiment in experiments:
+            cycle_dir = os.path.join(
+                experiment.run_dir, f"cycle_{experiment.completed:02d}"
+            )
+            os.makedirs(cycle_dir, exist_ok=True)
+            paths.append(os.path.join(cycle_dir, f"{timestamp}_{well}.jpg"))
+
+        start = time.perf_counter()
+        try:
+            if self.encoder is None:
+                self.manager.camera.capture_file(
+                    paths[0],
+                    crop_fraction=self.manager.crop_fraction,
+                    priority=PRIORITY_RUN,
+                ).result(timeout=CAMERA_TIMEOUT)
+            else:
+                array, metadata = self.manager.camera.capture_frame(
+                    crop_fraction=self.manager.crop_fraction, priority=PRIORITY_RUN
+                ).result(timeout=CAMERA_TIMEOUT)
+        except Exception as e:
+            log_message(f"Fehler bei der Bildaufnahme ({well}): {e}", "error")
+            self.manager.record_event(
+                "error", source="camera", well=well, message=str(e) or repr(e)
+            )
+            return
+
+        if self.encoder is None:
+            self.finish_capture(well, start, [(None, list(zip(experiments, paths)))])
+            return
+
+        # Je Encoder-Einstellung einmal kodieren (im Pool, während der Tisch
+        # schon weiterfährt); Experimente mit gleicher Einstellung teilen
+        groups = {}
+        for experiment, path in zip(experiments, paths):
+            backend, options = self.encoder.settings(**(experiment.encoder or {}))
+            key = json.dumps([backend, options], sort_keys=True)
+            groups.setdefault(key, (backend, options, []))[2].append(
+                (experiment, self.encoder.path_for(path, backend))
+            )
+        encoded = []
+        for backend, options, targets in groups.values():
+            future = self.encoder.submit(
+                array, targets[0][1], metadata, backend=backend, **options
+            )
+            encoded.append((future, targets))
+        self.pending.append((well, start, encoded))
+
+    def finish_capture(self, well, start, encoded):
+        """Verteilt fertige Aufnahmen auf die Experimente und protokolliert sie."""
+        latest = None
+        for future, targets in encoded:
+            if future is not None:
+                try:
+                    future.result(timeout=CAMERA_TIMEOUT)
+                except Exception as e:
+                    log_message(f"Fehler beim Kodieren ({well}): {e}", "error")
+                    self.manager.record_event(
+                        "error", source="encoder", well=well, message=str(e) or repr(e)
+                    )
+                    continue
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            source = targets[0][1]
+            latest = latest or source
+
+            # Überlappende Experimente teilen sich die Aufnahme (bei raw auch
+            # die Metadaten daneben)
+            shared = [(source, path) for _, path in targets[1:]]
+            if os.path.exists(metadata_path(source)):
+                shared += [(metadata_path(source), metadata_path(p)) for _, p in shared]
+            for src, path in shared:
+                try:
+                    os.link(src, path)
+                except OSError:
+                    try:
+                        shutil.copy2(src, path)
+                    except OSError as e:
+                        log_message(f"Bild nicht übernommen ({path}): {e}", "error")
+
+            now = self.clock.time()
+            for experiment, path in targets:
+                self.analyse(experiment, well, path, now)
+                experiment.run_data.append(
+                    {
+                        "type": "capture",
+                        "cycle": experiment.completed,
+                        "well": well,
+                        "time": round(now, 3),
+                        "path": os.path.relpath(path, experiment.run_dir),
+                    }
+                )
+                self.manager.record_event(
+                    "capture_done",
+                    experiment=experiment.name,
+                    well=well,
+                    path=path,
+                    duration_ms=duration_ms,
+                )
+        if latest is not None:
+            self.manager.latest_images[well] = latest
+
+    def analyse(self, experiment, well, path, timestamp):
+        """Registrierung und Würfel im Analyse-Thread des Managers."""
+        manager = self.manager
+        if experiment.registrar is not None:
+            future = manager.analysis.submit(
+                experiment.registrar.register, well, path, experiment.completed
+            )
+            manager.pending_analysis.append((well, "registration", future))
+        if experiment.cube_writer is not None:
+            future = manager.analysis.submit(
+                experiment.cube_writer.add, experiment.completed, well, path, timestamp
+            )
+            manager.pending_analysis.append((well, "cube", future))
+
+    def collect(self):
+        """Wartet auf alle noch kodierenden Aufnahmen des Durchgangs."""
+        pending, self.pending = self.pending, []
+        for well, start, encoded in pending:
+            self.finish_capture(well, start, encoded)
+        self.manager.collect_analysis()
+
+    def run_batch(self, batch):
+        needed = {}
+        for _, experiment in batch:
+            for well in experiment.wells:
+                needed.setdefault(well, []).append(experiment)
+
+        order = plan_batch(list(needed), self.position, self.model)
+        names = ", ".join(experiment.name for _, experiment in batch)
+        log_message(f"Durchgang für {names}: {len(order)} Wells", "info")
+
+        for index, well in enumerate(order):
+            self._check_cancelled()
+            if self.job is not None:
+                self.job.report(index / len(order), f"{names}: {well}")
+            self.capture(well, needed[well])
+        self.collect()
+
+        if EXPERIMENT_HOME_BETWEEN_BATCHES:
+            self.command("HOME", "HOME_POSITION")
+            self.position = (0, 0)
+
+    def run(self):
+        self.setup()
+        status = "completed"
+        try:
+            while self._queue:
+                batch = self.next_batch()
+                self.run_batch(batch)
+                now = self.clock.time()
+                for planned, experiment in batch:
+                    experiment.completed += 1
+                    self.write_manifest(experiment)
+                    if not experiment.done:
+                        # Vom geplanten Zeitpunkt aus weiterzählen (keine Drift),
+                        # bei Verzug aber nicht in die Vergangenheit planen
+                        self.schedule(
+                            experiment, max(planned + experiment.interval_s, now)
+                        )
+        except BaseException:
+            status = "aborted"
+            try:
+                self.manager.send_and_wait(
+                    "HOME", "HOME_POSITION", EXPERIMENT_MOVE_TIMEOUT
+                )
+            except Exception as e:
+                log_message(f"Rückfahrt nach Abbruch fehlgeschlagen: {e}", "error")
+            raise
+        finally:
+            self.collect()
+            self.manager.collect_analysis(wait=True)
+            if self._own_encoder:
+                self.encoder.shutdown()
+            self.manager.record_event("run_end", status=status, mode="experiments")
+            log_message(f"Experimente beendet ({status}).", "info")
+        return {e.name: e.completed for e in self.experiments}
@@ -2,14 +2,27 @@
 
 import datetime
 import os
+import time
 import tkinter as tk
-from tkinter import Toplevel, ttk
+from tkinter import Toplevel, messagebox, ttk
 
 import pkg_resources
 
 from packages.camera_serial_manager import CameraSerialManager
+from packages.camera_service import PRIORITY_MANUAL
+from packages.config import (CALIBRATED_CROP, CAMERA_TIMEOUT, IMAGES_DIR,
+                             PLANNER_ENABLED, SENSOR_MODE_SELECTION,
+                             STATUS_SERVER_ENABLED)
+from packages.experiments import (ExperimentError, ExperimentScheduler,
+                                  load_experiments)
+from packages.jobs import JobExecutor
 from packages.logger import (log_message, logging, set_gui_instance,
                              setup_logging)
+from packages.motion_tuning import MotionTuner, MotionTuningError
+from packages.planner import describe, format_duration, predict_run
+from packages.preview import PreviewWindow
+from packages.status_server import StatusServer
+from packages.well_calibration import CalibrationError, WellCalibrator
 
 # Logger zuweisen
 logger = setup_logging()
@@ -51,9 +64,22 @@ class Paparazzo(tk.Tk):
 
         self.create_widgets()
 
+        # Hintergrund-Jobs (Kompilieren, Hochladen, ...) ohne GUI-Blockade
+        self.jobs = JobExecutor(
+            dispatch=lambda func, *args: self.after(0, func, *args),
+            on_progress=self.on_job_progress,
+            on_state_change=lambda busy: self.update_button_states(),
+        )
+
         # CameraSerialManager EINMAL initialisieren!
         self.manager = CameraSerialManager(gui=self)
 
+        # Optionaler Status-Server für die Fernüberwachung
+        self.status_server = None
+        if STATUS_SERVER_ENABLED:
+            self.status_server = StatusServer(self.manager)
+            self.status_server.start()
+
         # GUI Titel und Style setzen
         version = get_version()
         self.title(f"Paparazzo v{version}")
@@ -72,6 +98,8 @@ class Paparazzo(tk.Tk):
         log_message("Starte Paparazzo GUI...", "info")
         log_message("Initialisiere Log System...", "info")
 
+        self.refresh_button_states()
+
     # Methode zum Abfragen der Werte:
     def get_repeats(self):
         return self.repeats_var.get()
@@ -159,13 +187,13 @@ class Paparazzo(tk.Tk):
         execution_frame.grid(row=0, rowspan=2, column=1, sticky="ew")
 
         # Generieren & Hochladen
-        gen_upload_btn = ttk.Button(
+        self.configure_btn = ttk.Button(
             execution_frame,
             text="Programm laden",
             command=self.on_configure,
             width=button_width,
         )
-        gen_upload_btn.grid(row=0, column=0, padx=10, pady=10, ipadx=12, ipady=12)
+        self.configure_btn.grid(row=0, column=0, padx=10, pady=10, ipadx=12, ipady=12)
 
         # Manuellzugriff
         position_button = ttk.Button(
@@ -181,22 +209,31 @@ class Paparazzo(tk.Tk):
         runoptions_frame.grid(row=0, rowspan=2, column=2, sticky="ew")
 
         # Programm START
-        start_btn = ttk.Button(
+        self.start_btn = ttk.Button(
             runoptions_frame,
             text="Starten",
             command=self.on_start_program,
             width=button_width,
         )
-        start_btn.grid(row=0, column=0, padx=10, pady=10, ipadx=12, ipady=12)
+        self.start_btn.grid(row=0, column=0, padx=10, pady=10, ipadx=12, ipady=12)
 
         # Abbrechen
-        abort_btn = ttk.Button(
+        self.abort_btn = ttk.Button(
             runoptions_frame,
             text="Abbrechen",
             command=self.on_abort,
             width=button_width,
         )
-        abort_btn.grid(row=1, column=0, padx=10, pady=10, ipadx=12, ipady=12)
+        self.abort_btn.grid(row=1, column=0, padx=10, pady=10, ipadx=12, ipady=12)
+
+        # Experimente (eigene Wells und Intervalle aus experiments.json)
+        self.experiments_btn = ttk.Button(
+            runoptions_frame,
+            text="Experimente",
+            command=self.on_start_experiments,
+            width=button_width,
+        )
+        self.experiments_btn.grid(row=2, column=0, padx=10, pady=10, ipadx=12, ipady=12)
 
         # System Elements
         system_frame = ttk.Frame(self)
@@ -208,6 +245,34 @@ class Paparazzo(tk.Tk):
         )
         close_button.grid(row=0, column=0, padx=10, pady=10, ipadx=12, ipady=12)
 
+        # Bewegungsprofil optimieren
+        self.tune_btn = ttk.Button(
+            system_frame,
+            text="Motoren optimieren",
+            command=self.on_tune_motion,
+            width=button_width,
+        )
+        self.tune_btn.grid(row=1, column=0, padx=10, pady=10, ipadx=12, ipady=12)
+
+        # Well-Positionen kalibrieren
+        self.calibrate_btn = ttk.Button(
+            system_frame,
+            text="Wells kalibrieren",
+            command=self.on_calibrate_wells,
+            width=button_width,
+        )
+        self.calibrate_btn.grid(row=2, column=0, padx=10, pady=10, ipadx=12, ipady=12)
+
+        # Fortschritt laufender Hintergrund-Jobs
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_text = tk.StringVar(value="")
+        progress_bar = ttk.Progressbar(
+            self, variable=self.progress_var, maximum=1.0, mode="determinate"
+        )
+        progress_bar.grid(row=2, column=0, columnspan=3, padx=10, sticky="ew")
+        progress_label = ttk.Label(self, textvariable=self.progress_text)
+        progress_label.grid(row=2, column=3, padx=10, sticky="w")
+
     # =============================================
     # Popup Elemente
     # =============================================
@@ -263,22 +328,53 @@ class Paparazzo(tk.Tk):
         ok_btn = ttk.Button(popup, text="OK", command=confirm)
         ok_btn.grid(row=4, column=2, padx=5, pady=5, ipadx=10, ipady=10)
 
-    # Konfigurieren
-    def on_configure(self):
-        """Button-Klick: Erstellt config.h, kompiliert und lädt den Sketch hoch."""
-        log_message("Starte Konfiguration...", "info")
-        success = self.prepare_and_upload_sketch()
+    # =============================================
+    # Hintergrund-Jobs
+    # =============================================
 
-        if success:
-            log_message("Fertig!", "info")
-        else:
-            log_message("Konfiguration fehlgeschlagen!", "error")
+    def on_job_progress(self, job, fraction, text):
+        self.progress_var.set(fraction)
+        self.progress_text.set(f"{job.name}: {text}" if text else job.name)
+
+    def update_button_states(self):
+        """Aktiviert/deaktiviert Knöpfe je nach Job- und Laufzustand."""
+        busy = self.jobs.busy
+        running = bool(self.manager.polling_active)
+        idle = "disabled" if busy or running else "!disabled"
+        self.configure_btn.state([idle])
+        self.start_btn.state([idle])
+        self.tune_btn.state([idle])
+        self.calibrate_btn.state([idle])
+        self.experiments_btn.state([idle])
+        self.abort_btn.state(["!disabled" if busy or running else "disabled"])
+        if not busy:
+            self.progress_var.set(0)
+            self.progress_text.set(self.run_status_text() if running else "")
+
+    def run_status_text(self):
+        eta = self.manager.eta
+        if eta is None:
+            return "Lauf aktiv"
+        finish_at = datetime.datetime.fromtimestamp(eta.finish_at())
+        return (
+            f"Lauf aktiv – Ende ca. {finish_at.strftime('%H:%M')} "
+            f"(noch {format_duration(eta.remaining_s())})"
+        )
 
-    # Sketch vorbereiten und laden
-    def prepare_and_upload_sketch(self):
-        """Generiert config.h, kompiliert und lädt den Sketch hoch."""
-        REPEATS = self.repeats_var.get()
-        PAUSE = self.pause_var.get()
+    def refresh_button_states(self):
+        # Laufende/endende Läufe ändern den Zustand im Polling-Thread
+        self.update_button_states()
+        self.after(500, self.refresh_button_states)
+
+    # Eingaben prüfen (nur im GUI-Thread, da Tk-Variablen gelesen werden)
+    def read_run_settings(self):
+        """Liefert (REPEATS, PAUSE_MS) oder None bei ungültiger Eingabe."""
+        try:
+            REPEATS = self.repeats_var.get()
+            PAUSE = self.pause_var.get()
+        except tk.TclError:
+            log_message("Unzulässige Eingabe. Bitte nur Zahlen eingeben.", "error")
+            return None
         PAUSE_MS = PAUSE * 60000
 
         if REPEATS < 1:
@@ -286,28 +382,94 @@ class Paparazzo(tk.Tk):
                 "Unzulässige Eingabe. Bitte eine Zahl größer als 0 für Wiederholungen eingeben.",
                 "error",
             )
-            return False  # signalisiert Fehlschlag
+            return None
 
         if PAUSE_MS < 60000:
             log_message(
                 "Unzulässige Eingabe. Bitte eine Zahl größer als 1 Minute für Pause eingeben.",
                 "error",
             )
+            return None
+
+        return REPEATS, PAUSE_MS
+
+    # Konfigurieren
+    def on_configure(self):
+        """Button-Klick: Erstellt config.h, kompiliert und lädt den Sketch hoch."""
+        settings = self.read_run_settings()
+        if settings is None:
+            log_message("Konfiguration fehlgeschlagen!", "error")
+            return
+
+        def on_done(success, error):
+            if success and error is None:
+                log_message("Fertig!", "info")
+            else:
+                log_message("Konfiguration fehlgeschlagen!", "error")
+
+        log_message("Starte Konfiguration...", "info")
+        self.jobs.submit(
+            "Programm laden",
+            lambda job: self.prepare_and_upload_sketch(job, *settings),
+            on_done,
+        )
+
+    # Sketch vorbereiten und laden (läuft im Hintergrund-Job)
+    def prepare_and_upload_sketch(self, job, repeats, pause_ms):
+        """Generiert config.h, kompiliert und lädt den Sketch hoch."""
+        job.report(0.05, "config.h")
+        if not self.manager.generate_config_file(repeats, pause_ms):
             return False  # signalisiert Fehlschlag
 
-        self.manager.generate_config_file(REPEATS, PAUSE_MS)
-        self.manager.compile_sketch()
-        self.manager.upload_sketch()
+        job.check_cancelled()
+        job.report(0.2, "Kompilieren")
+        if not self.manager.compile_sketch(job):
+            return False
 
+        job.check_cancelled()
+        job.report(0.7, "Hochladen")
+        if not self.manager.upload_sketch(job):
+            return False
+
+        job.report(1.0, "Fertig")
         log_message("Konfiguration abgeschlossen!", "info")
         return True  # signalisiert Erfolg
 
     # Starten
     def on_start_program(self):
-        if not self.prepare_and_upload_sketch():
+        settings = self.read_run_settings()
+        if settings is None:
             log_message("Programmstart abgebrochen.", "error")
             return
+        if PLANNER_ENABLED and not self.confirm_run_plan(*settings):
+            log_message("Programmstart abgebrochen.", "info")
+            return
+
+        def on_done(success, error):
+            if not success or error is not None:
+                log_message("Programmstart abgebrochen.", "error")
+                return
+            self.start_run()
+
+        self.jobs.submit(
+            "Programm starten",
+            lambda job: self.prepare_and_upload_sketch(job, *settings),
+            on_done,
+        )
+
+    def confirm_run_plan(self, REPEATS, PAUSE_MS):
+        """Zeigt die Vorhersage; bei Überlauf oder zu wenig Speicher Rückfrage."""
+        prediction = predict_run(REPEATS, PAUSE_MS / 60000)
+        summary = describe(prediction)
+        log_message(f"Laufplanung: {summary}", "info")
+        if prediction["overrun"] or not prediction["disk_ok"]:
+            return messagebox.askokcancel(
+                "Laufplanung", f"{summary}\n\nLauf trotzdem starten?", parent=self
+            )
+        return True
 
+    def start_run(self):
+        """Startet den Lauf nach erfolgreichem Hochladen (im GUI-Thread)."""
         self.manager.reset_cycle_count()
         self.manager.reset_move_count()
 
@@ -318,18 +480,50 @@ class Paparazzo(tk.Tk):
         self.manager.send_command("START")
 
         self.manager.start_polling()
+        self.update_button_states()
+
+    # Experimente starten
+    def on_start_experiments(self):
+        """Lädt experiments.json, lädt den Sketch hoch und startet den Planer."""
+        settings = self.read_run_settings()
+        if settings is None:
+            return
+        try:
+            experiments = load_experiments()
+        except ExperimentError as e:
+            log_message(str(e), "error")
+            return
+
+        def run(job):
+            if not self.prepare_and_upload_sketch(job, *settings):
+                return None
+            time.sleep(2)  # Arduino-Reset nach dem Hochladen abwarten
+            scheduler = ExperimentScheduler(self.manager, experiments, job=job)
+            return scheduler.run()
+
+        def on_done(result, error):
+            if result is not None and error is None:
+                summary = ", ".join(f"{name}: {n}" for name, n in result.items())
+                log_message(f"Experimente abgeschlossen ({summary}).", "info")
+
+        self.jobs.submit("Experimente", run, on_done)
 
     # Abbrechen
     def on_abort(self):
-        """Button-Klick: Sende 'ABORT' an Arduino, der daraufhin abbrechen soll."""
+        """Button-Klick: Bricht laufende Jobs ab bzw. sendet 'ABORT' an Arduino."""
+        if self.jobs.busy:
+            self.jobs.cancel()
+            return
+
         log_message("Sende 'ABORT' an Arduino...", "info")
-        self.manager.send_command("ABORT")
-        self.manager.stop_polling()
+        self.manager.abort_run()
+        self.update_button_states()
 
     # Manuelles Positionieren
     def manual_move_to_position(self, row, col):
         command = f"MOVE_{row}{col}"
         self.manager.send_command(command)
+        self.manual_position = (row, col)
 
     def on_open_manual_position_popup(self):
         popup = Toplevel(self)
@@ -349,11 +543,23 @@ class Paparazzo(tk.Tk):
         shoot_btn = tk.Button(popup, text="Fotografieren", command=self.on_take_photo)
         shoot_btn.grid(row=4, column=0, columnspan=6, padx=5, pady=10, sticky="ew")
 
+        # Vorschau-Button
+        preview_btn = tk.Button(popup, text="Vorschau", command=self.on_open_preview)
+        preview_btn.grid(row=5, column=0, columnspan=6, padx=5, pady=10, sticky="ew")
+
         # Fenster schließen-Button
         close_btn = tk.Button(
             popup, text="Fenster schließen", command=lambda: self.on_close_popup(popup)
         )
-        close_btn.grid(row=5, column=0, columnspan=6, padx=5, pady=10, sticky="ew")
+        close_btn.grid(row=6, column=0, columnspan=6, padx=5, pady=10, sticky="ew")
+
+    # Live-Vorschau über den Kameradienst
+    def on_open_preview(self):
+        window = getattr(self, "preview_window", None)
+        if window is not None and window.window.winfo_exists():
+            window.window.lift()
+            return
+        self.preview_window = PreviewWindow(self, self.manager.camera)
 
     # Fotografieren
     def on_take_photo(self):
@@ -361,44 +567,105 @@ class Paparazzo(tk.Tk):
         date_str = now.strftime("%Y%m%d")
         time_str = now.strftime("%Y%m%d_%H%M%S")
 
-        row_value, col_value = "X", "X"  # Hier Werte von der aktuellen Position holen
+        # Zuletzt manuell angefahrene Position, sonst unbekannt
+        row_value, col_value = getattr(self, "manual_position", ("X", "X"))
 
-        dir_path = f"images/manual_{date_str}/"
+        dir_path = os.path.join(IMAGES_DIR, f"manual_{date_str}")
         os.makedirs(dir_path, exist_ok=True)
         file_path = os.path.join(dir_path, f"{time_str}_{row_value}{col_value}.jpg")
 
-        self.manager.take_photo()
+        # Über den Kameradienst: ein laufender automatischer Lauf hat Vorrang
+        future = self.manager.camera.capture_file(
+            file_path,
+            crop_fraction=self.manager.crop_fraction,
+            priority=PRIORITY_MANUAL,
+        )
+
+        def on_done(done):
+            if done.cancelled():
+                return
+            error = done.exception()
+            if error is not None:
+                log_message(f"Fehler bei der manuellen Aufnahme: {error}", "error")
+            else:
+                log_message(f"Foto gespeichert unter: {file_path}", "info")
 
-        print(f"Foto gespeichert unter: {file_path}")
-        # Hier Kamera-Befehl zum Speichern des Bildes einfügen
+        future.add_done_callback(on_done)
 
     # Popup Schließen
     def on_close_popup(self, popup):
-        if self.manager.picam is not None:
-            self.manager.picam.stop()
-            self.manager.picam.close()
-            self.manager.picam = None
+        # Die Kamera bleibt geöffnet, sie gehört dem Kameradienst
         popup.destroy()
 
+    # Bewegungsprofil optimieren
+    def on_tune_motion(self):
+        """Button-Klick: Optimiert das Bewegungsprofil im Hintergrund."""
+        if self.manager.polling_active:
+            log_message("Optimierung während eines Laufs nicht möglich!", "error")
+            return
+
+        def run_tuning(job):
+            try:
+                return MotionTuner(self.manager, job=job).run()
+            except MotionTuningError as e:
+                log_message(f"Optimierung abgebrochen: {e}", "error")
+
+        self.jobs.submit("Motoren optimieren", run_tuning)
+
+    # Well-Positionen kalibrieren
+    def on_calibrate_wells(self):
+        """Button-Klick: Zentriert alle Wells im Hintergrund."""
+        if self.manager.polling_active:
+            log_message("Kalibrierung während eines Laufs nicht möglich!", "error")
+            return
+
+        def run_calibration(job):
+            try:
+                return WellCalibrator(self.manager, job=job).run()
+            except CalibrationError as e:
+                log_message(f"Kalibrierung abgebrochen: {e}", "error")
+
+        def on_done(calibration, error):
+            if calibration and CALIBRATED_CROP and calibration["crop_fraction"]:
+                self.manager.crop_fraction = calibration["crop_fraction"]
+                # Sensormodus passt sonst noch zum alten Ausschnitt
+                if SENSOR_MODE_SELECTION and self.manager.camera.available:
+                    self.manager.configure_camera()
+
+        self.jobs.submit("Wells kalibrieren", run_calibration, on_done)
+
     # Programm Schließen
     def cleanup(self):
         # Hier alle wichtigen Vorgänge beenden:
         log_message("Bereinige laufende Vorgänge...")
 
-        # 1️⃣ Falls Kamera läuft, stoppen
-        if self.manager.picam:
-            log_message("Stoppe Kamera...", "info")
-            self.manager.picam.stop()
-            log_message("Kamera gestoppt.", "info")
+        # 1️⃣ Polling beenden; ein offener Lauf sammelt dabei noch seine Bilder ein
+        self.manager.stop_polling(timeout=CAMERA_TIMEOUT * 2)
+        self.jobs.cancel()
 
-        # 2️⃣ Serielle Verbindung schließen, falls aktiv
+        # 2️⃣ Ausstehende Analysen abwarten und den Analyse-Thread beenden
+        self.manager.collect_analysis(wait=True)
+        self.manager.analysis.shutdown(wait=True)
+
+        # 3️⃣ Kameradienst beenden (stoppt und schließt die Kamera)
+        if self.manager.camera is not None:
+            self.manager.camera.shutdown()
+
+        # 4️⃣ Serielle Verbindung schließen, falls aktiv
         if self.manager.serial_connection and self.manager.serial_connection.is_open:
             log_message("Schließe serielle Verbindung...", "info")
             self.manager.serial_connection.close()
             log_message("Serielle Verbindung geschlossen.", "info")
 
-        # 3️⃣ Eventuelle Threads oder laufende Funktionen beenden (z. B. `poll_arduino`)
-        self.manager.stop_polling()
+        if self.status_server is not None:
+            log_message("Stoppe Status-Server...", "info")
+            self.status_server.stop()
+
+        if self.manager.encoder is not None:
+            self.manager.encoder.shutdown()
+
+        if self.manager.journal is not None:
+            self.manager.journal.close()
 
     def on_close(self):
         try:
@@ -406,7 +673,7 @@ class Paparazzo(tk.Tk):
         except Exception as e:
             print("Fehler beim Herunterfahren:", e)
         finally:
-            # 4️⃣ Tkinter-Fenster sauber schließen
+            # 5️⃣ Tkinter-Fenster sauber schließen
             log_message("GUI wird zerstört...", "info")
             set_gui_instance(None)
             logging.shutdown()  # Schließt den Logger sauber
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""Bildverarbeitungs-Hilfsfunktionen (NumPy) für Kalibrierung und Analyse."""
+
+import numpy as np
+
+
+def to_gray(image):
+    """Wandelt ein RGB(A)- oder Graustufen-Array in float32-Graustufen um."""
+    image = np.asarray(image)
+    if image.ndim == 3:
+        image = image[..., :3].mean(axis=2)
+    return image.astype(np.float32, copy=False)
+
+
+def downscale(image, factor):
+    """Verkleinert um einen ganzzahligen Faktor per Blockmittelwert."""
+    if factor <= 1:
+        return image
+    height = (image.shape[0] // factor) * factor
+    width = (image.shape[1] // factor) * factor
+    blocks = image[:height, :width].reshape(
+        height // factor, factor, width // factor, factor
+    )
+    return blocks.mean(axis=(1, 3))
+
+
+def prepare_frame(image, max_size=256):
+    """
+    Graustufen und verkleinert auf höchstens max_size Pixel Kantenlänge.
+
+    Gibt (frame, factor) zurück; Pixelversätze im verkleinerten Bild sind
+    mit factor zu multiplizieren, um Versätze im Originalbild zu erhalten.
+    """
+    gray = to_gray(image)
+    factor = max(1, int(np.ceil(max(gray.shape) / max_size)))
+    return downscale(gray, factor), factor
+
+
+def _window(shape):
+    return np.outer(np.hanning(shape[0]), np.hanning(shape[1])).astype(np.float32)
+
+
+def phase_correlation(reference, image):
+    """
+    Bestimmt die Verschiebung (dy, dx) von image gegenüber reference.
+
+    Beide Bilder müssen gleich groß und bereits vorverarbeitet sein (siehe
+    prepare_frame). Zurückgegeben wird zusätzlich die Peak-Höhe als
+    Gütemaß (nahe 1 = eindeutige Übereinstimmung, nahe 0 = keine).
+    """
+    if reference.shape != image.shape:
+        raise ValueError(
+            f"Bildgrößen stimmen nicht überein: {reference.shape} != {image.shape}"
+        )
+
+    window = _window(reference.shape)
+    ref = (reference - reference.mean()) * window
+    img = (image - image.mean()) * window
+
+    cross_power = np.fft.fft2(img) * np.conj(np.fft.fft2(ref))
+    cross_power /= np.abs(cross_power) + 1e-9
+    correlation = np.fft.ifft2(cross_power).real
+
+    peak_y, peak_x = np.unravel_index(np.argmax(correlation), correlation.shape)
+    peak = float(correlation[peak_y, peak_x])
+
+    # Subpixel-Genauigkeit über Parabel durch die Nachbarwerte
+    def refine(values):
+        left, center, right = values
+        denom = left - 2 * center + right
+        return 0.0 if denom == 0 else 0.5 * (left - right) / denom
+
+    height, width = correlation.shape
+    dy = peak_y + refine(
+        correlation[[(peak_y - 1) % height, peak_y, (peak_y + 1) % height], peak_x]
+    )
+    dx = peak_x + refine(
+        correlation[peak_y, [(peak_x - 1) % width, peak_x, (peak_x + 1) % width]]
+    )
+
+    # Zyklische Verschiebung in den Bereich [-N/2, N/2) umrechnen
+    if dy >= height / 2:
+        dy -= height
+    if dx >= width / 2:
+        dx -= width
+
+    return float(dy), float(dx), peak
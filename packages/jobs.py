@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""
+Hintergrund-Ausführung langer Vorgänge (Konfigurieren, Kompilieren,
+Hochladen, Optimieren), damit die Tk-Hauptschleife nie blockiert.
+
+Es läuft immer höchstens ein Job gleichzeitig. Fortschritt, Zustands-
+wechsel und Ergebnis werden über dispatch (in der GUI: self.after) in den
+Tk-Thread zurückgereicht.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+
+from packages.logger import log_message
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name, executor):
+        self.name = name
+        self.executor = executor
+        self._cancel_event = threading.Event()
+        self._cancel_callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_event.set()
+            callbacks = list(self._cancel_callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log_message(f"Fehler beim Abbrechen von '{self.name}': {e}", "error")
+
+    def on_cancel(self, callback):
+        """Registriert eine Aktion, die beim Abbruch ausgeführt wird."""
+        with self._lock:
+            if not self._cancel_event.is_set():
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def remove_on_cancel(self, callback):
+        with self._lock:
+            if callback in self._cancel_callbacks:
+                self._cancel_callbacks.remove(callback)
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+    def report(self, fraction, text=""):
+        """Meldet den Fortschritt (0.0 bis 1.0) an die GUI."""
+        self.executor._dispatch_progress(self, fraction, text)
+
+
+class JobExecutor:
+    def __init__(self, dispatch, on_progress=None, on_state_change=None):
+        """
+        dispatch(func, *args) muss func im GUI-Thread ausführen,
+        on_progress(job, fraction, text) und on_state_change(busy) werden
+        immer über dispatch aufgerufen.
+        """
+        self.dispatch = dispatch
+        self.on_progress = on_progress
+        self.on_state_change = on_state_change
+        self.current = None
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self.current is not None
+
+    def submit(self, name, func, on_done=None):
+        """
+        Startet func(job) im Hintergrund. on_done(result, error) läuft
+        danach im GUI-Thread; error ist None, JobCancelled oder die Ausnahme.
+        Gibt False zurück, wenn bereits ein Job läuft.
+        """
+        with self._lock:
+            if self.current is not None:
+                log_message(
+                    f"'{self.current.name}' läuft noch, bitte warten.", "warning"
+                )
+                return False
+            job = Job(name, self)
+            self.current = job
+
+        self._dispatch_state(True)
+        thread = threading.Thread(
+            target=self._run, args=(job, func, on_done), daemon=True
+        )
+        thread.start()
+        return True
+
+    def cancel(self):
+        job = self.current
+        if job is not None:
+            log_message(f"Breche '{job.name}' ab...", "warning")
+            job.cancel()
+
+    def _run(self, job, func, on_done):
+        result, error = None, None
+        try:
+            result = func(job)
+            job.check_cancelled()
+        except JobCancelled as e:
+            error = e
+            log_message(f"'{job.name}' abgebrochen.", "warning")
+        except Exception as e:
+            error = e
+            log_message(f"Fehler in '{job.name}': {e}", "error")
+        finally:
+            with self._lock:
+                self.current = None
+            self._dispatch_state(False)
+            if on_done is not None:
+                self.dispatch(on_done, result, error)
+
+    def _dispatch_progress(self, job, fraction, text):
+        if self.on_progress is not None:
+            self.dispatch(self.on_progress, job, fraction, text)
+
+    def _dispatch_state(self, busy):
+        if self.on_state_change is not None:
+            self.dispatch(self.on_state_change, busy)
+
+
+def run_streaming(command, job=None, prefix=""):
+    """
+    Führt command aus und schreibt die Ausgabe Zeile für Zeile ins Log.
+
+    Beim Abbruch des Jobs wird der Prozess beendet und JobCancelled
+    ausgelöst. Gibt den Rückgabecode des Prozesses zurück.
+    """
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        bufsize=1,
+        start_new_session=True,  # eigene Prozessgruppe inkl. Kindprozesse
+    )
+
+    def terminate():
+        if process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    if job is not None:
+        job.on_cancel(terminate)
+    try:
+        for line in process.stdout:
+            line = line.rstrip()
+            if line:
+                log_message(f"{prefix}{line}", "info")
+        returncode = process.wait()
+    finally:
+        if job is not None:
+            job.remove_on_cancel(terminate)
+        if process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.wait()
+
+    if job is not None:
+        job.check_cancelled()
+    return returncode
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+"""
+Strukturiertes Ereignis-Journal aller Läufe.
+
+Jedes Ereignis ist eine JSON-Zeile mit Zeitstempel und run_id, z. B.:
+    {"ts": 1718000000.123, "run_id": "run_20240610_081320",
+     "event": "capture_done", "cycle": 3, "move": 7, "well": "B2",
+     "duration_ms": 412.5}
+
+Geschrieben wird in journal.jsonl. Überschreitet die Datei JOURNAL_MAX_BYTES,
+wird sie gzip-komprimiert als Segment abgelegt und in index.json vermerkt
+(Zeitraum, run_ids, Anzahl je Ereignis). Abfragen lesen nur die Segmente,
+die laut Index passen können, statt alle Logdateien zu durchsuchen.
+
+Abfrage über die Kommandozeile:
+    python -m packages.journal query --event frame_received --where frame=TIMEOUT --since 30d
+    python -m packages.journal stats --by run_id,event --since 7d
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from packages.config import JOURNAL_DIR, JOURNAL_KEEP_SEGMENTS, JOURNAL_MAX_BYTES
+
+ACTIVE_FILE = "journal.jsonl"
+INDEX_FILE = "index.json"
+
+# Felder mit wenigen verschiedenen Werten, deren Werte je Segment im Index
+# stehen (z. B. frame=TIMEOUT), damit --where ganze Segmente überspringen kann
+INDEXED_FIELDS = ("frame", "command", "status", "source", "well")
+
+
+class SegmentStats:
+    """Zusammenfassung eines Segments für den Index."""
+
+    def __init__(self):
+        self.first_ts = None
+        self.last_ts = None
+        self.count = 0
+        self.run_ids = set()
+        self.events = Counter()
+        self.values = {name: set() for name in INDEXED_FIELDS}
+
+    def add(self, entry):
+        ts = entry.get("ts")
+        if ts is not None:
+            if self.first_ts is None or ts < self.first_ts:
+                self.first_ts = ts
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+        self.count += 1
+        if entry.get("run_id") is not None:
+            self.run_ids.add(entry["run_id"])
+        self.events[entry.get("event")] += 1
+        for name, values in self.values.items():
+            if name in entry:
+                values.add(str(entry[name]))
+
+    def to_dict(self, filename):
+        return {
+            "file": filename,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "count": self.count,
+            "run_ids": sorted(self.run_ids),
+            "events": dict(self.events),
+            "values": {name: sorted(values) for name, values in self.values.items()},
+        }
+
+
+class EventJournal:
+    def __init__(
+        self,
+        directory=JOURNAL_DIR,
+        max_bytes=JOURNAL_MAX_BYTES,
+        keep_segments=JOURNAL_KEEP_SEGMENTS,
+        clock=time,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep_segments = keep_segments
+        self.clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = os.path.join(directory, ACTIVE_FILE)
+        # Statistik eines bereits vorhandenen aktiven Segments wiederherstellen
+        self._stats = SegmentStats()
+        for entry in _read_lines(self.path):
+            self._stats.add(entry)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def record(self, event, run_id=None, **fields):
+        """Schreibt ein Ereignis; Felder mit Wert None werden weggelassen."""
+        entry = {"ts": round(self.clock.time(), 3), "run_id": run_id, "event": event}
+        entry.update((key, value) for key, value in fields.items() if value is not None)
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            self._stats.add(entry)
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _rotate(self):
+        """Komprimiert das aktive Segment und trägt es in den Index ein."""
+        self._file.close()
+        # Index vor dem Schreiben des Segments laden, damit ein Neuaufbau
+        # das neue Segment nicht doppelt aufnimmt
+        segments = load_index(self.directory)
+
+        stamp = datetime.fromtimestamp(self._stats.first_ts or self.clock.time())
+        base = f"journal_{stamp.strftime('%Y%m%d_%H%M%S')}"
+        filename = f"{base}.jsonl.gz"
+        n = 1
+        while os.path.exists(os.path.join(self.directory, filename)):
+            filename = f"{base}_{n}.jsonl.gz"
+            n += 1
+
+        target = os.path.join(self.directory, filename)
+        with open(self.path, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(target + ".tmp", target)
+
+        segments.append(self._stats.to_dict(filename))
+        while self.keep_segments and len(segments) > self.keep_segments:
+            old = segments.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, old["file"]))
+            except OSError:
+                pass
+        _write_index(self.directory, segments)
+
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._stats = SegmentStats()
+
+
+# =============================================
+# Index
+# =============================================
+
+
+def load_index(directory):
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return rebuild_index(directory)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["segments"]
+
+
+def _write_index(directory, segments):
+    path = os.path.join(directory, INDEX_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def rebuild_index(directory):
+    """Erstellt den Index aus allen komprimierten Segmenten neu."""
+    segments = []
+    if os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".jsonl.gz"):
+                continue
+            stats = SegmentStats()
+            for entry in _read_lines(os.path.join(directory, filename)):
+                stats.add(entry)
+            segments.append(stats.to_dict(filename))
+        _write_index(directory, segments)
+    return segments
+
+
+# =============================================
+# Abfragen
+# =============================================
+
+
+def _read_lines(path, needles=()):
+    """Liest JSON-Zeilen; Zeilen ohne alle needles werden nicht dekodiert."""
+    if not os.path.exists(path):
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if needles and not all(needle in line for needle in needles):
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # unvollständige letzte Zeile nach Stromausfall
+
+
+def _segment_matches(segment, since, until, run_ids, events, where):
+    if since is not None and (segment["last_ts"] or 0) < since:
+        return False
+    if until is not None and (segment["first_ts"] or 0) > until:
+        return False
+    if run_ids and not run_ids.intersection(segment["run_ids"]):
+        return False
+    if events and not events.intersection(segment["events"]):
+        return False
+    values = segment.get("values", {})
+    for key, value in where.items():
+        if key in values and value not in values[key]:
+            return False
+    return True
+
+
+def iter_events(
+    directory=JOURNAL_DIR, since=None, until=None, run_ids=None, events=None, where=None
+):
+    """
+    Liefert alle passenden Ereignisse in zeitlicher Reihenfolge.
+
+    since/until: Unix-Zeit, run_ids/events: Mengen, where: dict Feld -> Wert
+    (Vergleich als Text, damit Werte von der Kommandozeile passen).
+    """
+    run_ids = set(run_ids or ())
+    events = set(events or ())
+    where = where or {}
+
+    paths = [
+        os.path.join(directory, segment["file"])
+        for segment in load_index(directory)
+        if _segment_matches(segment, since, until, run_ids, events, where)
+    ]
+    paths.append(os.path.join(directory, ACTIVE_FILE))
+
+    # Gesuchte Werte müssen wörtlich in der Zeile stehen
+    needles = [json.dumps(value, ensure_ascii=False)[1:-1] for value in where.values()]
+    if len(run_ids) == 1:
+        needles.extend(json.dumps(run_id)[1:-1] for run_id in run_ids)
+    if len(events) == 1:
+        needles.extend(json.dumps(event)[1:-1] for event in events)
+
+    for path in paths:
+        for entry in _read_lines(path, needles):
+            ts = entry.get("ts", 0)
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                continue
+            if run_ids and entry.get("run_id") not in run_ids:
+                continue
+            if events and entry.get("event") not in events:
+                continue
+            if any(str(entry.get(key)) != value for key, value in where.items()):
+                continue
+            yield entry
+
+
+def aggregate(entries, by=("event",), field=None):
+    """
+    Gruppiert Ereignisse nach den Feldern in by. Ohne field wird gezählt,
+    mit field (z. B. duration_ms) werden Anzahl, Mittel, Minimum und
+    Maximum dieses Feldes berechnet.
+    """
+    groups = {}
+    for entry in entries:
+        key = tuple(entry.get(name) for name in by)
+        group = groups.setdefault(
+            key, {"count": 0, "sum": 0.0, "min": None, "max": None}
+        )
+        group["count"] += 1
+        if field is None:
+            continue
+        value = entry.get(field)
+        if not isinstance(value, (int, float)):
+            continue
+        group["sum"] += value
+        group["min"] = value if group["min"] is None else min(group["min"], value)
+        group["max"] = value if group["max"] is None else max(group["max"], value)
+
+    rows = []
+    for key, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        row = dict(zip(by, key))
+        row["count"] = group["count"]
+        if field is not None and group["min"] is not None:
+            row[f"{field}_mean"] = round(group["sum"] / group["count"], 3)
+            row[f"{field}_min"] = group["min"]
+            row[f"{field}_max"] = group["max"]
+        rows.append(row)
+    return rows
+
+
+# =============================================
+# Kommandozeile
+# =============================================
+
+
+def parse_time(value, now=None):
+    """'30d', '12h', '45m' (relativ) oder '2024-06-10[T08:00]' (absolut)."""
+    if value is None:
+        return None
+    now = time.time() if now is None else now
+    units = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return now - float(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _csv(value):
+    return [part for part in (value or "").split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ereignis-Journal abfragen")
+    parser.add_argument("--dir", default=JOURNAL_DIR, help="Journal-Verzeichnis")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, text in (
+        ("query", "Ereignisse ausgeben"),
+        ("stats", "Ereignisse zählen"),
+    ):
+        p = sub.add_parser(name, help=text)
+        p.add_argument("--since", help="z. B. 30d, 12h oder 2024-06-01")
+        p.add_argument("--until")
+        p.add_argument("--run", help="run_ids, kommagetrennt")
+        p.add_argument("--event", help="Ereignisse, kommagetrennt")
+        p.add_argument(
+            "--where", action="append", default=[], help="Feld=Wert, mehrfach möglich"
+        )
+        if name == "query":
+            p.add_argument("--fields", help="nur diese Felder ausgeben")
+            p.add_argument("--limit", type=int)
+        else:
+            p.add_argument("--by", default="event", help="Gruppierung, kommagetrennt")
+            p.add_argument("--field", help="numerisches Feld, z. B. duration_ms")
+
+    sub.add_parser("reindex", help="Index neu aufbauen")
+
+    args = parser.parse_args()
+    if args.command == "reindex":
+        segments = rebuild_index(args.dir)
+        print(f"{len(segments)} Segmente indiziert.")
+        return
+
+    where = dict(item.split("=", 1) for item in args.where)
+    entries = iter_events(
+        args.dir,
+        since=parse_time(args.since),
+        until=parse_time(args.until),
+        run_ids=_csv(args.run),
+        events=_csv(args.event),
+        where=where,
+    )
+
+    if args.command == "query":
+        fields = _csv(args.fields)
+        for n, entry in enumerate(entries):
+            if args.limit is not None and n >= args.limit:
+                break
+            if fields:
+                entry = {key: entry.get(key) for key in fields}
+            print(json.dumps(entry, ensure_ascii=False))
+    else:
+        for row in aggregate(entries, by=_csv(args.by), field=args.field):
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+Automatische Optimierung des Bewegungsprofils je Achse.
+
+Für jede Achse werden Testfahrten mit stufenweise erhöhter Geschwindigkeit
+und Beschleunigung ausgeführt. Vor und nach jeder Stufe wird eine Referenz
+(Passermarke in Home-Position) fotografiert; weicht das Bild danach per
+Phasenkorrelation um mehr als TUNING_MAX_OFFSET_PX ab, wurden Schritte
+verloren und die Stufe gilt als nicht bestanden. Das schnellste bestandene
+Profil (abzüglich Sicherheitsabschlag) wird in MOTION_PROFILE_FILE
+gespeichert und von generate_config_file in die config.h übernommen.
+
+Voraussetzung: frisch hochgeladene Firmware, die noch auf START wartet.
+"""
+
+import json
+import math
+import os
+import time
+
+from packages.camera_service import PRIORITY_MANUAL
+from packages.config import (CAMERA_TIMEOUT, DEFAULT_ACCEL, DEFAULT_MAX_SPEED,
+                             DISTANCE_COLS, DISTANCE_ROWS, MOTION_PROFILE_FILE,
+                             POSITIONS_COLUMN, POSITIONS_ROW,
+                             STEPS_PER_REVOLUTION, TUNING_MAX_ACCEL,
+                             TUNING_MAX_OFFSET_PX, TUNING_MAX_SPEED,
+                             TUNING_REPETITIONS, TUNING_SAFETY_FACTOR,
+                             TUNING_SPEED_STEP)
+from packages.logger import log_message
+
+AXES = {
+    # Achse: (Firmware-Kürzel, Fahrweg in Schritten über die ganze Platte)
+    "column": (
+        "COL",
+        int(DISTANCE_COLS * STEPS_PER_REVOLUTION * (len(POSITIONS_COLUMN) - 1)),
+    ),
+    # Reihen werden in negativer Richtung angefahren (siehe calculatePositions)
+    "row": (
+        "ROW",
+        -int(DISTANCE_ROWS * STEPS_PER_REVOLUTION * (len(POSITIONS_ROW) - 1)),
+    ),
+}
+
+MIN_CORRELATION_PEAK = 0.05  # Darunter ist der Bildvergleich nicht aussagekräftig
+
+
+def default_motion_profile():
+    return {
+        axis: {"max_speed": DEFAULT_MAX_SPEED, "accel": DEFAULT_ACCEL}
+        for axis in AXES
+    }
+
+
+def load_motion_profile():
+    """Liest das gespeicherte Bewegungsprofil, fehlende Werte = Standard."""
+    profile = default_motion_profile()
+    try:
+        with open(MOTION_PROFILE_FILE, "r") as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return profile
+    except (OSError, ValueError) as e:
+        log_message(f"Bewegungsprofil nicht lesbar, nutze Standard: {e}", "warning")
+        return profile
+
+    for axis in AXES:
+        values = stored.get(axis, {})
+        for key in ("max_speed", "accel"):
+            if isinstance(values.get(key), int) and values[key] > 0:
+                profile[axis][key] = values[key]
+    return profile
+
+
+def save_motion_profile(profile):
+    os.makedirs(os.path.dirname(MOTION_PROFILE_FILE), exist_ok=True)
+    tmp_path = MOTION_PROFILE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, MOTION_PROFILE_FILE)
+    log_message(f"Bewegungsprofil gespeichert: {MOTION_PROFILE_FILE}")
+
+
+def profile_ladder(start_speed, start_accel):
+    """Stufen (max_speed, accel) vom Ausgangsprofil bis zu den Obergrenzen."""
+    ladder = []
+    speed, accel = float(start_speed), float(start_accel)
+    while speed <= TUNING_MAX_SPEED and accel <= TUNING_MAX_ACCEL:
+        ladder.append((int(speed), int(accel)))
+        speed *= TUNING_SPEED_STEP
+        accel *= TUNING_SPEED_STEP
+    return ladder
+
+
+class MotionTuningError(Exception):
+    pass
+
+
+class MotionTuner:
+    def __init__(self, manager, repetitions=TUNING_REPETITIONS, settle_s=0.5, job=None):
+        self.manager = manager
+        self.job = job  # optionaler Hintergrund-Job (Abbruch/Fortschritt)
+        self.repetitions = repetitions
+        self.settle_s = settle_s
+        self.results = []
+
+    # Serielle Kommunikation im Leerlauf der Firmware
+    def send_and_wait(self, command, prefix, timeout):
+        """Sendet einen Befehl und wartet auf den Status <prefix...>."""
+        # Import hier, da camera_serial_manager seinerseits dieses Modul importiert
+        from packages.camera_serial_manager import FirmwareError
+
+        try:
+            return self.manager.send_and_wait(command, prefix, timeout)
+        except FirmwareError as e:
+            raise MotionTuningError(str(e)) from e
+
+    # Referenzbild
+    def capture_reference(self):
+        # Import hier, damit das Modul ohne NumPy geladen werden kann
+        # (generate_config_file benötigt nur load_motion_profile)
+        from packages.imaging import prepare_frame
+
+        if self.manager.picam is None:
+            raise MotionTuningError("Kamera nicht initialisiert!")
+        time.sleep(self.settle_s)  # Nachschwingen abwarten
+        image = self.manager.camera.capture_array(priority=PRIORITY_MANUAL).result(
+            timeout=CAMERA_TIMEOUT
+        )
+        frame, factor = prepare_frame(image)
+        return frame, factor
+
+    def measure_offset(self, before, after):
+        from packages.imaging import phase_correlation
+
+        frame_before, factor = before
+        frame_after, _ = after
+        dy, dx, peak = phase_correlation(frame_before, frame_after)
+        return math.hypot(dy, dx) * factor, peak
+
+    # Einzelne Stufe
+    def test_profile(self, axis, max_speed, accel):
+        if self.job is not None:
+            self.job.check_cancelled()
+            self.job.report(0.0 if axis == "column" else 0.5, f"{axis} v={max_speed}")
+        code, steps = AXES[axis]
+        self.send_and_wait(f"PROFILE_{code}_{max_speed}_{accel}", "PROFILE_SET", 5)
+
+        before = self.capture_reference()
+        # Großzügiges Timeout: Fahrzeit bei Standardprofil plus Reserve
+        timeout = 30 + self.repetitions * 2 * abs(steps) / max(1, max_speed) * 4
+        status = self.send_and_wait(
+            f"TEST_MOVE_{code}_{steps}_{self.repetitions}", "TEST_MOVE_DONE_", timeout
+        )
+        after = self.capture_reference()
+
+        elapsed_ms = int(status.rsplit("_", 1)[-1])
+        offset_px, peak = self.measure_offset(before, after)
+        passed = offset_px <= TUNING_MAX_OFFSET_PX and peak >= MIN_CORRELATION_PEAK
+
+        result = {
+            "axis": axis,
+            "max_speed": max_speed,
+            "accel": accel,
+            "move_ms": elapsed_ms / (2 * self.repetitions),
+            "offset_px": round(offset_px, 2),
+            "correlation_peak": round(peak, 3),
+            "passed": passed,
+        }
+        self.results.append(result)
+        log_message(
+            f"Optimierung {axis}: v={max_speed}, a={accel} -> "
+            f"{result['move_ms']:.0f} ms/Fahrt, Versatz {offset_px:.2f}px "
+            f"({'OK' if passed else 'Schrittverlust'})",
+            "info" if passed else "warning",
+        )
+        return result
+
+    def tune_axis(self, axis):
+        """Testet die Stufen einer Achse bis zum ersten Schrittverlust."""
+        best = None
+        for max_speed, accel in profile_ladder(DEFAULT_MAX_SPEED, DEFAULT_ACCEL):
+            result = self.test_profile(axis, max_speed, accel)
+            if not result["passed"]:
+                break
+            best = result
+
+        if best is None:
+            log_message(
+                f"Achse {axis}: bereits das Standardprofil verliert Schritte, "
+                "behalte Standardwerte.",
+                "error",
+            )
+            return {"max_speed": DEFAULT_MAX_SPEED, "accel": DEFAULT_ACCEL}
+
+        tuned = {
+            "max_speed": max(
+                DEFAULT_MAX_SPEED, int(best["max_speed"] * TUNING_SAFETY_FACTOR)
+            ),
+            "accel": max(DEFAULT_ACCEL, int(best["accel"] * TUNING_SAFETY_FACTOR)),
+            "move_ms": best["move_ms"],
+        }
+        # Gewähltes Profil in der Firmware aktiv lassen
+        code, _ = AXES[axis]
+        self.send_and_wait(
+            f"PROFILE_{code}_{tuned['max_speed']}_{tuned['accel']}", "PROFILE_SET", 5
+        )
+        return tuned
+
+    def run(self, axes=("column", "row")):
+        """Optimiert die angegebenen Achsen und speichert das Ergebnis."""
+        if self.manager.polling_active:
+            raise MotionTuningError("Optimierung während eines Laufs nicht möglich!")
+
+        log_message("Starte Optimierung des Bewegungsprofils...", "info")
+        profile = load_motion_profile()
+        for axis in axes:
+            profile[axis] = self.tune_axis(axis)
+            log_message(
+                f"Achse {axis}: MAX_SPEED={profile[axis]['max_speed']}, "
+                f"ACCEL={profile[axis]['accel']}",
+                "info",
+            )
+
+        profile["tuned_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        profile["results"] = self.results
+        save_motion_profile(profile)
+        log_message(
+            "Optimierung abgeschlossen. Programm neu laden, um das Profil zu übernehmen.",
+            "info",
+        )
+        return profile
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+
+"""
+Laufplanung: Dauer, Speicherbedarf und Restzeit aus gemessenen Zeiten.
+
+Das Zeitmodell (PLANNER_MODEL_FILE) wird nach jedem Lauf aus dessen
+Journal-Einträgen nachgeführt:
+
+    station_s      Aufnahme, Kodieren, Schreiben und Kommunikation je
+                   Station (ohne Fahrzeit), je Encoder-Modus
+    capture_s      Kamera-Phase je Bild (capture_done capture_ms)
+    encode_s       Kodieren je Bild samt Wartezeit im Pool (encode_ms)
+    cycle_head_s   Start eines Cycles bis zur ersten Station
+    cycle_tail_s   letzte Station bis CYCLE_COMPLETED (ohne Heimfahrt)
+    move_scale     gemessene / berechnete Fahrzeit
+    image_bytes    Bildgröße je Plattentyp und Modus
+    journal/log    Bytes je Station
+
+Die Fahrzeiten werden aus dem Bewegungsprofil (Trapezprofil mit
+max_speed/accel je Achse) und den Abständen berechnet und mit move_scale
+an die gemessenen Abstände kurzer und langer Fahrten angepasst. Ohne Messwerte
+gelten Schätzwerte (PLANNER_DEFAULT_STATION_S, JPEG_BYTES_PER_PIXEL).
+
+Am Cycle-Ende wartet der Lauf, bis der Pool alle Bilder kodiert hat;
+dauert das Kodieren des letzten Bilds länger als Heimfahrt und Nachlauf,
+verlängert die Differenz jeden Cycle.
+
+Während eines Laufs korrigiert EtaTracker die Vorhersage mit den
+tatsächlichen Zeiten und liefert die voraussichtliche Endzeit.
+
+    python -m packages.planner --repeats 48 --pause 30
+    python -m packages.planner --learn run_20240601_120000
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import statistics
+import time
+
+from packages.config import (
+    CUBE_CHANNELS,
+    CUBE_ENABLED,
+    CUBE_SIZE,
+    DISTANCE_COLS,
+    DISTANCE_ROWS,
+    ENCODER_BACKEND,
+    IMAGES_DIR,
+    JOURNAL_DIR,
+    JPEG_BYTES_PER_PIXEL,
+    PLANNER_DEFAULT_STATION_S,
+    PLANNER_DISK_RESERVE,
+    PLANNER_LEARNING_RATE,
+    PLANNER_MODEL_FILE,
+    PLATE_TYPE,
+    POSITIONS_COLUMN,
+    POSITIONS_ROW,
+    STEPS_PER_REVOLUTION,
+    TOTAL_STATIONS,
+)
+from packages.logger import log_message
+from packages.motion_tuning import load_motion_profile
+from packages.sensor_modes import output_size_for
+
+# Bytes je Pixel ohne Messwerte, je Encoder-Modus
+DEFAULT_BYTES_PER_PIXEL = {
+    "camera": JPEG_BYTES_PER_PIXEL,
+    "jpeg": JPEG_BYTES_PER_PIXEL,
+    "webp": JPEG_BYTES_PER_PIXEL / 2,
+    "png": 2.0,
+    "tiff": 3.0,
+    "raw": 3.0,
+}
+DEFAULT_JOURNAL_BYTES_PER_STATION = 500
+DEFAULT_LOG_BYTES_PER_STATION = 400
+
+
+# =============================================
+# Zeitmodell
+# =============================================
+
+
+def default_model():
+    return {
+        "station_s": {},
+        "cycle_head_s": {},
+        "cycle_tail_s": {},
+        "capture_s": {},
+        "encode_s": {},
+        "move_scale": None,
+        "image_bytes": {},
+        "journal_bytes_per_station": None,
+        "log_bytes_per_station": None,
+        "runs": [],
+    }
+
+
+def load_model(path=PLANNER_MODEL_FILE):
+    model = default_model()
+    try:
+        with open(path, "r") as f:
+            model.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        log_message(f"Zeitmodell nicht lesbar, nutze Schätzwerte: {e}", "warning")
+    return model
+
+
+def save_model(model, path=PLANNER_MODEL_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(model, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def blend(old, new, rate=PLANNER_LEARNING_RATE):
+    """Gleitender Mittelwert; ohne bisherigen Wert zählt der neue ganz."""
+    if new is None:
+        return old
+    if old is None:
+        return new
+    return old + rate * (new - old)
+
+
+# =============================================
+# Fahrzeiten
+# =============================================
+
+
+def move_time(steps, max_speed, accel):
+    """Fahrzeit in s für steps Schritte mit Trapezprofil (AccelStepper)."""
+    steps = abs(steps)
+    if steps == 0:
+        return 0.0
+    ramp = max_speed**2 / accel  # Schritte zum Beschleunigen und Bremsen
+    if steps <= ramp:
+        return 2 * math.sqrt(steps / accel)
+    return steps / max_speed + max_speed / accel
+
+
+def cycle_moves(profile=None):
+    """
+    Fahrzeit vor jeder Station eines Cycles in Firmware-Reihenfolge und die
+    Heimfahrt am Ende: (Liste je Station, Heimfahrt).
+    """
+    profile = profile or load_motion_profile()
+    column_pitch = DISTANCE_COLS * STEPS_PER_REVOLUTION
+    row_pitch = DISTANCE_ROWS * STEPS_PER_REVOLUTION
+    columns, rows = len(POSITIONS_COLUMN), len(POSITIONS_ROW)
+
+    def column(steps):
+        return move_time(steps, **_axis(profile, "column"))
+
+    def row(steps):
+        return move_time(steps, **_axis(profile, "row"))
+
+    moves = []
+    for station in range(TOTAL_STATIONS):
+        if station == 0:
+            moves.append(0.0)
+        elif station % columns == 0:
+            # Spalte zurück auf 0, dann eine Reihe weiter
+            moves.append(column((columns - 1) * column_pitch) + row(row_pitch))
+        else:
+            moves.append(column(column_pitch))
+    home = column((columns - 1) * column_pitch) + row((rows - 1) * row_pitch)
+    return moves, home
+
+
+def _axis(profile, axis):
+    return {"max_speed": profile[axis]["max_speed"], "accel": profile[axis]["accel"]}
+
+
+# =============================================
+# Vorhersage
+# =============================================
+
+
+def default_image_bytes(mode, plate_type):
+    width, height = output_size_for(plate_type)
+    return width * height * DEFAULT_BYTES_PER_PIXEL.get(mode, JPEG_BYTES_PER_PIXEL)
+
+
+def predict_run(
+    repeats,
+    pause_minutes,
+    model=None,
+    mode=ENCODER_BACKEND,
+    plate_type=PLATE_TYPE,
+    profile=None,
+    cube=CUBE_ENABLED,
+):
+    """Vorhersage für einen Lauf mit repeats Cycles und pause_minutes Pause."""
+    model = model or load_model()
+    moves, home = cycle_moves(profile)
+    scale = model["move_scale"] or 1.0
+    moves, home = [move * scale for move in moves], home * scale
+    station = model["station_s"].get(mode, PLANNER_DEFAULT_STATION_S)
+    head = model["cycle_head_s"].get(mode, 0.0)
+    tail = model["cycle_tail_s"].get(mode, station)
+    capture = model["capture_s"].get(mode)
+    encode = model["encode_s"].get(mode)
+    drain = max(0.0, encode - home - tail) if encode is not None else 0.0
+
+    # Die erste Station liegt in der Home-Position; jede weitere kostet
+    # Fahrt plus Stationszeit, die letzte Aufnahme steckt in tail
+    cycle_s = head + sum(moves[1:]) + station * (TOTAL_STATIONS - 1) + home + tail
+    cycle_s += drain
+    pause_s = pause_minutes * 60
+    total_s = repeats * cycle_s + (repeats - 1) * pause_s
+
+    images = repeats * TOTAL_STATIONS
+    image_bytes = model["image_bytes"].get(
+        f"{plate_type}/{mode}", default_image_bytes(mode, plate_type)
+    )
+    journal_bytes = images * (
+        model["journal_bytes_per_station"] or DEFAULT_JOURNAL_BYTES_PER_STATION
+    )
+    log_bytes = images * (
+        model["log_bytes_per_station"] or DEFAULT_LOG_BYTES_PER_STATION
+    )
+    # Zeitreihen-Würfel: unkomprimierter Frame und Zeitstempel (f8) je Well
+    cube_bytes = (
+        images * (CUBE_SIZE[0] * CUBE_SIZE[1] * CUBE_CHANNELS + 8) if cube else 0
+    )
+    disk_bytes = images * image_bytes + journal_bytes + log_bytes + cube_bytes
+    try:
+        free_bytes = shutil.disk_usage(_existing_parent(IMAGES_DIR)).free
+    except OSError:
+        free_bytes = None
+
+    return {
+        "mode": mode,
+        "plate_type": plate_type,
+        "measured": mode in model["station_s"],
+        "station_s": round(station, 2),
+        "capture_s": round(capture, 2) if capture is not None else None,
+        "encode_s": round(encode, 2) if encode is not None else None,
+        "drain_s": round(drain, 2),
+        "move_s": round(sum(moves) + home, 2),
+        "cycle_s": round(cycle_s, 1),
+        "pause_s": pause_s,
+        "total_s": round(total_s, 1),
+        # Die Pause ist der gewünschte Abstand der Aufnahmen; ist ein Cycle
+        # länger, liegen die Wells mehr als doppelt so weit auseinander
+        "overrun": cycle_s > pause_s,
+        "images": images,
+        "image_bytes": round(image_bytes),
+        "disk_bytes": round(disk_bytes),
+        "journal_bytes": round(journal_bytes),
+        "log_bytes": round(log_bytes),
+        "cube_bytes": cube_bytes,
+        "free_bytes": free_bytes,
+        "disk_ok": free_bytes is None
+        or disk_bytes + PLANNER_DISK_RESERVE <= free_bytes,
+    }
+
+
+def _existing_parent(path):
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+
+def format_duration(seconds):
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60}:{minutes % 60:02d} h"
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def describe(prediction):
+    """Zusammenfassung für Log und Rückfrage."""
+    storage = [
+        f"Journal {format_bytes(prediction['journal_bytes'])}",
+        f"Log {format_bytes(prediction['log_bytes'])}",
+    ]
+    if prediction["cube_bytes"]:
+        storage.append(f"Würfel {format_bytes(prediction['cube_bytes'])}")
+    lines = [
+        f"Dauer ca. {format_duration(prediction['total_s'])}, je Cycle "
+        f"{format_duration(prediction['cycle_s'])} (Fahrt "
+        f"{prediction['move_s']:.0f} s, {prediction['station_s']:.1f} s je Station"
+        f"{'' if prediction['measured'] else ', geschätzt'})",
+        f"Speicher ca. {format_bytes(prediction['disk_bytes'])} für "
+        f"{prediction['images']} Bilder ({', '.join(storage)})",
+    ]
+    if prediction["capture_s"] is not None:
+        phases = f"Kamera {prediction['capture_s']:.1f} s"
+        if prediction["encode_s"] is not None:
+            phases += f", Kodieren {prediction['encode_s']:.1f} s"
+        if prediction["drain_s"]:
+            phases += f" (Cycle-Ende +{prediction['drain_s']:.0f} s)"
+        lines.append(f"Je Bild: {phases}")
+    if prediction["overrun"]:
+        lines.append(
+            f"WARNUNG: Ein Cycle ({format_duration(prediction['cycle_s'])}) dauert "
+            f"länger als die Pause ({format_duration(prediction['pause_s'])})."
+        )
+    if not prediction["disk_ok"]:
+        lines.append(
+            f"WARNUNG: Nur {format_bytes(prediction['free_bytes'])} frei, "
+            "Speicher reicht nicht."
+        )
+    return "\n".join(lines)
+
+
+# =============================================
+# Lernen aus dem Journal
+# =============================================
+
+
+def run_samples(entries, profile=None):
+    """
+    Messwerte eines Laufs aus seinen Journal-Einträgen (zeitlich sortiert).
+    Gibt None zurück, wenn der Lauf keine Stationen enthält.
+    """
+    moves, home = cycle_moves(profile)
+    start = next((e for e in entries if e["event"] == "run_start"), {})
+    pause_s = (start.get("pause_minutes") or 0) * 60
+
+    stations = {}  # cycle -> {move: ts}
+    cycle_start = {}  # cycle -> (ts, pause_s)
+    cycle_end = {}
+    image_bytes = []
+    capture_ms, encode_ms = [], []
+    journal_bytes = 0
+    for entry in entries:
+        journal_bytes += len(json.dumps(entry, ensure_ascii=False, default=str)) + 1
+        event, cycle = entry["event"], entry.get("cycle")
+        if event == "frame_received" and entry.get("frame") == "MOVE_COMPLETED":
+            stations.setdefault(cycle, {})[entry.get("move")] = entry["ts"]
+        elif event == "frame_received" and entry.get("frame") == "CYCLE_COMPLETED":
+            cycle_end[cycle] = entry["ts"]
+        elif event == "command_sent":
+            command = entry.get("command", "")
+            if command == "START":
+                cycle_start[cycle] = (entry["ts"], 0.0)
+            elif command == "NEXT_CYCLE":
+                cycle_start[cycle] = (entry["ts"], pause_s)
+            elif command.startswith("NEXT_CYCLE_"):
+                cycle_start[cycle] = (
+                    entry["ts"],
+                    int(command.rsplit("_", 1)[1]) / 1000,
+                )
+        elif event == "capture_done":
+            if "capture_ms" in entry:
+                capture_ms.append(entry["capture_ms"])
+            if "encode_ms" in entry:
+                encode_ms.append(entry["encode_ms"])
+            if "bytes" in entry:
+                image_bytes.append(entry["bytes"])
+            elif entry.get("path") and os.path.exists(entry["path"]):
+                image_bytes.append(os.path.getsize(entry["path"]))
+
+    gaps, head_s, tail_s = [], [], []  # gaps: (berechnete Fahrzeit, Abstand)
+    for cycle, times in stations.items():
+        for move, ts in times.items():
+            if move and move - 1 in times:
+                gaps.append((moves[move], ts - times[move - 1]))
+        if 0 in times and cycle in cycle_start:
+            started, pause = cycle_start[cycle]
+            head_s.append(times[0] - started - pause)
+        last = max(times)
+        if cycle in cycle_end and last == TOTAL_STATIONS - 1:
+            tail_s.append(cycle_end[cycle] - times[last])
+
+    count = sum(len(times) for times in stations.values())
+    if not count:
+        return None
+
+    # Abstand = Stationszeit + move_scale * Fahrzeit; die Steigung ist nur
+    # bestimmbar, wenn kurze und lange Fahrten (Reihenwechsel) vorkommen
+    move_scale = None
+    if len({move for move, _ in gaps}) > 1:
+        fit = statistics.linear_regression(*zip(*gaps))
+        if fit.slope > 0:
+            move_scale = fit.slope
+    station_s = [gap - move * (move_scale or 1.0) for move, gap in gaps]
+    tail_s = [tail - home * (move_scale or 1.0) for tail in tail_s]
+    capture_s = statistics.median(capture_ms) / 1000 if capture_ms else None
+    encode_s = statistics.median(encode_ms) / 1000 if encode_ms else None
+    station = statistics.median(station_s) if station_s else None
+    if station is not None:
+        # Die Station wartet mindestens auf die Kamera; weniger heißt, dass
+        # die berechnete Fahrzeit zu lang ist
+        station = max(station, capture_s or 0.0)
+    return {
+        "mode": start.get("encoder", "camera"),
+        "plate_type": start.get("plate_type", PLATE_TYPE),
+        "stations": count,
+        "station_s": station,
+        "capture_s": capture_s,
+        "encode_s": encode_s,
+        "move_scale": move_scale,
+        "cycle_head_s": max(0.0, statistics.median(head_s)) if head_s else None,
+        "cycle_tail_s": statistics.median(tail_s) if tail_s else None,
+        "image_bytes": statistics.mean(image_bytes) if image_bytes else None,
+        "journal_bytes_per_station": journal_bytes / count,
+    }
+
+
+def learn_run(
+    journal_dir, run_id, log_bytes=None, path=PLANNER_MODEL_FILE, profile=None
+):
+    """Führt das Zeitmodell mit den Messwerten eines Laufs nach."""
+    from packages.journal import iter_events
+
+    samples = run_samples(list(iter_events(journal_dir, run_ids=[run_id])), profile)
+    if samples is None:
+        return None
+
+    model = load_model(path)
+    mode = samples["mode"]
+    for key in ("station_s", "cycle_head_s", "cycle_tail_s", "capture_s", "encode_s"):
+        value = blend(model[key].get(mode), samples[key])
+        if value is not None:
+            model[key][mode] = round(value, 3)
+    move_scale = blend(model["move_scale"], samples["move_scale"])
+    if move_scale is not None:
+        model["move_scale"] = round(move_scale, 3)
+    size_key = f"{samples['plate_type']}/{mode}"
+    value = blend(model["image_bytes"].get(size_key), samples["image_bytes"])
+    if value is not None:
+        model["image_bytes"][size_key] = round(value)
+    model["journal_bytes_per_station"] = round(
+        blend(model["journal_bytes_per_station"], samples["journal_bytes_per_station"])
+    )
+    if log_bytes is not None and log_bytes >= 0:
+        model["log_bytes_per_station"] = round(
+            blend(model["log_bytes_per_station"], log_bytes / samples["stations"])
+        )
+    # Nur die letzten Läufe als Nachweis behalten
+    model["runs"] = (model["runs"] + [run_id])[-20:]
+    model["updated"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    save_model(model, path)
+    log_message(
+        f"Zeitmodell aktualisiert ({mode}): {model['station_s'].get(mode)} s je Station",
+        "info",
+    )
+    return model
+
+
+def log_file_size():
+    """Größe der aktuellen Logdatei (FileHandler des Loggers 'Paparazzo')."""
+    for handler in logging.getLogger("Paparazzo").handlers:
+        if isinstance(handler, logging.FileHandler):
+            try:
+                return os.path.getsize(handler.baseFilename)
+            except OSError:
+                return None
+    return None
+
+
+# =============================================
+# Restzeit während des Laufs
+# =============================================
+
+
+class EtaTracker:
+    """
+    Restzeit eines laufenden Laufs. Startet mit der Vorhersage und ersetzt
+    Stations- und Cycle-Zeiten schrittweise durch die gemessenen.
+    """
+
+    def __init__(self, prediction, repeats, clock=time):
+        self.clock = clock
+        self.repeats = repeats
+        self.pause_s = prediction["pause_s"]
+        self.cycle_s = prediction["cycle_s"]
+        # Abstand zweier Stationen einschließlich Fahrt
+        self.station_s = prediction["cycle_s"] / TOTAL_STATIONS
+        self.log_size = log_file_size()
+        self.cycle = 0
+        self.move = None
+        self.last_station_at = None
+        self.cycle_started_at = clock.time()
+        self.waiting_until = None
+
+    def station_done(self, cycle, move):
+        now = self.clock.time()
+        if self.last_station_at is not None and cycle == self.cycle:
+            self.station_s = blend(self.station_s, now - self.last_station_at, 0.2)
+        self.cycle, self.move = cycle, move
+        self.last_station_at = now
+        self.waiting_until = None
+
+    def cycle_done(self, pause_s):
+        now = self.clock.time()
+        self.cycle_s = blend(self.cycle_s, now - self.cycle_started_at, 0.5)
+        self.pause_s = pause_s
+        self.waiting_until = now + pause_s
+        self.cycle_started_at = self.waiting_until
+        self.cycle += 1
+        self.move = None
+        self.last_station_at = None
+
+    def remaining_s(self):
+        now = self.clock.time()
+        later_cycles = max(0, self.repeats - self.cycle - 1)
+        if self.waiting_until is not None:
+            current = max(0.0, self.waiting_until - now) + self.cycle_s
+        else:
+            stations_left = TOTAL_STATIONS - (
+                self.move + 1 if self.move is not None else 0
+            )
+            elapsed = now - self.cycle_started_at
+            current = max(stations_left * self.station_s, self.cycle_s - elapsed)
+        return current + later_cycles * (self.pause_s + self.cycle_s)
+
+    def finish_at(self):
+        return self.clock.time() + self.remaining_s()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Laufplanung")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--pause", type=float, default=60, help="Pause in Minuten")
+    parser.add_argument("--mode", default=ENCODER_BACKEND, help="Encoder-Modus")
+    parser.add_argument("--plate", default=PLATE_TYPE)
+    parser.add_argument(
+        "--learn", nargs="+", metavar="RUN_ID", help="aus dem Journal lernen"
+    )
+    parser.add_argument("--dir", default=JOURNAL_DIR, help="Journal-Verzeichnis")
+    parser.add_argument("--json", action="store_true", help="Ausgabe als JSON")
+    args = parser.parse_args()
+
+    for run_id in args.learn or ():
+        if learn_run(args.dir, run_id) is None:
+            print(f"{run_id}: keine Stationen im Journal")
+
+    prediction = predict_run(
+        args.repeats, args.pause, mode=args.mode, plate_type=args.plate
+    )
+    if args.json:
+        print(json.dumps(prediction, indent=2))
+    else:
+        print(describe(prediction))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,89 @@
-#!/usr/bin/python3
+#!/usr/bin/env python3
 
-# Normally the QtGlPreview implementation is recommended as it benefits
-# from GPU hardware acceleration.
+"""
+Live-Vorschau der Kamera über den Kameradienst.
 
-import time
+Die Vorschau öffnet die Kamera nicht selbst, sondern holt Bilder mit
+PRIORITY_PREVIEW über CameraService.preview_frame(): Aufnahmen eines
+laufenden Laufs und manuelle Fotos haben immer Vorrang, und es ist
+höchstens ein Vorschauauftrag offen. In der GUI über "Vorschau" im
+Fenster der manuellen Positionierung, eigenständig mit
+    python -m packages.preview
+"""
 
-from picamera2 import Picamera2, Preview
+import tkinter as tk
 
-picam2 = Picamera2()
-picam2.start_preview(Preview.QTGL)
+from PIL import Image, ImageTk
 
-preview_config = picam2.create_preview_configuration()
-picam2.configure(preview_config)
+from packages.camera_service import CameraService
+from packages.config import PREVIEW_INTERVAL_MS, PREVIEW_SIZE
+from packages.logger import log_message
 
-picam2.start()
-time.sleep(600)
+
+class PreviewWindow:
+    def __init__(
+        self,
+        parent,
+        camera,
+        size=PREVIEW_SIZE,
+        interval_ms=PREVIEW_INTERVAL_MS,
+        on_close=None,
+    ):
+        self.camera = camera
+        self.size = size
+        self.interval_ms = interval_ms
+        self.on_close = on_close
+        self.window = tk.Toplevel(parent)
+        self.window.title("Vorschau")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.label = tk.Label(self.window, text="Warte auf Kamera...")
+        self.label.pack()
+        self._photo = None  # Referenz halten, sonst verwirft Tk das Bild
+        self._future = None
+        self._after = self.window.after(0, self.update)
+
+    def update(self):
+        """Holt das nächste Bild ab, ohne den Tk-Thread zu blockieren."""
+        if self._future is None:
+            self._future = self.camera.preview_frame(max_size=max(self.size))
+        if not self._future.done():
+            self._after = self.window.after(20, self.update)
+            return
+
+        future, self._future = self._future, None
+        try:
+            array = future.result()
+        except Exception as e:
+            log_message(f"Vorschau nicht verfügbar: {e or repr(e)}", "warning")
+            self.close()
+            return
+
+        image = Image.fromarray(array)
+        image.thumbnail(self.size)
+        self._photo = ImageTk.PhotoImage(image)
+        self.label.configure(image=self._photo, text="")
+        self._after = self.window.after(self.interval_ms, self.update)
+
+    def close(self):
+        if self._after is not None:
+            self.window.after_cancel(self._after)
+            self._after = None
+        self.window.destroy()
+        if self.on_close is not None:
+            self.on_close()
+
+
+def main():
+    camera = CameraService()
+    camera.start()
+    root = tk.Tk()
+    root.withdraw()
+    PreviewWindow(root, camera, on_close=root.quit)
+    try:
+        root.mainloop()
+    finally:
+        camera.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""
+Registrierung der Well-Bilder über die Cycles hinweg.
+
+Durch Umkehrspiel der Mechanik ist dasselbe Well in jedem Cycle leicht
+verschoben abgebildet. Jedes neue Bild wird per Phasenkorrelation (auf
+verkleinerten Graustufenbildern) gegen das erste Bild des Wells im Lauf
+ausgerichtet. Die Versätze landen in den Laufdaten (Typ "registration");
+optional werden ausgerichtete, enger beschnittene Bilder unter
+run_*/aligned/cycle_*/ abgelegt.
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from packages.config import (REGISTRATION_ALIGNED_CROP, REGISTRATION_MAX_SIZE,
+                             REGISTRATION_WORKERS)
+from packages.encoders import open_image
+from packages.imaging import phase_correlation, prepare_frame
+from packages.logger import log_message
+from packages.run_data import RunData, iter_run_images
+
+ALIGNED_DIR = "aligned"
+
+
+def load_frame(path, max_size=REGISTRATION_MAX_SIZE):
+    """
+    Lädt ein Bild verkleinert als Graustufen-Array.
+
+    Bei JPEGs dekodiert Pillow per draft() direkt in reduzierter Auflösung,
+    was auf dem Pi ein Vielfaches schneller ist als volles Dekodieren.
+    Gibt (frame, factor, original_size) zurück.
+    """
+    with open_image(path) as img:
+        original_size = img.size
+        img.draft("L", (max_size, max_size))
+        draft_factor = original_size[0] / img.size[0]
+        frame, factor = prepare_frame(np.asarray(img.convert("L")), max_size)
+    return frame, factor * draft_factor, original_size
+
+
+def write_aligned(path, output_path, dy, dx, crop_fraction=REGISTRATION_ALIGNED_CROP):
+    """Schneidet das Bild um den Versatz verschoben eng zu und speichert es."""
+    with open_image(path) as img:
+        width, height = img.size
+        crop_w, crop_h = int(width * crop_fraction), int(height * crop_fraction)
+        # Bildinhalt ist um (dy, dx) gewandert -> Ausschnitt mitverschieben
+        left = (width - crop_w) / 2 + dx
+        top = (height - crop_h) / 2 + dy
+        left = int(round(min(max(left, 0), width - crop_w)))
+        top = int(round(min(max(top, 0), height - crop_h)))
+        cropped = img.crop((left, top, left + crop_w, top + crop_h))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if output_path.endswith(".npy"):
+            np.save(output_path, np.asarray(cropped), allow_pickle=False)
+        else:
+            cropped.save(output_path, quality=90)
+
+
+def aligned_path(run_dir, path):
+    cycle_name = os.path.basename(os.path.dirname(path))
+    return os.path.join(run_dir, ALIGNED_DIR, cycle_name, os.path.basename(path))
+
+
+class WellRegistrar:
+    """Registriert neue Aufnahmen eines Laufs fortlaufend (im Analyse-Thread)."""
+
+    def __init__(self, run_dir, aligned_output=False, max_size=REGISTRATION_MAX_SIZE):
+        self.run_dir = run_dir
+        self.aligned_output = aligned_output
+        self.max_size = max_size
+        self.run_data = RunData(run_dir)
+        self.references = {}
+
+    def register(self, well, path, cycle):
+        try:
+            frame, factor, _ = load_frame(path, self.max_size)
+        except (OSError, ValueError) as e:
+            log_message(f"Registrierung {well}: Bild nicht lesbar: {e}", "error")
+            return None
+
+        if well not in self.references or self.references[well].shape != frame.shape:
+            self.references[well] = frame
+            record = _record(cycle, well, path, 0.0, 0.0, 1.0, reference=True)
+        else:
+            dy, dx, peak = phase_correlation(self.references[well], frame)
+            record = _record(cycle, well, path, dy * factor, dx * factor, peak)
+
+        self.run_data.append(record)
+        if self.aligned_output:
+            write_aligned(
+                path, aligned_path(self.run_dir, path), record["dy"], record["dx"]
+            )
+        log_message(
+            f"Registrierung {well}: dy={record['dy']:.1f}px, dx={record['dx']:.1f}px",
+            "debug",
+        )
+        return record
+
+
+def _record(cycle, well, path, dy, dx, peak, reference=False):
+    return {
+        "type": "registration",
+        "cycle": cycle,
+        "well": well,
+        "file": os.path.basename(path),
+        "dy": round(float(dy), 2),
+        "dx": round(float(dx), 2),
+        "peak": round(float(peak), 3),
+        "reference": reference,
+    }
+
+
+def register_well_series(run_dir, well, images, aligned_output=False):
+    """Registriert alle Bilder eines Wells (Worker-Funktion für den Prozess-Pool)."""
+    records = []
+    reference = None
+    for cycle, path in images:
+        frame, factor, _ = load_frame(path)
+        if reference is None or reference.shape != frame.shape:
+            reference = frame
+            record = _record(cycle, well, path, 0.0, 0.0, 1.0, reference=True)
+        else:
+            dy, dx, peak = phase_correlation(reference, frame)
+            record = _record(cycle, well, path, dy * factor, dx * factor, peak)
+        if aligned_output:
+            write_aligned(path, aligned_path(run_dir, path), record["dy"], record["dx"])
+        records.append(record)
+    return records
+
+
+def register_runs(run_dirs, aligned_output=False, workers=REGISTRATION_WORKERS):
+    """
+    Registriert bestehende Läufe nachträglich.
+
+    Die Wells sind voneinander unabhängig und werden als eigene Aufgaben
+    auf einen Prozess-Pool verteilt. Vorhandene Registrierungsdaten der
+    Läufe werden ersetzt.
+    """
+    results = defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for run_dir in run_dirs:
+            series = defaultdict(list)
+            for cycle, well, _, path in iter_run_images(run_dir):
+                series[well].append((cycle, path))
+            for well, images in series.items():
+                future = pool.submit(
+                    register_well_series, run_dir, well, images, aligned_output
+                )
+                futures[future] = (run_dir, well)
+
+        for future in as_completed(futures):
+            run_dir, well = futures[future]
+            try:
+                results[run_dir].extend(future.result())
+            except Exception as e:
+                log_message(
+                    f"Registrierung {run_dir} {well} fehlgeschlagen: {e}", "error"
+                )
+
+    for run_dir, records in results.items():
+        records.sort(key=lambda r: (r["cycle"], r["well"]))
+        RunData(run_dir).replace_records("registration", records)
+        log_message(f"Registrierung abgeschlossen: {run_dir} ({len(records)} Bilder)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Well-Bilder bestehender Läufe registrieren"
+    )
+    parser.add_argument("run_dirs", nargs="+", help="run_*-Verzeichnisse")
+    parser.add_argument(
+        "--aligned", action="store_true", help="ausgerichtete Bilder erzeugen"
+    )
+    parser.add_argument("--workers", type=int, default=REGISTRATION_WORKERS)
+    args = parser.parse_args()
+    register_runs(args.run_dirs, aligned_output=args.aligned, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+Laufdaten: maschinenlesbare Begleitdaten eines Laufs (run_*/run_data.jsonl).
+
+Jede Zeile ist ein JSON-Objekt mit mindestens "type", z. B.
+    {"type": "registration", "cycle": 3, "well": "C4", "dy": 1.5, ...}
+Die Datei wird nur angehängt, damit auch sehr lange Läufe billig bleiben.
+"""
+
+import json
+import os
+import re
+import threading
+
+from packages.config import POSITIONS_COLUMN, POSITIONS_ROW
+
+RUN_DATA_FILE = "run_data.jsonl"
+
+# Dateinamen aus take_photo: <YYYYmmdd_HHMMSS>_<Reihe><Spalte>.<ext>, die
+# Endung je nach Encoder (Metadaten zu raw-Aufnahmen liegen als .json daneben)
+IMAGE_NAME_PATTERN = re.compile(
+    r"^(?P<timestamp>\d{8}_\d{6})_(?P<well>[A-Z]\d+)"
+    r"\.(?P<ext>jpe?g|JPE?G|png|webp|tiff?|npy)$"
+)
+CYCLE_DIR_PATTERN = re.compile(r"^cycle_(?P<cycle>\d+)$")
+
+WELLS = [f"{row}{col}" for row in POSITIONS_ROW for col in POSITIONS_COLUMN]
+
+
+def well_index(well):
+    """Index eines Wells in Aufnahmereihenfolge (A1=0, A2=1, ...)."""
+    return WELLS.index(well)
+
+
+class RunData:
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.path = os.path.join(run_dir, RUN_DATA_FILE)
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def records(self, record_type=None):
+        """Liest alle (bzw. alle Einträge eines Typs) in Dateireihenfolge."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+
+        result = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # z. B. abgeschnittene letzte Zeile nach Stromausfall
+            if record_type is None or record.get("type") == record_type:
+                result.append(record)
+        return result
+
+    def replace_records(self, record_type, records):
+        """Ersetzt alle Einträge eines Typs (z. B. nach Neuberechnung)."""
+        with self._lock:
+            kept = [r for r in self.records() if r.get("type") != record_type]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in kept + list(records):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+
+
+def iter_run_images(run_dir):
+    """
+    Liefert (cycle, well, timestamp, path) aller Bilder eines Laufs,
+    sortiert nach Cycle und Aufnahmezeit.
+    """
+    images = []
+    for cycle_name in os.listdir(run_dir):
+        match = CYCLE_DIR_PATTERN.match(cycle_name)
+        cycle_dir = os.path.join(run_dir, cycle_name)
+        if not match or not os.path.isdir(cycle_dir):
+            continue
+        cycle = int(match.group("cycle"))
+        for name in os.listdir(cycle_dir):
+            image_match = IMAGE_NAME_PATTERN.match(name)
+            if image_match and image_match.group("well") in WELLS:
+                images.append(
+                    (
+                        cycle,
+                        image_match.group("well"),
+                        image_match.group("timestamp"),
+                        os.path.join(cycle_dir, name),
+                    )
+                )
+    images.sort(key=lambda item: (item[0], item[2], well_index(item[1])))
+    return images
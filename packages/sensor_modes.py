@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""
+Auswahl von Sensormodus und Ausgabegröße passend zum Bildausschnitt.
+
+Bisher wird der volle Sensor ausgelesen und verarbeitet, obwohl per
+ScalerCrop nur CROP_FRACTION davon behalten wird. Hier wird der kleinste
+Sensormodus gewählt, dessen Auslesebereich (crop_limits) den Ausschnitt
+vollständig enthält und der ihn noch mit mindestens der Zielauflösung der
+Platte (PLATE_OUTPUT_SIZES) abbildet. Der Hauptstream wird auf genau diese
+Zielauflösung gesetzt.
+
+Übersicht ohne angeschlossene Kamera (Modi der HQ-Kamera, IMX477):
+    python -m packages.sensor_modes --plate 24well
+"""
+
+import argparse
+
+from packages.config import (CROP_FRACTION, JPEG_BYTES_PER_PIXEL,
+                             PLATE_OUTPUT_SIZES, PLATE_TYPE)
+
+# Sensormodi der Raspberry Pi HQ-Kamera, wie sie Picamera2.sensor_modes meldet
+IMX477_RESOLUTION = (4056, 3040)
+IMX477_MODES = [
+    {
+        "size": (1332, 990),
+        "fps": 120.03,
+        "crop_limits": (696, 528, 2664, 1980),
+        "unpacked": "SRGGB10",
+        "bit_depth": 10,
+    },
+    {
+        "size": (2028, 1080),
+        "fps": 50.03,
+        "crop_limits": (0, 440, 4056, 2160),
+        "unpacked": "SRGGB12",
+        "bit_depth": 12,
+    },
+    {
+        "size": (2028, 1520),
+        "fps": 40.01,
+        "crop_limits": (0, 0, 4056, 3040),
+        "unpacked": "SRGGB12",
+        "bit_depth": 12,
+    },
+    {
+        "size": (4056, 3040),
+        "fps": 10.0,
+        "crop_limits": (0, 0, 4056, 3040),
+        "unpacked": "SRGGB12",
+        "bit_depth": 12,
+    },
+]
+
+
+def crop_rect(sensor_resolution, crop_fraction):
+    """Zentrierter Ausschnitt (x, y, w, h) in Sensorkoordinaten."""
+    width, height = sensor_resolution
+    new_width, new_height = int(width * crop_fraction), int(height * crop_fraction)
+    return ((width - new_width) // 2, (height - new_height) // 2, new_width, new_height)
+
+
+def _contains(outer, inner):
+    ox, oy, ow, oh = outer
+    ix, iy, iw, ih = inner
+    return ox <= ix and oy <= iy and ix + iw <= ox + ow and iy + ih <= oy + oh
+
+
+def evaluate_mode(mode, roi, output_size):
+    """
+    Bewertet einen Sensormodus für den Ausschnitt roi und die Zielgröße.
+
+    Gibt ein dict mit Abdeckung, Pixeln des Ausschnitts im Modus, geschätzter
+    Auslesezeit (Bildperiode bei maximaler Bildrate) und Dateigröße der
+    Aufnahme in Zielgröße zurück.
+    """
+    size = tuple(mode["size"])
+    limits = tuple(mode["crop_limits"])
+    scale_x = size[0] / limits[2]
+    scale_y = size[1] / limits[3]
+    roi_pixels = (int(roi[2] * scale_x), int(roi[3] * scale_y))
+    covers = _contains(limits, roi)
+    dense = roi_pixels[0] >= output_size[0] and roi_pixels[1] >= output_size[1]
+    # Hochskalierte Bilder tragen nur so viel Information wie der Ausschnitt
+    # im Modus und komprimieren entsprechend besser
+    detail_pixels = min(roi_pixels[0], output_size[0]) * min(
+        roi_pixels[1], output_size[1]
+    )
+    return {
+        "size": size,
+        "bit_depth": mode.get("bit_depth"),
+        "fps": mode.get("fps"),
+        "covers_roi": covers,
+        "roi_pixels": roi_pixels,
+        "sufficient": covers and dense,
+        "readout_ms": round(1000.0 / mode["fps"], 1) if mode.get("fps") else None,
+        "file_kb": round(detail_pixels * JPEG_BYTES_PER_PIXEL / 1024),
+    }
+
+
+def select_mode(sensor_modes, sensor_resolution, crop_fraction, output_size):
+    """
+    Wählt den kleinsten ausreichenden Sensormodus.
+
+    Gibt (mode, report) zurück; report enthält die Bewertung aller Modi.
+    Reicht kein Modus aus, wird der größte abdeckende Modus gewählt.
+    """
+    roi = crop_rect(sensor_resolution, crop_fraction)
+    report = [evaluate_mode(mode, roi, output_size) for mode in sensor_modes]
+    candidates = [
+        (mode, rating)
+        for mode, rating in zip(sensor_modes, report)
+        if rating["sufficient"]
+    ]
+    if not candidates:
+        candidates = [
+            (mode, rating)
+            for mode, rating in zip(sensor_modes, report)
+            if rating["covers_roi"]
+        ]
+        candidates.sort(key=lambda item: -item[1]["roi_pixels"][0])
+        candidates = candidates[:1]
+    if not candidates:
+        raise ValueError(f"Kein Sensormodus enthält den Ausschnitt {roi}")
+
+    # Kleinste Auslesefläche zuerst, bei Gleichstand die höhere Bildrate
+    mode, _ = min(
+        candidates,
+        key=lambda item: (
+            item[1]["size"][0] * item[1]["size"][1],
+            -(item[1]["fps"] or 0),
+        ),
+    )
+    return mode, report
+
+
+def output_size_for(plate_type=PLATE_TYPE):
+    return tuple(PLATE_OUTPUT_SIZES[plate_type])
+
+
+def still_configuration(
+    crop_fraction=CROP_FRACTION, output_size=None, plate_type=PLATE_TYPE
+):
+    """
+    Liefert make_config(picam) für CameraService.reconfigure: Stillbild-
+    Konfiguration mit passendem Sensormodus (raw) und Hauptstream in der
+    Zielgröße.
+    """
+    output_size = tuple(output_size or output_size_for(plate_type))
+
+    def make_config(picam):
+        mode, _ = select_mode(
+            picam.sensor_modes, picam.sensor_resolution, crop_fraction, output_size
+        )
+        return picam.create_still_configuration(
+            main={"size": output_size},
+            raw={"size": tuple(mode["size"]), "format": mode["unpacked"]},
+        )
+
+    return make_config
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sensormodi für Ausschnitt und Zielauflösung bewerten"
+    )
+    parser.add_argument(
+        "--plate", default=PLATE_TYPE, choices=sorted(PLATE_OUTPUT_SIZES)
+    )
+    parser.add_argument("--crop", type=float, default=CROP_FRACTION)
+    parser.add_argument(
+        "--camera", action="store_true", help="Modi der angeschlossenen Kamera lesen"
+    )
+    args = parser.parse_args()
+
+    if args.camera:
+        from picamera2 import Picamera2
+
+        picam = Picamera2()
+        modes, resolution = picam.sensor_modes, picam.sensor_resolution
+        picam.close()
+    else:
+        modes, resolution = IMX477_MODES, IMX477_RESOLUTION
+
+    output_size = output_size_for(args.plate)
+    mode, report = select_mode(modes, resolution, args.crop, output_size)
+    print(
+        f"Platte {args.plate}: Ausschnitt {args.crop:.0%}, "
+        f"Ausgabe {output_size[0]}x{output_size[1]}"
+    )
+    print("Modus        Bit  fps     Auslesen  Ausschnitt   Datei     ausreichend")
+    for rating in report:
+        marker = "*" if tuple(rating["size"]) == tuple(mode["size"]) else " "
+        width, height = rating["size"]
+        roi_width, roi_height = rating["roi_pixels"]
+        print(
+            f"{marker}{width:>5}x{height:<6} {rating['bit_depth'] or '-':>3}  "
+            f"{rating['fps'] or 0:6.1f}  {rating['readout_ms'] or 0:6.1f} ms  "
+            f"{roi_width:>5}x{roi_height:<6} {rating['file_kb']:>5} kB  "
+            f"{'ja' if rating['sufficient'] else 'nein'}"
+        )
+
+    file_kb = next(
+        rating["file_kb"]
+        for rating in report
+        if tuple(rating["size"]) == tuple(mode["size"])
+    )
+    full_kb = round(resolution[0] * resolution[1] * JPEG_BYTES_PER_PIXEL / 1024)
+    print(
+        f"Geschätzte Dateigröße: {file_kb} kB je Well "
+        f"(bisher volle Auflösung: {full_kb} kB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+
+"""
+Überwachung und Wiederherstellung der seriellen Verbindung zum Arduino.
+
+Der Arduino wird über seine USB-Kennung (SERIAL_USB_VID/PID/SERIAL) gesucht
+statt über einen festen Gerätepfad, da sich /dev/ttyACM* nach einem
+Wackler am USB-Kabel ändern kann. Bricht die Verbindung während eines Laufs
+ab, öffnet LinkSupervisor den Port mit wachsender Wartezeit neu, fragt den
+Zustand der Firmware ab (STATUS) und setzt den Lauf an der aktuellen
+Station fort:
+
+    Firmware neu gestartet (IDLE)   RESUME_<Cycle>_<Station>_<PauseMs>
+    Rahmen verloren                 MOVE_/CYCLE_COMPLETED nachholen
+    NEXT_MOVE verloren              NEXT_MOVE erneut senden
+    Firmware weitergefahren         Position übernehmen, Lücke im Journal
+
+Abbruch und Wiederherstellung stehen als link_lost/link_restored (mit
+outage_s) im Journal.
+"""
+
+import os
+
+import serial
+from serial.tools import list_ports
+
+from packages.config import (
+    BAUD_RATE,
+    SERIAL_CHECK_INTERVAL_S,
+    SERIAL_HANDSHAKE_TIMEOUT_S,
+    SERIAL_PORT,
+    SERIAL_RECONNECT_BACKOFF_S,
+    SERIAL_RECONNECT_TIMEOUT_S,
+    SERIAL_USB_PID,
+    SERIAL_USB_SERIAL,
+    SERIAL_USB_VID,
+    TOTAL_STATIONS,
+)
+from packages.logger import log_message
+
+
+class SerialLinkError(Exception):
+    pass
+
+
+def find_port(
+    vid=SERIAL_USB_VID,
+    pid=SERIAL_USB_PID,
+    serial_number=SERIAL_USB_SERIAL,
+    fallback=SERIAL_PORT,
+):
+    """Gerätepfad des Arduino anhand der USB-Kennung, sonst fallback."""
+    candidates = sorted(
+        (
+            port
+            for port in list_ports.comports()
+            if port.vid is not None
+            and (vid is None or port.vid == vid)
+            and (pid is None or port.pid == pid)
+            and (serial_number is None or port.serial_number == serial_number)
+        ),
+        key=lambda port: port.device,
+    )
+    if candidates:
+        return candidates[0].device
+    if fallback and os.path.exists(fallback):
+        return fallback
+    return None
+
+
+def usb_serial_number(device):
+    for port in list_ports.comports():
+        if port.device == device:
+            return port.serial_number
+    return None
+
+
+def parse_state(frame):
+    """STATE_<Phase>_<Cycle>_<Station>_<Park> aus der Antwort auf STATUS."""
+    fields = frame.split("_")
+    if len(fields) != 5 or fields[0] != "STATE":
+        raise SerialLinkError(f"Unbekannte Zustandsmeldung: {frame}")
+    try:
+        cycle, station, parked = (int(value) for value in fields[2:])
+    except ValueError:
+        raise SerialLinkError(f"Unbekannte Zustandsmeldung: {frame}")
+    return {"phase": fields[1], "cycle": cycle, "station": station, "parked": parked}
+
+
+class LinkSupervisor:
+    def __init__(self, manager, clock=None):
+        self.manager = manager
+        self.clock = clock if clock is not None else manager.clock
+        self.port = None
+        self.serial_number = SERIAL_USB_SERIAL
+        self.connection = None  # geöffnete Schnittstelle (ohne Transkript)
+        self.lost = False
+        self._checked_at = 0.0
+
+    # =============================================
+    # Verbindung
+    # =============================================
+
+    def open(self):
+        """Sucht den Arduino und öffnet den Port."""
+        port = find_port(serial_number=self.serial_number)
+        if port is None:
+            raise SerialLinkError("Kein Arduino an USB gefunden")
+        self.connection = serial.Serial(port, BAUD_RATE, timeout=0.1)
+        self.port = port
+        # Beim Wiederverbinden dasselbe Board, auch unter neuem Gerätepfad
+        if self.serial_number is None:
+            self.serial_number = usb_serial_number(port)
+        return self.connection
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        except (serial.SerialException, OSError):
+            pass
+        self.connection = None
+
+    def reconnect(self):
+        connection = self.open()
+        # Das Transkript läuft über den Abbruch hinweg in derselben Datei
+        reattach = getattr(self.manager.serial_connection, "reattach", None)
+        if reattach is not None:
+            reattach(connection, port=self.port)
+        else:
+            self.manager.serial_connection = connection
+
+    def check(self):
+        """Löst SerialException aus, wenn die Verbindung verloren ist."""
+        if self.lost:
+            raise serial.SerialException("Schreiben fehlgeschlagen")
+        now = self.clock.monotonic()
+        if now - self._checked_at < SERIAL_CHECK_INTERVAL_S:
+            return
+        self._checked_at = now
+        # Beim Abziehen verschwindet der Gerätepfad, oft bevor read() scheitert
+        if self.port is not None and not os.path.exists(self.port):
+            raise serial.SerialException(f"{self.port} nicht mehr vorhanden")
+
+    # =============================================
+    # Wiederherstellung
+    # =============================================
+
+    def recover(self, reason):
+        """
+        Stellt die Verbindung während eines Laufs wieder her und setzt ihn
+        fort. False, wenn das innerhalb SERIAL_RECONNECT_TIMEOUT_S nicht
+        gelingt oder der Lauf inzwischen beendet wurde.
+        """
+        restored, state = self.restore(reason)
+        if not restored:
+            return False
+        return self.resync(state)
+
+    def restore(self, reason, active=None):
+        """
+        Öffnet die Verbindung mit wachsender Wartezeit neu und fragt den
+        Zustand der Firmware ab. Gibt (True, Zustand) zurück, oder
+        (False, None), wenn das innerhalb SERIAL_RECONNECT_TIMEOUT_S nicht
+        gelingt oder active() False wird (ohne Angabe: Lauf beendet).
+        """
+        manager = self.manager
+
+        def still_active():
+            return manager.polling_active if active is None else active()
+
+        lost_at = self.clock.time()
+        log_message(f"Serielle Verbindung unterbrochen: {reason}", "warning")
+        manager.record_event("link_lost", port=self.port, reason=str(reason))
+        self.close()
+
+        delay, max_delay = SERIAL_RECONNECT_BACKOFF_S
+        attempts = 0
+        while (
+            still_active() and self.clock.time() - lost_at < SERIAL_RECONNECT_TIMEOUT_S
+        ):
+            attempts += 1
+            try:
+                self.reconnect()
+                state = self.handshake()
+            except (serial.SerialException, OSError, SerialLinkError) as e:
+                log_message(f"Wiederverbindung {attempts} fehlgeschlagen: {e}", "debug")
+                self.close()
+                self.clock.sleep(delay)
+                delay = min(delay * 2, max_delay)
+                continue
+
+            outage_s = round(self.clock.time() - lost_at, 1)
+            self.lost = False
+            log_message(
+                f"Serielle Verbindung nach {outage_s} s wiederhergestellt ({self.port}).",
+                "info",
+            )
+            manager.record_event(
+                "link_restored",
+                port=self.port,
+                attempts=attempts,
+                outage_s=outage_s,
+                firmware=state["phase"] if state else None,
+            )
+            return True, state
+
+        outage_s = round(self.clock.time() - lost_at, 1)
+        log_message(
+            f"Serielle Verbindung nach {outage_s} s nicht wiederhergestellt.", "error"
+        )
+        manager.record_event("link_failed", attempts=attempts, outage_s=outage_s)
+        return False, None
+
+    def handshake(self):
+        """
+        Fragt den Zustand der Firmware ab. None, wenn die Firmware gerade
+        pausiert (sie liest dann nicht und antwortet nach der Pause).
+        """
+        manager = self.manager
+        connection = manager.serial_connection
+        deadline = self.clock.monotonic() + SERIAL_HANDSHAKE_TIMEOUT_S
+        next_probe = 0.0
+
+        while self.clock.monotonic() < deadline:
+            # Wiederholen: Nach dem Neustart verwirft der Bootloader Eingaben
+            if self.clock.monotonic() >= next_probe:
+                manager.write_command("STATUS")
+                next_probe = self.clock.monotonic() + 1.0
+            if connection.in_waiting > 0:
+                line = connection.readline().decode("utf-8", errors="ignore").strip()
+                if line.startswith("<STATE_") and line.endswith(">"):
+                    frame = line[1:-1].strip()
+                    manager.record_event("frame_received", frame=frame)
+                    return parse_state(frame)
+            else:
+                self.clock.sleep(0.01)
+
+        if (
+            manager.next_cycle_at is not None
+            and self.clock.time() < manager.next_cycle_at
+        ):
+            return None
+        raise SerialLinkError("Firmware antwortet nicht auf STATUS")
+
+    def target(self):
+        """(Cycle, Station), an der der Lauf aus Sicht des Hosts weitergeht."""
+        manager = self.manager
+        cycle = manager.get_current_cycle_count()
+        station = manager.get_current_move_count()
+        if manager.last_station == (cycle, station):
+            station += 1  # letzte Station aufgenommen, CYCLE_COMPLETED fehlt
+        return cycle, station
+
+    def resync(self, state):
+        """Bringt Host und Firmware nach dem Handshake in Einklang."""
+        manager = self.manager
+        if state is None:
+            return True
+        cycle, station = self.target()
+
+        if state["phase"] == "IDLE":
+            if state["parked"] < 0:
+                log_message(
+                    "Firmware neu gestartet, Tischposition unbekannt – Lauf beendet.",
+                    "error",
+                )
+                manager.record_event("link_failed", reason="position unknown")
+                return False
+            pause_ms = 0
+            if station == 0 and manager.next_cycle_at is not None:
+                pause_ms = max(
+                    0, int((manager.next_cycle_at - self.clock.time()) * 1000)
+                )
+            log_message(
+                f"Firmware neu gestartet, setze Lauf fort: Cycle {cycle + 1}, "
+                f"Station {station + 1}.",
+                "warning",
+            )
+            manager.send_command(f"RESUME_{cycle}_{station}_{pause_ms}")
+            return True
+
+        firmware = (state["cycle"], state["station"])
+        if state["phase"] == "MOVE" and firmware == manager.last_station:
+            # Bild liegt vor, nur die Antwort ging verloren; an der letzten
+            # Station läuft die Firmware ohne NEXT_MOVE weiter
+            if state["station"] + 1 < TOTAL_STATIONS:
+                manager.send_command("NEXT_MOVE")
+            return True
+        if (
+            state["phase"] == "CYCLE"
+            and manager.last_station
+            == (
+                state["cycle"],
+                TOTAL_STATIONS - 1,
+            )
+            and state["cycle"] < manager.get_current_cycle_count()
+        ):
+            # CYCLE_COMPLETED ist verarbeitet, NEXT_CYCLE ging verloren
+            pause_ms = 1
+            if manager.next_cycle_at is not None:
+                pause_ms = max(
+                    1, int((manager.next_cycle_at - self.clock.time()) * 1000)
+                )
+            manager.send_command(f"NEXT_CYCLE_{pause_ms}")
+            return True
+
+        f_cycle, f_station = firmware
+        if state["phase"] == "CYCLE":
+            f_station = TOTAL_STATIONS
+        skipped = (f_cycle - cycle) * TOTAL_STATIONS + f_station - station
+        if skipped > 0:
+            log_message(
+                f"Firmware ist während des Abbruchs {skipped} Station(en) weitergefahren.",
+                "warning",
+            )
+            manager.record_event("stations_skipped", count=skipped)
+        if f_cycle != manager.get_current_cycle_count():
+            manager.CYCLE_COUNT = f_cycle
+            manager.setup_cycle_directory()
+
+        # Verlorenen Rahmen nachholen
+        if state["phase"] == "CYCLE":
+            manager.MOVE_COUNT = TOTAL_STATIONS - 1
+            manager.handle_frame("CYCLE_COMPLETED")
+        else:
+            manager.MOVE_COUNT = f_station
+            manager.handle_frame("MOVE_COMPLETED")
+        return True
@@ -0,0 +1,719 @@
+#!/usr/bin/env python3
+
+"""
+Aufzeichnung und Wiedergabe der seriellen Kommunikation mit dem Arduino.
+
+SerialRecorder legt sich als Proxy um die serielle Verbindung und schreibt
+jedes gesendete und empfangene Byte mit Zeitstempel als JSON-Zeile in ein
+Transkript. replay_transcript() spielt ein solches Transkript über eine
+virtuelle Uhr in den CameraSerialManager ein, sodass auch mehrtägige Läufe
+in Sekunden reproduziert werden können.
+
+Wie das Journal wird das Transkript ab SERIAL_TRANSCRIPT_MAX_BYTES als
+gzip-Segment <Name>.<n>.jsonl.gz abgelegt; es bleiben höchstens
+SERIAL_TRANSCRIPT_KEEP_SEGMENTS Segmente. load_transcript() liest die noch
+vorhandenen Segmente vor der aktiven Datei. Verbindungsabbrüche laufen dabei
+durch den echten LinkSupervisor (Handshake und Abgleich); "Neu verbinden"
+springt zur nächsten aufgezeichneten Wiederverbindung (reattach).
+
+Aufbau einer Transkriptzeile:
+    {"t": 12.345, "dir": "rx", "data": "<MOVE_COMPLETED>\\r\\n"}
+    {"t": 12.551, "dir": "tx", "data": "NEXT_MOVE\\n"}
+    {"t": 13.002, "dir": "error", "data": "device reports readiness ..."}
+    {"t": 13.002, "dir": "event", "event": "run_start", "run_id": ...}
+"t" ist die Zeit in Sekunden seit Beginn der Aufzeichnung, "data" ist
+latin-1-kodiert und damit byte-genau umkehrbar.
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+
+import serial
+
+from packages.config import (SERIAL_TRANSCRIPT_KEEP_SEGMENTS,
+                             SERIAL_TRANSCRIPT_MAX_BYTES, TOTAL_STATIONS)
+from packages.logger import setup_logging
+from packages.serial_link import LinkSupervisor
+
+TRANSCRIPT_VERSION = 1
+# So lange wartet die Wiedergabe auf einen aufgezeichneten Befehl, bevor sie
+# die nächste Antwort trotzdem ausliefert (der Manager weicht dann ab)
+REPLAY_COMMAND_GRACE_S = 2.0
+
+
+def _encode(data):
+    return bytes(data).decode("latin-1")
+
+
+def _decode(text):
+    return text.encode("latin-1")
+
+
+# =============================================
+# Aufzeichnung
+# =============================================
+
+
+class SerialRecorder:
+    """Proxy um eine serielle Verbindung, der alle Bytes protokolliert."""
+
+    def __init__(
+        self,
+        connection,
+        path,
+        port=None,
+        baud_rate=None,
+        clock=time,
+        max_bytes=SERIAL_TRANSCRIPT_MAX_BYTES,
+        keep_segments=SERIAL_TRANSCRIPT_KEEP_SEGMENTS,
+    ):
+        self.connection = connection
+        self.path = path
+        self.clock = clock
+        self.started = clock.time()
+        self.max_bytes = max_bytes
+        self.keep_segments = keep_segments
+        self._header = {
+            "type": "header",
+            "version": TRANSCRIPT_VERSION,
+            "started": self.started,
+            "port": port,
+            "baud_rate": baud_rate,
+        }
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._write_line(self._header)
+
+    def _write_line(self, entry):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                if self.max_bytes and self._file.tell() >= self.max_bytes:
+                    self._rotate()
+
+    def _rotate(self):
+        """Legt die aktive Datei als gzip-Segment ab und beginnt eine neue."""
+        self._file.close()
+        segments = transcript_segments(self.path)
+        number = int(segments[-1].rsplit(".", 3)[-3]) + 1 if segments else 1
+        target = f"{segment_base(self.path)}.{number:03d}.jsonl.gz"
+        with open(self.path, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(target + ".tmp", target)
+
+        segments.append(target)
+        while self.keep_segments and len(segments) > self.keep_segments:
+            try:
+                os.remove(segments.pop(0))
+            except OSError:
+                pass
+
+        # Gleicher Beginn, damit die Zeiten "t" fortlaufend bleiben
+        self._file = open(self.path, "w", encoding="utf-8", buffering=1)
+        self._file.write(json.dumps(self._header, ensure_ascii=False) + "\n")
+
+    def _record(self, direction, data=None, **fields):
+        entry = {"t": round(self.clock.time() - self.started, 6), "dir": direction}
+        if data is not None:
+            entry["data"] = data
+        entry.update(fields)
+        self._write_line(entry)
+
+    def annotate(self, event, **fields):
+        """Vermerkt ein Ereignis des Managers (z. B. Laufstart) im Transkript."""
+        self._record("event", event=event, **fields)
+
+    # Serielle Schnittstelle (nur die vom Manager genutzten Teile)
+    @property
+    def is_open(self):
+        return self.connection.is_open
+
+    @property
+    def in_waiting(self):
+        try:
+            return self.connection.in_waiting
+        except (serial.SerialException, OSError) as e:
+            self._record("error", str(e))
+            raise
+
+    def readline(self):
+        try:
+            data = self.connection.readline()
+        except (serial.SerialException, OSError) as e:
+            self._record("error", str(e))
+            raise
+        if data:
+            self._record("rx", _encode(data))
+        return data
+
+    def read(self, size=1):
+        try:
+            data = self.connection.read(size)
+        except (serial.SerialException, OSError) as e:
+            self._record("error", str(e))
+            raise
+        if data:
+            self._record("rx", _encode(data))
+        return data
+
+    def write(self, data):
+        self._record("tx", _encode(data))
+        try:
+            return self.connection.write(data)
+        except (serial.SerialException, OSError) as e:
+            self._record("error", str(e))
+            raise
+
+    def flush(self):
+        self.connection.flush()
+
+    def reattach(self, connection, port=None):
+        """Setzt die Aufzeichnung nach einem Neuverbinden fort."""
+        self.connection = connection
+        self._record("event", event="reattach", port=port)
+
+    def close(self):
+        self._record("close")
+        try:
+            self.connection.close()
+        finally:
+            with self._lock:
+                self._file.close()
+
+
+def segment_base(path):
+    return path[: -len(".jsonl")] if path.endswith(".jsonl") else path
+
+
+def transcript_segments(path):
+    """Abgelegte Segmente eines Transkripts, älteste zuerst."""
+    return sorted(glob.glob(glob.escape(segment_base(path)) + ".[0-9]*.jsonl.gz"))
+
+
+def load_transcript(path):
+    """
+    Liest ein Transkript (samt abgelegter Segmente, auch .jsonl.gz) und
+    gibt (header, events) zurück.
+    """
+    header = {}
+    events = []
+    paths = [path]
+    if not path.endswith(".gz"):
+        paths = transcript_segments(path) + [path]
+    for part in paths:
+        opener = gzip.open if part.endswith(".gz") else open
+        with opener(part, "rt", encoding="utf-8") as f:
+            _read_entries(f, header, events)
+    return header, events
+
+
+def _read_entries(f, header, events):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        if entry.get("type") == "header":
+            # Bei mehreren Aufzeichnungen oder Segmenten gilt der erste Header
+            if not header:
+                header.update(entry)
+            continue
+        events.append(entry)
+
+
+# =============================================
+# Wiedergabe
+# =============================================
+
+
+class VirtualClock:
+    """Uhr, die nur vorrückt, wenn jemand schläft oder auf Daten wartet."""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def advance_to(self, timestamp):
+        if timestamp > self.now:
+            self.now = timestamp
+
+
+class ReplaySerial:
+    """
+    Serielles Gegenstück zum SerialRecorder: liefert aufgezeichnete Bytes zu
+    ihrem (virtuellen) Zeitpunkt aus und sammelt die gesendeten Befehle.
+    """
+
+    def __init__(self, events, clock, started=0.0):
+        self.clock = clock
+        self.started = started
+        self.is_open = True
+        self.sent = []
+        self.expected = [_decode(e["data"]) for e in events if e.get("dir") == "tx"]
+        self.annotations = [e for e in events if e.get("dir") == "event"]
+        self._tx_times = [e["t"] for e in events if e.get("dir") == "tx"]
+        # Je Ereignis die Zahl der zuvor aufgezeichneten Befehle
+        self._events = deque()
+        commands = 0
+        for event in events:
+            if event.get("dir") == "tx":
+                commands += 1
+            elif event.get("dir") in ("rx", "error", "close") or _is_reattach(event):
+                self._events.append((event, commands))
+        self._buffer = deque()
+
+    def _waiting_for_command(self):
+        """
+        True, solange vor dem nächsten Ereignis noch ein aufgezeichneter
+        Befehl aussteht (z. B. ein wiederholtes STATUS im Handshake); die
+        Uhr rückt dabei bis zu diesem Befehl vor.
+        """
+        needed = self._events[0][1]
+        if len(self.sent) >= needed:
+            return False
+        due = self.started + self._tx_times[needed - 1] + REPLAY_COMMAND_GRACE_S
+        if self.clock.time() >= due:
+            return False
+        self.clock.advance_to(self.started + self._tx_times[len(self.sent)])
+        self.clock.sleep(0.01)
+        return True
+
+    def _next_event(self):
+        event = self._events[0][0]
+        self.clock.advance_to(self.started + event["t"])
+        if _is_reattach(event):
+            # Bleibt liegen, bis der LinkSupervisor neu verbindet
+            raise serial.SerialException("Verbindung wurde neu aufgebaut")
+        self._events.popleft()
+        direction = event["dir"]
+        if direction == "rx":
+            self._buffer.append(_decode(event["data"]))
+        elif direction == "error":
+            raise serial.SerialException(event.get("data", "Aufgezeichneter Fehler"))
+        elif direction == "close":
+            self.is_open = False
+
+    @property
+    def in_waiting(self):
+        if not self._buffer:
+            if not self._events:
+                # Transkript erschöpft: Verbindung gilt als geschlossen
+                self.is_open = False
+                return 0
+            if self._waiting_for_command():
+                return 0
+            self._next_event()
+        return sum(len(chunk) for chunk in self._buffer)
+
+    def reattach_pending(self):
+        return any(_is_reattach(event) for event, _ in self._events)
+
+    def skip_to_reattach(self):
+        """Springt zur nächsten aufgezeichneten Wiederverbindung."""
+        while self._events:
+            event, _ = self._events.popleft()
+            self.clock.advance_to(self.started + event["t"])
+            if _is_reattach(event):
+                self._buffer.clear()
+                self.is_open = True
+                return
+        raise serial.SerialException("Keine Wiederverbindung aufgezeichnet")
+
+    def readline(self):
+        if not self._buffer:
+            return b""
+        return self._buffer.popleft()
+
+    def read(self, size=1):
+        return self.readline()[:size]
+
+    def write(self, data):
+        self.sent.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def divergences(self, limit=20):
+        """Vergleicht gesendete mit aufgezeichneten Befehlen (nur Reihenfolge)."""
+        found = []
+        for index in range(max(len(self.sent), len(self.expected))):
+            sent = self.sent[index] if index < len(self.sent) else None
+            expected = self.expected[index] if index < len(self.expected) else None
+            if sent != expected:
+                found.append(
+                    {
+                        "index": index,
+                        "sent": sent.decode("latin-1").strip() if sent else None,
+                        "expected": (
+                            expected.decode("latin-1").strip() if expected else None
+                        ),
+                    }
+                )
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def _is_reattach(event):
+    return event.get("dir") == "event" and event.get("event") == "reattach"
+
+
+class ReplayLink(LinkSupervisor):
+    """
+    LinkSupervisor für die Wiedergabe: statt einen Port zu suchen, springt
+    reconnect() im Transkript zur nächsten Wiederverbindung. Handshake und
+    Abgleich (resync) sind die des echten Laufs.
+    """
+
+    def open(self):
+        return self.manager.serial_connection
+
+    def close(self):
+        pass
+
+    def reconnect(self):
+        self.manager.serial_connection.skip_to_reattach()
+
+    def restore(self, reason, active=None):
+        if not self.manager.serial_connection.reattach_pending():
+            # Ohne weitere Wiederverbindung im Transkript sofort aufgeben
+            def active():
+                return False
+
+        return super().restore(reason, active=active)
+
+
+class NullCamera:
+    """Kamera-Ersatz für die Wiedergabe: nimmt nichts auf, zählt nur mit."""
+
+    started = True
+    sensor_resolution = (4056, 3040)
+
+    def __init__(self):
+        self.captures = []
+
+    def set_controls(self, controls):
+        pass
+
+    def capture_file(self, filepath):
+        self.captures.append(filepath)
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class RecordedCadence:
+    """
+    Taktsteuerung für die Wiedergabe: liefert die aufgezeichneten Pausen
+    (Anmerkung "cadence", ältere Transkripte: NEXT_CYCLE_<ms>) statt sie
+    aus den Bildern neu zu berechnen.
+    """
+
+    def __init__(self, events, pause_s):
+        self.pause_s = pause_s
+        self.by_cycle = {
+            e["cycle"]: e["pause_ms"]
+            for e in events
+            if e.get("dir") == "event" and e.get("event") == "cadence"
+        }
+        self.sequence = deque()
+        if not self.by_cycle:
+            # Nur Antworten auf CYCLE_COMPLETED, nicht die Wiederholung eines
+            # verlorenen NEXT_CYCLE nach dem Abgleich (auch bei fester Pause)
+            last_frame = None
+            for e in events:
+                if e.get("dir") == "rx":
+                    last_frame = _decode(e["data"]).strip()
+                if e.get("dir") != "tx":
+                    continue
+                command = _decode(e["data"]).decode("utf-8", errors="ignore").strip()
+                if (
+                    command.startswith("NEXT_CYCLE_")
+                    and last_frame == b"<CYCLE_COMPLETED>"
+                ):
+                    self.sequence.append(int(command[len("NEXT_CYCLE_") :]))
+
+    @classmethod
+    def from_events(cls, events, pause_s):
+        """None, wenn der Lauf ohne adaptive Taktsteuerung aufgezeichnet wurde."""
+        cadence = cls(events, pause_s)
+        return cadence if cadence.by_cycle or cadence.sequence else None
+
+    def add(self, well, path):
+        pass
+
+    def next_pause(self, cycle):
+        pause_ms = self.by_cycle.get(cycle)
+        if pause_ms is None and self.sequence:
+            pause_ms = self.sequence.popleft()
+        if pause_ms is None:
+            return self.pause_s
+        # +0,5 ms, damit int(pause_s * 1000) im Manager wieder pause_ms ergibt
+        return (pause_ms + 0.5) / 1000
+
+
+class ReplaySettings:
+    """Stellt get_repeats/get_pause_minutes bereit, wie sonst die GUI."""
+
+    def __init__(self, repeats, pause_minutes):
+        self.repeats = repeats
+        self.pause_minutes = pause_minutes
+
+    def get_repeats(self):
+        return self.repeats
+
+    def get_pause_minutes(self):
+        return self.pause_minutes
+
+
+def replay_transcript(path, repeats=None, pause_minutes=None, quiet=True):
+    """
+    Spielt ein Transkript deterministisch in einen CameraSerialManager ein.
+
+    Der Manager läuft synchron im aufrufenden Thread mit virtueller Uhr,
+    Kamera-Ersatz und temporärem Bildverzeichnis. Zurückgegeben wird ein
+    Bericht mit Endzustand, Laufzeiten und Abweichungen der gesendeten
+    Befehle gegenüber der Aufzeichnung.
+    """
+    # Import hier, da camera_serial_manager seinerseits dieses Modul importiert
+    from packages.camera_serial_manager import CameraSerialManager
+    from packages.journal import EventJournal, aggregate, iter_events
+
+    header, events = load_transcript(path)
+    run_start = next(
+        (
+            e
+            for e in events
+            if e.get("dir") == "event" and e.get("event") == "run_start"
+        ),
+        {},
+    )
+    if repeats is None:
+        repeats = run_start.get("repeats", 2)
+    if pause_minutes is None:
+        pause_minutes = run_start.get("pause_minutes", 1)
+
+    started = header.get("started", 0.0)
+    clock = VirtualClock(started)
+    link = ReplaySerial(events, clock, started=started)
+    camera = NullCamera()
+
+    logger = setup_logging()
+    previous_level = logger.level
+    if quiet:
+        logger.setLevel(logging.WARNING)
+
+    wall_start = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory(prefix="paparazzo_replay_") as tmp:
+            manager = CameraSerialManager(
+                gui=ReplaySettings(repeats, pause_minutes),
+                serial_connection=link,
+                picam=camera,
+                clock=clock,
+                journal=EventJournal(os.path.join(tmp, "journal"), clock=clock),
+            )
+            manager.images_dir = tmp
+            manager.link = ReplayLink(manager)
+
+            # Entspricht Paparazzo.on_start_program ohne Kompilieren/Hochladen
+            manager.reset_cycle_count()
+            manager.reset_move_count()
+            manager.setup_run_directory()
+            # Der Kamera-Ersatz schreibt keine Bilder, daher keine Auswertung,
+            # kein Kodieren und kein Nachführen des Zeitmodells; die adaptive
+            # Taktsteuerung übernimmt die aufgezeichneten Pausen
+            manager.registrar = None
+            manager.cube_writer = None
+            manager.cadence = RecordedCadence.from_events(events, pause_minutes * 60)
+            manager.eta = None
+            if manager.encoder is not None:
+                manager.encoder.shutdown()
+                manager.encoder = None
+            manager.setup_cycle_directory()
+            manager.send_command("START")
+            manager.poll_arduino()
+            manager.camera.shutdown()
+            manager.journal.close()
+            journal_counts = {
+                row["event"]: row["count"]
+                for row in aggregate(iter_events(manager.journal.directory))
+            }
+    finally:
+        logger.setLevel(previous_level)
+    wall_duration = time.perf_counter() - wall_start
+
+    return {
+        "transcript": path,
+        "repeats": repeats,
+        "pause_minutes": pause_minutes,
+        "virtual_duration_s": round(clock.time() - started, 3),
+        "wall_duration_s": round(wall_duration, 3),
+        "cycles_completed": manager.get_current_cycle_count(),
+        "move_count": manager.get_current_move_count(),
+        "captures": len(camera.captures),
+        "commands_sent": len(link.sent),
+        "commands_expected": len(link.expected),
+        "unconsumed_events": len(link._events),
+        "journal_events": journal_counts,
+        "divergences": link.divergences(),
+    }
+
+
+# =============================================
+# Synthetische Transkripte
+# =============================================
+
+
+def synthesize_transcript(
+    path,
+    repeats,
+    pause_ms,
+    stations=TOTAL_STATIONS,
+    columns=6,
+    move_s=1.5,
+    row_s=0.8,
+    home_s=4.0,
+    response_s=0.3,
+    cadence_ms=None,
+):
+    """
+    Erzeugt ein Transkript, wie es die Firmware bei störungsfreiem Lauf
+    liefern würde, z. B. als Ausgangspunkt für Langzeit-Wiedergaben.
+    cadence_ms: Pausen je Cycle wie von der adaptiven Taktsteuerung
+    (NEXT_CYCLE_<ms>), sonst immer pause_ms.
+    """
+    t = 0.0
+    lines = [
+        {
+            "type": "header",
+            "version": TRANSCRIPT_VERSION,
+            "started": time.time(),
+            "port": "synthetic",
+            "baud_rate": None,
+        },
+        {
+            "t": t,
+            "dir": "event",
+            "event": "run_start",
+            "run_id": "synthetic",
+            "repeats": repeats,
+            "pause_minutes": pause_ms / 60000,
+        },
+        {"t": t, "dir": "tx", "data": "START\n"},
+    ]
+
+    def rx(text):
+        data = _encode((text + "\r\n").encode("utf-8"))
+        lines.append({"t": round(t, 6), "dir": "rx", "data": data})
+
+    def tx(text):
+        data = _encode((text + "\n").encode("utf-8"))
+        lines.append({"t": round(t, 6), "dir": "tx", "data": data})
+
+    t += response_s
+    rx("✅ Command 'START' received.")
+    for run in range(repeats):
+        for station in range(stations):
+            row, column = divmod(station, columns)
+            t += move_s
+            rx(f"Moving to column: {column}/{row}")
+            rx("<MOVE_COMPLETED>")
+            t += response_s
+            if station + 1 < stations:
+                tx("NEXT_MOVE")
+                rx("✅ Command NEXT_MOVE received.")
+            if column == columns - 1 and station + 1 < stations:
+                t += row_s
+                rx(f"Moving to row: {row + 1}")
+                rx("<ROW_COMPLETED>")
+        t += home_s
+        rx("🏠 Returning to home position...")
+        rx("<HOME_POSITION>")
+        rx("<CYCLE_COMPLETED>")
+        t += response_s
+        if run + 1 < repeats and cadence_ms is not None:
+            pause = cadence_ms[run]
+            lines.append(
+                {
+                    "t": round(t, 6),
+                    "dir": "event",
+                    "event": "cadence",
+                    "cycle": run,
+                    "pause_ms": pause,
+                }
+            )
+            tx(f"NEXT_CYCLE_{pause}")
+            rx(f"✅ Command 'NEXT_CYCLE' received, pause {pause} ms.")
+            rx(f"✅ Cycle {run + 1} finished. Pausing for {pause} ms.")
+            t += pause / 1000
+        elif run + 1 < repeats:
+            tx("NEXT_CYCLE")
+            rx("✅ Command 'NEXT_CYCLE' received.")
+            rx(f"✅ Cycle {run + 1} finished. Pausing for {pause_ms} ms.")
+            t += pause_ms / 1000
+        else:
+            tx("END")
+
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in lines:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serielle Transkripte wiedergeben")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay = sub.add_parser("replay", help="Transkript wiedergeben")
+    replay.add_argument("transcript")
+    replay.add_argument("--repeats", type=int)
+    replay.add_argument("--pause-minutes", type=int)
+    replay.add_argument("--verbose", action="store_true")
+
+    synth = sub.add_parser("synthesize", help="Synthetisches Transkript erzeugen")
+    synth.add_argument("transcript")
+    synth.add_argument("--repeats", type=int, default=2000)
+    synth.add_argument("--pause-ms", type=int, default=300000)
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        report = replay_transcript(
+            args.transcript,
+            repeats=args.repeats,
+            pause_minutes=args.pause_minutes,
+            quiet=not args.verbose,
+        )
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        synthesize_transcript(args.transcript, args.repeats, args.pause_ms)
+        print(f"Transkript geschrieben: {os.path.abspath(args.transcript)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+
+"""
+Optionaler Status-Server zur Fernüberwachung eines Laufs.
+
+Läuft in einem eigenen Thread mit eigener asyncio-Event-Loop im
+GUI-Prozess und liest den Zustand des CameraSerialManager nur lesend aus.
+Polling- und Aufnahme-Thread werden nie blockiert: Log-Zeilen werden per
+call_soon_threadsafe übergeben und in begrenzten Warteschlangen je Client
+gepuffert (bei Überlauf fallen die ältesten Zeilen weg).
+
+Endpunkte:
+    GET  /                    Übersichtsseite
+    GET  /api/state           Laufzustand als JSON
+    GET  /thumbnails/<Well>   Vorschaubild der letzten Aufnahme eines Wells
+    GET  /ws                  WebSocket: Zustand (1/s) und Log-Zeilen
+    POST /api/abort           Lauf abbrechen, nur mit Header X-Paparazzo-Token
+
+Ohne externe Abhängigkeiten (HTTP und WebSocket mit asyncio-Streams).
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from packages.config import (STATUS_SERVER_CLIENT_RATE, STATUS_SERVER_HOST,
+                             STATUS_SERVER_PORT, STATUS_SERVER_TOKEN,
+                             TOTAL_STATIONS)
+from packages.logger import log_message, setup_logging
+from packages.run_data import WELLS
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_HEADER_BYTES = 16384
+CLIENT_QUEUE_SIZE = 500
+RECENT_LOG_LINES = 200
+RECENT_ERRORS = 20
+THUMBNAIL_SIZE = (320, 240)
+LOG_FORMAT = "[%(asctime)s] %(levelname)s: %(message)s"
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="de"><head><meta charset="utf-8"><title>Paparazzo</title>
+<style>
+body{font-family:sans-serif;margin:1em}#log{height:20em;overflow:auto;
+background:#111;color:#ddd;font-size:12px;white-space:pre-wrap;padding:.5em}
+#wells img{width:160px;margin:2px}#wells figure{display:inline-block;margin:2px}
+</style></head><body>
+<h1>Paparazzo</h1><pre id="state">Verbinde...</pre>
+<div id="wells"></div><div id="log"></div>
+<script>
+const log=document.getElementById("log"),state=document.getElementById("state");
+const wells=document.getElementById("wells");let seen={};
+const ws=new WebSocket((location.protocol==="https:"?"wss://":"ws://")+location.host+"/ws");
+ws.onmessage=e=>{const m=JSON.parse(e.data);
+ if(m.type==="log"){log.textContent+=m.line+"\\n";log.scrollTop=log.scrollHeight;}
+ if(m.type==="state"){state.textContent=JSON.stringify(m.state,null,2);
+  for(const [w,t] of Object.entries(m.state.latest_images||{})){
+   if(seen[w]!==t){seen[w]=t;let f=document.getElementById("w"+w);
+    if(!f){f=document.createElement("figure");f.id="w"+w;
+     f.innerHTML="<img><figcaption>"+w+"</figcaption>";wells.appendChild(f);}
+    f.querySelector("img").src="/thumbnails/"+w+"?t="+t;}}}};
+ws.onclose=()=>{state.textContent+="\\n(Verbindung getrennt)";};
+</script></body></html>
+"""
+
+HTTP_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class TokenBucket:
+    """Begrenzt die Senderate eines Clients auf rate Bytes/s."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def consume(self, amount):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # Große Pakete dürfen den Eimer ins Minus ziehen, werden aber
+            # durch die Wartezeit beim nächsten Paket ausgeglichen
+            if self.tokens >= min(amount, self.capacity):
+                self.tokens -= amount
+                return
+            await asyncio.sleep((min(amount, self.capacity) - self.tokens) / self.rate)
+
+
+class StatusLogHandler(logging.Handler):
+    """Reicht Log-Zeilen an den Status-Server weiter, ohne zu blockieren."""
+
+    def __init__(self, server):
+        super().__init__(level=logging.INFO)
+        self.server = server
+        self.recent = deque(maxlen=RECENT_LOG_LINES)
+        self.errors = deque(maxlen=RECENT_ERRORS)
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            return
+        self.recent.append(line)
+        if record.levelno >= logging.ERROR:
+            self.errors.append({"time": record.created, "message": record.getMessage()})
+        self.server.publish_log(line)
+
+
+class WebSocketClient:
+    def __init__(self, reader, writer, rate):
+        self.reader = reader
+        self.writer = writer
+        self.bucket = TokenBucket(rate)
+        self.queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.closed = False
+
+    def offer(self, message):
+        """Nimmt eine Nachricht an; bei vollem Puffer fällt die älteste weg."""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+    async def send_text(self, text):
+        payload = text.encode("utf-8")
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x81, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x81, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x81, 127, length)
+        await self.bucket.consume(len(header) + length)
+        self.writer.write(header + payload)
+        await self.writer.drain()
+
+    async def send_control(self, opcode, payload=b""):
+        self.writer.write(struct.pack("!BB", 0x80 | opcode, len(payload)) + payload)
+        await self.writer.drain()
+
+    async def read_frames(self):
+        """Liest Client-Frames; beantwortet Ping, endet bei Close/Abbruch."""
+        try:
+            while True:
+                first, second = await self.reader.readexactly(2)
+                opcode = first & 0x0F
+                length = second & 0x7F
+                if length == 126:
+                    (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+                elif length == 127:
+                    (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+                if length > MAX_HEADER_BYTES:
+                    break
+                mask = await self.reader.readexactly(4) if second & 0x80 else b""
+                payload = await self.reader.readexactly(length)
+                if mask:
+                    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+                if opcode == 0x8:
+                    await self.send_control(0x8)
+                    break
+                if opcode == 0x9:
+                    await self.send_control(0xA, payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.closed = True
+
+
+class StatusServer:
+    def __init__(
+        self,
+        manager,
+        host=STATUS_SERVER_HOST,
+        port=STATUS_SERVER_PORT,
+        token=STATUS_SERVER_TOKEN,
+        client_rate=STATUS_SERVER_CLIENT_RATE,
+    ):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.token = token
+        self.client_rate = client_rate
+        self.loop = None
+        self.thread = None
+        self.clients = set()
+        self.log_handler = StatusLogHandler(self)
+        self._server = None
+        self._stopped = None
+        self._ready = threading.Event()
+        self._thumbnail_cache = {}
+
+    # =============================================
+    # Lebenszyklus (vom GUI-Thread aufgerufen)
+    # =============================================
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        logger = setup_logging()
+        formatter = next(
+            (handler.formatter for handler in logger.handlers if handler.formatter),
+            None,
+        )
+        self.log_handler.setFormatter(formatter or logging.Formatter(LOG_FORMAT))
+        logger.addHandler(self.log_handler)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self):
+        setup_logging().removeHandler(self.log_handler)
+        if self.loop is not None and self._stopped is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except OSError as e:
+            log_message(f"Status-Server konnte nicht starten: {e}", "error")
+        finally:
+            self._ready.set()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        log_message(f"Status-Server läuft auf http://{self.host}:{self.port}/")
+        self._ready.set()
+
+        state_task = asyncio.create_task(self._broadcast_state())
+        async with self._server:
+            await self._stopped.wait()
+        state_task.cancel()
+        # WebSocket-Handler über ein None in der Warteschlange beenden
+        for client in list(self.clients):
+            client.closed = True
+            client.offer(None)
+        await asyncio.sleep(0.1)
+        for client in list(self.clients):
+            client.writer.close()
+
+    # =============================================
+    # Zustand und Log (threadsicher)
+    # =============================================
+
+    def publish_log(self, line):
+        """Wird aus beliebigen Threads aufgerufen und blockiert nie."""
+        loop = self.loop
+        if loop is None or not self.clients:
+            return
+        try:
+            loop.call_soon_threadsafe(
+                self._offer_all, json.dumps({"type": "log", "line": line})
+            )
+        except RuntimeError:
+            pass  # Loop bereits beendet
+
+    def _offer_all(self, message):
+        for client in self.clients:
+            client.offer(message)
+
+    def snapshot(self):
+        manager = self.manager
+        latest = dict(getattr(manager, "latest_images", {}))
+        latest_mtimes = {}
+        for well, path in latest.items():
+            try:
+                latest_mtimes[well] = int(os.path.getmtime(path))
+            except OSError:
+                continue
+        eta = getattr(manager, "eta", None)
+        eta_remaining_s = None
+        if eta is not None and manager.polling_active:
+            eta_remaining_s = round(eta.remaining_s())
+        return {
+            "time": time.time(),
+            "run_id": getattr(manager, "run_id", None),
+            "polling_active": bool(manager.polling_active),
+            "cycle": manager.get_current_cycle_count(),
+            "move": manager.get_current_move_count(),
+            "stations": TOTAL_STATIONS,
+            # Nicht get_repeats(): das liest Tk-Variablen aus fremdem Thread
+            "repeats": getattr(manager, "run_repeats", None),
+            "pause_minutes": getattr(manager, "run_pause_minutes", None),
+            "next_cycle_at": getattr(manager, "next_cycle_at", None),
+            "eta_remaining_s": eta_remaining_s,
+            "eta_at": (
+                None if eta_remaining_s is None else time.time() + eta_remaining_s
+            ),
+            "last_errors": list(self.log_handler.errors),
+            "latest_images": latest_mtimes,
+        }
+
+    async def _broadcast_state(self):
+        while True:
+            if self.clients:
+                try:
+                    message = json.dumps({"type": "state", "state": self.snapshot()})
+                    self._offer_all(message)
+                except Exception as e:
+                    log_message(f"Status-Server: Zustand nicht lesbar: {e}", "debug")
+            await asyncio.sleep(1)
+
+    # =============================================
+    # HTTP
+    # =============================================
+
+    async def _handle_connection(self, reader, writer):
+        bucket = TokenBucket(self.client_rate)
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if len(head) > MAX_HEADER_BYTES:
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            path = target.split("?", 1)[0]
+
+            length = int(headers.get("content-length", 0) or 0)
+            if 0 < length <= MAX_HEADER_BYTES:
+                await reader.readexactly(length)
+
+            if path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._handle_websocket(reader, writer, headers)
+                return
+
+            try:
+                status, content_type, body = await self._route(method, path, headers)
+            except Exception as e:
+                log_message(f"Status-Server: Fehler bei {method} {path}: {e}", "error")
+                status, content_type, body = 500, "text/plain", b"interner Fehler"
+            await self._respond(writer, bucket, status, content_type, body)
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            ConnectionError,
+            ValueError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, bucket, status, content_type, body):
+        head = (
+            f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-store\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1")
+        data = head + body
+        # In Blöcken senden, damit die Ratenbegrenzung greift
+        for offset in range(0, len(data), 16384):
+            chunk = data[offset : offset + 16384]
+            await bucket.consume(len(chunk))
+            writer.write(chunk)
+            await writer.drain()
+
+    async def _route(self, method, path, headers):
+        if path == "/" and method == "GET":
+            return 200, "text/html; charset=utf-8", INDEX_HTML.encode("utf-8")
+
+        if path == "/api/state" and method == "GET":
+            body = json.dumps(self.snapshot()).encode("utf-8")
+            return 200, "application/json", body
+
+        if path.startswith("/thumbnails/") and method == "GET":
+            well = path[len("/thumbnails/") :]
+            if well not in WELLS:
+                return 404, "text/plain", b"unbekanntes Well"
+            try:
+                thumbnail = await self.loop.run_in_executor(None, self._thumbnail, well)
+            except FileNotFoundError:
+                thumbnail = None  # inzwischen gelöscht oder verschoben
+            except OSError as e:
+                # Auch PIL.UnidentifiedImageError, z. B. halb geschriebene Dateien
+                log_message(f"Status-Server: Bild {well} nicht lesbar: {e}", "warning")
+                return 500, "text/plain", b"Bild nicht lesbar"
+            if thumbnail is None:
+                return 404, "text/plain", b"kein Bild"
+            return 200, "image/jpeg", thumbnail
+
+        if path == "/api/abort":
+            if method != "POST":
+                return 405, "text/plain", b"POST erforderlich"
+            if not self.token:
+                return 403, "text/plain", b"Abbruch per Fernzugriff deaktiviert"
+            given = headers.get("x-paparazzo-token", "")
+            if not hmac.compare_digest(given.encode(), self.token.encode()):
+                log_message(
+                    "Status-Server: Abbruch mit falschem Token abgelehnt.", "warning"
+                )
+                return 403, "text/plain", b"falsches Token"
+            await self.loop.run_in_executor(None, self._abort)
+            return 200, "application/json", b'{"aborted": true}'
+
+        return 404, "text/plain", b"nicht gefunden"
+
+    def _abort(self):
+        log_message("Abbruch über Status-Server angefordert.", "warning")
+        self.manager.abort_run()
+
+    def _thumbnail(self, well):
+        """Erzeugt (oder liefert aus dem Cache) ein Vorschaubild; im Executor."""
+        from packages.encoders import open_image
+
+        path = getattr(self.manager, "latest_images", {}).get(well)
+        if path is None:
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._thumbnail_cache.get(well)
+        if cached and cached[0] == (path, mtime):
+            return cached[1]
+
+        with open_image(path) as img:
+            img.draft("RGB", THUMBNAIL_SIZE)
+            img = img.convert("RGB")
+            img.thumbnail(THUMBNAIL_SIZE)
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=70)
+        data = buffer.getvalue()
+        self._thumbnail_cache[well] = ((path, mtime), data)
+        return data
+
+    # =============================================
+    # WebSocket
+    # =============================================
+
+    async def _handle_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await self._respond(
+                writer, TokenBucket(self.client_rate), 400, "text/plain", b""
+            )
+            return
+        accept = base64.b64encode(
+            hashlib.sha1((key + WEBSOCKET_GUID).encode("latin-1")).digest()
+        ).decode("latin-1")
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode("latin-1")
+        )
+        await writer.drain()
+
+        client = WebSocketClient(reader, writer, self.client_rate)
+        for line in list(self.log_handler.recent):
+            client.offer(json.dumps({"type": "log", "line": line}))
+        client.offer(json.dumps({"type": "state", "state": self.snapshot()}))
+        self.clients.add(client)
+
+        reader_task = asyncio.create_task(client.read_frames())
+        try:
+            while not client.closed:
+                try:
+                    message = await asyncio.wait_for(client.queue.get(), timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+                if message is None:
+                    break
+                await client.send_text(message)
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            reader_task.cancel()
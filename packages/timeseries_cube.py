@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+"""
+Zeitreihen-Würfel je Lauf: alle Well-Bilder in Analyseauflösung als ein
+einziges, per numpy.memmap lesbares Array der Form (cycle, well, H, W, C).
+
+Ablage unter run_*/cube/:
+    cube.json       Metadaten (Form, dtype, Wells, Anzahl Cycles)
+    frames.u8       Rohdaten, C-Reihenfolge, ein Cycle = ein zusammenhängender Block
+    timestamps.f8   Aufnahmezeitpunkte (Unix-Zeit) der Form (cycle, well), NaN = fehlt
+
+Der Würfel wächst cycle-weise am Dateiende, bestehende Daten werden nie
+verschoben. "Well C4 über alle Cycles" ist damit ein Slice ohne Kopie:
+
+    frames, timestamps, meta = open_cube(run_dir)
+    series = frames[:, well_index("C4")]
+
+Im Lauf nur mit CUBE_ENABLED; für bereits aufgenommene Läufe baut
+convert_run() (python -m packages.timeseries_cube convert) den Würfel
+nachträglich aus den Bildern.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from packages.config import CUBE_CHANNELS, CUBE_SIZE
+from packages.encoders import open_image
+from packages.logger import log_message
+from packages.run_data import WELLS, iter_run_images, well_index
+
+CUBE_DIR = "cube"
+META_FILE = "cube.json"
+FRAMES_FILE = "frames.u8"
+TIMESTAMPS_FILE = "timestamps.f8"
+CUBE_VERSION = 1
+
+
+def cube_paths(run_dir):
+    cube_dir = os.path.join(run_dir, CUBE_DIR)
+    return (
+        cube_dir,
+        os.path.join(cube_dir, META_FILE),
+        os.path.join(cube_dir, FRAMES_FILE),
+        os.path.join(cube_dir, TIMESTAMPS_FILE),
+    )
+
+
+def load_analysis_image(path, size=CUBE_SIZE, channels=CUBE_CHANNELS):
+    """Dekodiert ein Bild direkt in Analyseauflösung (H, W, C) als uint8."""
+    width, height = size
+    with open_image(path) as img:
+        img.draft("RGB" if channels == 3 else "L", (width, height))
+        img = img.convert("RGB" if channels == 3 else "L")
+        if img.size != (width, height):
+            img = img.resize((width, height), Image.BILINEAR)
+        array = np.asarray(img, dtype=np.uint8)
+    return array.reshape(height, width, channels)
+
+
+def parse_image_timestamp(timestamp):
+    return time.mktime(time.strptime(timestamp, "%Y%m%d_%H%M%S"))
+
+
+class CubeWriter:
+    """Hängt Well-Bilder fortlaufend an den Würfel eines Laufs an."""
+
+    def __init__(self, run_dir, size=CUBE_SIZE, channels=CUBE_CHANNELS):
+        self.run_dir = run_dir
+        self.cube_dir, self.meta_path, self.frames_path, self.timestamps_path = (
+            cube_paths(run_dir)
+        )
+        self._lock = threading.Lock()
+        os.makedirs(self.cube_dir, exist_ok=True)
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                self.meta = json.load(f)
+            height, width, stored_channels = self.meta["well_shape"]
+            if (width, height) != tuple(size) or stored_channels != channels:
+                log_message(
+                    f"Würfel {self.cube_dir} hat abweichende Auflösung, "
+                    f"verwende vorhandene {width}x{height}x{stored_channels}.",
+                    "warning",
+                )
+        else:
+            width, height = size
+            self.meta = {
+                "version": CUBE_VERSION,
+                "dtype": "uint8",
+                "well_shape": [height, width, channels],
+                "wells": WELLS,
+                "n_cycles": 0,
+            }
+            self._write_meta()
+
+        self.well_shape = tuple(self.meta["well_shape"])
+        self.frame_bytes = int(np.prod(self.well_shape))
+        self.cycle_bytes = self.frame_bytes * len(self.meta["wells"])
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    def _ensure_cycle(self, cycle):
+        """Verlängert beide Dateien bis einschließlich cycle."""
+        n_cycles = self.meta["n_cycles"]
+        if cycle < n_cycles:
+            return
+
+        new_cycles = cycle + 1
+        with open(self.frames_path, "ab") as f:
+            # Dünn besetzte Datei: neue Blöcke belegen erst beim Schreiben Platz
+            f.truncate(new_cycles * self.cycle_bytes)
+        missing = np.full(
+            (new_cycles - n_cycles, len(self.meta["wells"])), np.nan, dtype="<f8"
+        )
+        with open(self.timestamps_path, "ab") as f:
+            f.write(missing.tobytes())
+
+        self.meta["n_cycles"] = new_cycles
+        self._write_meta()
+
+    def add(self, cycle, well, image, timestamp):
+        """
+        Schreibt ein Bild (Pfad oder Array in Analyseauflösung) in den Slot
+        (cycle, well). Ein bereits belegter Slot wird überschrieben.
+        """
+        if isinstance(image, (str, os.PathLike)):
+            height, width, channels = self.well_shape
+            image = load_analysis_image(image, (width, height), channels)
+        frame = np.ascontiguousarray(image, dtype=np.uint8).reshape(self.well_shape)
+        index = self.meta["wells"].index(well)
+
+        with self._lock:
+            self._ensure_cycle(cycle)
+            with open(self.frames_path, "r+b") as f:
+                f.seek(cycle * self.cycle_bytes + index * self.frame_bytes)
+                f.write(frame.tobytes())
+            with open(self.timestamps_path, "r+b") as f:
+                f.seek((cycle * len(self.meta["wells"]) + index) * 8)
+                f.write(np.array([timestamp], dtype="<f8").tobytes())
+
+
+def open_cube(run_dir, mode="r"):
+    """
+    Öffnet den Würfel eines Laufs ohne ihn zu laden.
+
+    Gibt (frames, timestamps, meta) zurück; frames hat die Form
+    (cycle, well, H, W, C), timestamps die Form (cycle, well).
+    """
+    _, meta_path, frames_path, timestamps_path = cube_paths(run_dir)
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+
+    n_cycles = meta["n_cycles"]
+    n_wells = len(meta["wells"])
+    if n_cycles == 0:
+        frames = np.zeros((0, n_wells, *meta["well_shape"]), dtype=np.uint8)
+        timestamps = np.zeros((0, n_wells), dtype="<f8")
+        return frames, timestamps, meta
+
+    frames = np.memmap(
+        frames_path,
+        dtype=np.uint8,
+        mode=mode,
+        shape=(n_cycles, n_wells, *meta["well_shape"]),
+    )
+    timestamps = np.memmap(
+        timestamps_path, dtype="<f8", mode=mode, shape=(n_cycles, n_wells)
+    )
+    return frames, timestamps, meta
+
+
+def well_series(run_dir, well):
+    """Alle Cycles eines Wells als (Bilder, Zeitpunkte), ohne Kopie."""
+    frames, timestamps, _ = open_cube(run_dir)
+    index = well_index(well)
+    return frames[:, index], timestamps[:, index]
+
+
+def convert_run(run_dir, size=CUBE_SIZE, channels=CUBE_CHANNELS):
+    """Überführt einen bestehenden Lauf in den Würfel (nur fehlende Slots)."""
+    writer = CubeWriter(run_dir, size, channels)
+    timestamps = None
+    if writer.meta["n_cycles"] > 0:
+        _, timestamps, _ = open_cube(run_dir)
+
+    added = 0
+    for cycle, well, timestamp, path in iter_run_images(run_dir):
+        if (
+            timestamps is not None
+            and cycle < timestamps.shape[0]
+            and not np.isnan(timestamps[cycle, well_index(well)])
+        ):
+            continue
+        try:
+            writer.add(cycle, well, path, parse_image_timestamp(timestamp))
+            added += 1
+        except (OSError, ValueError) as e:
+            log_message(f"Würfel: {path} übersprungen: {e}", "warning")
+
+    log_message(f"Würfel aktualisiert: {run_dir} ({added} neue Bilder)")
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zeitreihen-Würfel je Lauf")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="Läufe in Würfel überführen")
+    convert.add_argument("run_dirs", nargs="+")
+
+    info = sub.add_parser("info", help="Würfel-Metadaten anzeigen")
+    info.add_argument("run_dir")
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        for run_dir in args.run_dirs:
+            convert_run(run_dir)
+    else:
+        frames, timestamps, meta = open_cube(args.run_dir)
+        print(json.dumps(meta, indent=2))
+        print(
+            f"Form: {frames.shape}, belegte Slots: {int(np.sum(~np.isnan(timestamps)))}"
+        )
+
+
+if __name__ == "__main__":
+    main()
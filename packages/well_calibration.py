@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+
+"""
+Kalibrierung der Well-Positionen (Zentrierung je Well).
+
+Die Firmware berechnet die Positionen aus zwei festen Abständen; ein
+versetzter Plattenhalter oder ein abweichendes Raster zeigt sich als
+schief im Bild liegende Wells. Die Kalibrierung fährt jedes Well an,
+sucht im verkleinerten Vollbild den kreisförmigen Rand (radiales Profil
+des Helligkeitsgradienten) und rechnet den Versatz der Well-Mitte über
+den gemessenen Maßstab (Pixel je Schritt, per Testversatz bestimmt) in
+Schritte je Achse um. Die Korrekturen werden per SET_POS_<Well>_<Spalte>_
+<Reihe> sofort an die Firmware geschickt und in mehreren Durchgängen
+nachgemessen.
+
+Ergebnis je Plattentyp in CALIBRATION_FILE; generate_config_file übernimmt
+die Korrekturen als Positionstabelle in die config.h. Aus dem gemessenen
+Well-Durchmesser ergibt sich ein engerer Bildausschnitt, der mit
+CALIBRATED_CROP statt CROP_FRACTION verwendet wird.
+
+Voraussetzung: frisch hochgeladene Firmware, die noch auf START wartet.
+"""
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from packages.camera_service import PRIORITY_MANUAL
+from packages.config import (CALIBRATION_CROP_MARGIN, CALIBRATION_FILE,
+                             CALIBRATION_FRAME_SIZE, CALIBRATION_ITERATIONS,
+                             CALIBRATION_MIN_CONTRAST, CALIBRATION_PROBE_STEPS,
+                             CALIBRATION_RADIUS_RANGE, CALIBRATION_RIM_SAMPLES,
+                             CALIBRATION_TOLERANCE_PX, CAMERA_TIMEOUT,
+                             EXPERIMENT_MOVE_TIMEOUT, PLATE_TYPE,
+                             POSITIONS_COLUMN, POSITIONS_ROW,
+                             SENSOR_MODE_SELECTION)
+from packages.imaging import prepare_frame
+from packages.logger import log_message
+from packages.run_data import WELLS
+from packages.sensor_modes import still_configuration
+
+
+class CalibrationError(Exception):
+    pass
+
+
+# =============================================
+# Gespeicherte Kalibrierung
+# =============================================
+
+
+def load_calibrations():
+    """Alle gespeicherten Kalibrierungen, Plattentyp -> Eintrag."""
+    try:
+        with open(CALIBRATION_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log_message(f"Kalibrierung nicht lesbar, nutze Standard: {e}", "warning")
+        return {}
+
+
+def load_calibration(plate_type=PLATE_TYPE):
+    return load_calibrations().get(plate_type)
+
+
+def save_calibration(plate_type, calibration):
+    calibrations = load_calibrations()
+    calibrations[plate_type] = calibration
+    os.makedirs(os.path.dirname(CALIBRATION_FILE), exist_ok=True)
+    tmp_path = CALIBRATION_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(calibrations, f, indent=2)
+    os.replace(tmp_path, CALIBRATION_FILE)
+    log_message(f"Kalibrierung gespeichert: {CALIBRATION_FILE} ({plate_type})")
+
+
+def well_offsets(plate_type=PLATE_TYPE):
+    """Korrekturen in Schritten je Well: {well: (spalte, reihe)}."""
+    calibration = load_calibration(plate_type) or {}
+    offsets = {}
+    for well, values in calibration.get("wells", {}).items():
+        if well in WELLS:
+            offsets[well] = (int(values["column"]), int(values["row"]))
+    return offsets
+
+
+def offset_table(plate_type=PLATE_TYPE):
+    """C-Initialisierer [Reihe][Spalte] je Achse für die config.h."""
+    offsets = well_offsets(plate_type)
+    tables = []
+    for axis in (0, 1):
+        rows = (
+            "{"
+            + ", ".join(
+                str(offsets.get(f"{row}{column}", (0, 0))[axis])
+                for column in POSITIONS_COLUMN
+            )
+            + "}"
+            for row in POSITIONS_ROW
+        )
+        tables.append("{" + ", ".join(rows) + "}")
+    return tuple(tables)
+
+
+def calibrated_crop_fraction(plate_type=PLATE_TYPE):
+    """Aus dem Well-Durchmesser bestimmter Ausschnitt oder None."""
+    calibration = load_calibration(plate_type) or {}
+    return calibration.get("crop_fraction")
+
+
+# =============================================
+# Randerkennung
+# =============================================
+
+
+def radial_profile(gy, gx, yy, xx, center, max_radius):
+    """
+    Mittlerer Betrag des radial gerichteten Gradienten je ganzzahligem
+    Radius um center (vektorisiert über np.bincount).
+    """
+    dy = yy - center[0]
+    dx = xx - center[1]
+    radius = np.hypot(dy, dx)
+    radial = np.abs(gy * dy + gx * dx) / np.maximum(radius, 1.0)
+    bins = radius.astype(np.int32).ravel()
+    sums = np.bincount(bins, radial.ravel(), minlength=max_radius + 1)
+    counts = np.bincount(bins, minlength=max_radius + 1)
+    return sums[: max_radius + 1] / np.maximum(counts[: max_radius + 1], 1)
+
+
+def sample(image, y, x):
+    """Bilineare Interpolation von image an den Stellen (y, x)."""
+    height, width = image.shape
+    y = np.clip(y, 0, height - 1.001)
+    x = np.clip(x, 0, width - 1.001)
+    y0 = y.astype(np.int32)
+    x0 = x.astype(np.int32)
+    fy = y - y0
+    fx = x - x0
+    top = image[y0, x0] * (1 - fx) + image[y0, x0 + 1] * fx
+    bottom = image[y0 + 1, x0] * (1 - fx) + image[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def fit_rim(gy, gx, center, radius, angles=CALIBRATION_RIM_SAMPLES, reach=3):
+    """
+    Verfeinert Mitte und Radius unter die Pixelauflösung: sucht entlang
+    Strahlen um center die stärkste radiale Kante (Parabel durch die
+    Nachbarwerte) und passt einen Kreis an die Randpunkte an
+    (algebraisch, kleinste Quadrate). None, wenn zu wenige Strahlen eine
+    Kante innerhalb von ±reach Pixeln treffen.
+    """
+    theta = np.linspace(0, 2 * np.pi, angles, endpoint=False)
+    sin, cos = np.sin(theta), np.cos(theta)
+    steps = np.arange(-reach, reach + 1, dtype=np.float32)[:, None]
+    ys = center[0] + (radius + steps) * sin
+    xs = center[1] + (radius + steps) * cos
+    edge = np.abs(sample(gy, ys, xs) * sin + sample(gx, ys, xs) * cos)
+
+    index = edge.argmax(axis=0)
+    inner = (index > 0) & (index < 2 * reach)
+    if inner.sum() < angles // 2:
+        return None
+    columns = np.nonzero(inner)[0]
+    left, middle, right = (edge[index[inner] + k, columns] for k in (-1, 0, 1))
+    denom = left - 2 * middle + right
+    shift = np.where(denom < 0, 0.5 * (left - right) / np.minimum(denom, -1e-9), 0.0)
+    r = radius + steps[index[inner], 0] + shift
+    y = center[0] + r * sin[inner]
+    x = center[1] + r * cos[inner]
+
+    # (y - a)^2 + (x - b)^2 = R^2  ->  2ay + 2bx + c = y^2 + x^2
+    design = np.column_stack([2 * y, 2 * x, np.ones_like(y)])
+    (a, b, c), *_ = np.linalg.lstsq(design, y**2 + x**2, rcond=None)
+    fitted = math.sqrt(max(c + a * a + b * b, 0.0))
+    if abs(a - center[0]) > reach or abs(b - center[1]) > reach:
+        return None
+    return (float(a), float(b)), fitted
+
+
+def find_well_rim(
+    image, max_size=CALIBRATION_FRAME_SIZE, radius_range=CALIBRATION_RADIUS_RANGE
+):
+    """
+    Sucht Mitte und Radius des Well-Rands. Für Kandidaten-Mittelpunkte
+    (grob, dann immer feiner) wird das radiale Gradientenprofil gebildet;
+    liegt der Mittelpunkt richtig, sammelt sich der Rand in einem Radius
+    und das Profil hat dort die höchste Spitze.
+
+    Gibt {"dy", "dx", "radius", "contrast"} in Pixeln des Originalbilds
+    zurück (Versatz der Well-Mitte zur Bildmitte) oder None, wenn sich
+    kein Rand deutlich genug abhebt.
+    """
+    frame, factor = prepare_frame(image, max_size)
+    gy, gx = np.gradient(frame)
+    height, width = frame.shape
+    yy, xx = np.indices(frame.shape, dtype=np.float32)
+    r_min = max(2, int(radius_range[0] * min(height, width)))
+    r_max = int(radius_range[1] * min(height, width))
+
+    def score(center):
+        band = radial_profile(gy, gx, yy, xx, center, r_max)[r_min:]
+        return float(band.max()), r_min + int(band.argmax()), band
+
+    # Grobe Suche im mittleren Bereich, dann feiner um den besten Kandidaten
+    span = 0.25 * min(height, width)
+    step = span / 6
+    best = ((height - 1) / 2, (width - 1) / 2)
+    offsets = np.arange(-6, 7)
+    while step >= 0.5:
+        candidates = [
+            (best[0] + i * step, best[1] + j * step) for i in offsets for j in offsets
+        ]
+        best = max(candidates, key=lambda center: score(center)[0])
+        step /= 2
+        offsets = np.arange(-2, 3)
+
+    peak, radius, band = score(best)
+    contrast = peak / max(float(np.median(band)), 1e-6)
+    if contrast < CALIBRATION_MIN_CONTRAST:
+        return None
+
+    # Das Raster oben löst nur einen halben Pixel des Suchbilds auf, im
+    # Original also factor / 2 Pixel; die Kreisanpassung geht darunter
+    refined = fit_rim(gy, gx, best, radius + 0.5)
+    if refined is not None:
+        best, radius = refined
+
+    # Koordinaten im verkleinerten Bild -> Originalpixel
+    original_h, original_w = np.asarray(image).shape[:2]
+    return {
+        "dy": float((best[0] + 0.5) * factor - 0.5 - (original_h - 1) / 2),
+        "dx": float((best[1] + 0.5) * factor - 0.5 - (original_w - 1) / 2),
+        "radius": float(radius * factor),
+        "contrast": contrast,
+    }
+
+
+# =============================================
+# Kalibrierlauf
+# =============================================
+
+
+class WellCalibrator:
+    def __init__(self, manager, plate_type=PLATE_TYPE, settle_s=0.5, job=None):
+        self.manager = manager
+        self.plate_type = plate_type
+        self.settle_s = settle_s
+        self.job = job  # optionaler Hintergrund-Job (Abbruch/Fortschritt)
+        self.offsets = {}
+        self.position = (0, 0)
+        self.sensor_resolution = None
+        self.sensor_px = None  # Sensorpixel je Bildpixel der Kalibrieraufnahmen
+
+    # Serielle Kommunikation im Leerlauf der Firmware
+    def send_and_wait(self, command, prefix, timeout):
+        """Sendet einen Befehl und wartet auf den Status <prefix...>."""
+        # Import hier, da camera_serial_manager seinerseits dieses Modul importiert
+        from packages.camera_serial_manager import FirmwareError
+
+        try:
+            return self.manager.send_and_wait(command, prefix, timeout)
+        except FirmwareError as e:
+            raise CalibrationError(str(e)) from e
+
+    def send_offset(self, well):
+        column, row = self.offsets[well]
+        self.send_and_wait(f"SET_POS_{well}_{column}_{row}", f"POS_SET_{well}", 5)
+
+    def locate(self, well):
+        """Fährt well an und sucht den Rand im Vollbild."""
+        from packages.experiments import well_position
+
+        if self.manager.picam is None:
+            raise CalibrationError("Kamera nicht initialisiert!")
+        self.send_and_wait(f"MOVE_{well}", f"POSITION_{well}", EXPERIMENT_MOVE_TIMEOUT)
+        self.position = well_position(well)
+        time.sleep(self.settle_s)  # Nachschwingen abwarten
+
+        image, metadata = self.manager.camera.capture_frame(
+            crop_fraction=1.0, priority=PRIORITY_MANUAL
+        ).result(timeout=CAMERA_TIMEOUT)
+        # Maßstab zum Sensor aus dem tatsächlich ausgelesenen Bereich
+        self.sensor_resolution = tuple(self.manager.picam.sensor_resolution)
+        crop = metadata.get("ScalerCrop") or (0, 0, *self.sensor_resolution)
+        self.sensor_px = crop[2] / np.asarray(image).shape[1]
+        return find_well_rim(image)
+
+    def measure_scale(self, well):
+        """
+        Pixel je Schritt als 2x2-Matrix: Spalte 0 = Verschiebung (dy, dx)
+        der Well-Mitte je Schritt der Spaltenachse, Spalte 1 = Reihenachse.
+        """
+        base = self.offsets[well]
+        centers = []
+        for probe in (
+            (0, 0),
+            (CALIBRATION_PROBE_STEPS, 0),
+            (0, CALIBRATION_PROBE_STEPS),
+        ):
+            self.offsets[well] = (base[0] + probe[0], base[1] + probe[1])
+            self.send_offset(well)
+            rim = self.locate(well)
+            if rim is None:
+                raise CalibrationError(f"Kein Well-Rand in {well} erkannt.")
+            centers.append(np.array([rim["dy"], rim["dx"]]))
+        self.offsets[well] = base
+        self.send_offset(well)
+
+        scale = np.column_stack(
+            [
+                (centers[1] - centers[0]) / CALIBRATION_PROBE_STEPS,
+                (centers[2] - centers[0]) / CALIBRATION_PROBE_STEPS,
+            ]
+        )
+        if abs(np.linalg.det(scale)) < 1e-9:
+            raise CalibrationError(
+                "Testversatz bewegt das Bild nicht messbar, Maßstab unbestimmt."
+            )
+        log_message(
+            f"Maßstab (Pixel je Schritt): Spalte {scale[:, 0].round(4).tolist()}, "
+            f"Reihe {scale[:, 1].round(4).tolist()}",
+            "info",
+        )
+        return scale
+
+    def reference_well(self):
+        """Well nahe der Plattenmitte für die Maßstabsmessung."""
+        row = POSITIONS_ROW[(len(POSITIONS_ROW) - 1) // 2]
+        column = POSITIONS_COLUMN[(len(POSITIONS_COLUMN) - 1) // 2]
+        return f"{row}{column}"
+
+    def crop_fraction(self, results):
+        """
+        Ausschnitt, der den Well-Durchmesser samt Reserve und Restversatz
+        fasst, relativ zum Sensor (wie crop_rect ihn anwendet).
+        """
+        radii = [r["radius_px"] for r in results.values() if r is not None]
+        if not radii or self.sensor_px is None:
+            return None
+        residual = max(r["residual_px"] for r in results.values() if r is not None)
+        needed = 2 * float(np.median(radii)) * CALIBRATION_CROP_MARGIN + 2 * residual
+        needed *= self.sensor_px
+        return round(min(1.0, needed / min(self.sensor_resolution)), 3)
+
+    def full_field(self):
+        """
+        Konfiguriert die Kamera für die Dauer der Kalibrierung auf einen
+        Sensormodus, der den ganzen Sensor ausliest; der für den Ausschnitt
+        gewählte (z. B. 1332x990) zeigt nur dessen Mitte.
+        """
+        self.manager.camera.reconfigure(
+            still_configuration(1.0), priority=PRIORITY_MANUAL
+        ).result(timeout=CAMERA_TIMEOUT)
+
+    def run(self):
+        """Kalibriert alle Wells und speichert das Ergebnis für den Plattentyp."""
+        if self.manager.polling_active:
+            raise CalibrationError("Kalibrierung während eines Laufs nicht möglich!")
+        if self.manager.picam is None:
+            raise CalibrationError("Kamera nicht initialisiert!")
+
+        log_message(f"Starte Well-Kalibrierung ({self.plate_type})...", "info")
+        if not SENSOR_MODE_SELECTION:
+            return self.calibrate()
+        self.full_field()
+        try:
+            return self.calibrate()
+        finally:
+            # Zurück zum Sensormodus des Laufs
+            self.manager.configure_camera()
+
+    def calibrate(self):
+        """Zentriert alle Wells in mehreren Durchgängen und speichert das Ergebnis."""
+        from packages.experiments import plan_batch
+
+        stored = well_offsets(self.plate_type)
+        self.offsets = {well: stored.get(well, (0, 0)) for well in WELLS}
+        for well in WELLS:
+            self.send_offset(well)
+
+        scale = self.measure_scale(self.reference_well())
+        inverse = np.linalg.inv(scale)
+
+        results = {}
+        pending = list(WELLS)
+        for iteration in range(CALIBRATION_ITERATIONS):
+            order = plan_batch(pending, self.position)
+            pending = []
+            for index, well in enumerate(order):
+                if self.job is not None:
+                    self.job.check_cancelled()
+                    self.job.report(
+                        (iteration + index / len(order)) / CALIBRATION_ITERATIONS,
+                        f"Durchgang {iteration + 1}: {well}",
+                    )
+                rim = self.locate(well)
+                if rim is None:
+                    log_message(f"Kalibrierung {well}: kein Rand erkannt.", "warning")
+                    results[well] = None
+                    continue
+
+                residual = math.hypot(rim["dy"], rim["dx"])
+                results[well] = {
+                    "residual_px": round(residual, 1),
+                    "radius_px": round(rim["radius"], 1),
+                    "contrast": round(rim["contrast"], 2),
+                }
+                self.manager.record_event(
+                    "calibration",
+                    well=well,
+                    iteration=iteration,
+                    dy=round(rim["dy"], 1),
+                    dx=round(rim["dx"], 1),
+                    radius=round(rim["radius"], 1),
+                )
+                if residual <= CALIBRATION_TOLERANCE_PX:
+                    continue
+
+                # Schritte, die die Well-Mitte in die Bildmitte schieben
+                step_column, step_row = -inverse @ np.array([rim["dy"], rim["dx"]])
+                column, row = self.offsets[well]
+                self.offsets[well] = (
+                    column + int(round(step_column)),
+                    row + int(round(step_row)),
+                )
+                self.send_offset(well)
+                pending.append(well)
+            if not pending:
+                break
+
+        self.send_and_wait("HOME", "HOME_POSITION", EXPERIMENT_MOVE_TIMEOUT)
+        self.position = (0, 0)
+
+        if pending:
+            log_message(f"Nicht vollständig zentriert: {', '.join(pending)}", "warning")
+        calibration = {
+            "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "crop_fraction": self.crop_fraction(results),
+            "scale_px_per_step": scale.round(6).tolist(),
+            "wells": {
+                well: dict(
+                    results.get(well) or {},
+                    column=self.offsets[well][0],
+                    row=self.offsets[well][1],
+                )
+                for well in WELLS
+            },
+        }
+        save_calibration(self.plate_type, calibration)
+        log_message(
+            f"Kalibrierung abgeschlossen, Ausschnitt {calibration['crop_fraction']}. "
+            "Die Positionstabelle gilt sofort und wird beim nächsten Hochladen "
+            "in die config.h übernommen.",
+            "info",
+        )
+        return calibration
@@ -21,6 +21,8 @@ setup(
     package_data={"": ["firmware/*.ino"]},
     install_requires=[
         "pyserial",
+        "numpy",
+        "Pillow",
         "setuptools",
     ],
     entry_points={
@@ -15,17 +15,25 @@
 #define ENA_PIN_ROW 11
 
 // Motoreinstellungen 
-#define MAX_SPEED 8000
-#define ACCEL 3200
-#define STEPS_BASE_VALUE 200
-#define MICROSTEPS_PER_STEP 16
-#define DISTANCE_COLS 1.2
-#define DISTANCE_ROWS 0.24
+// Bewegungsprofil je Achse (aus motion_profile.json, sonst Standardwerte)
+#define MAX_SPEED_COLUMN {{MAX_SPEED_COLUMN_PLACEHOLDER}}
+#define ACCEL_COLUMN {{ACCEL_COLUMN_PLACEHOLDER}}
+#define MAX_SPEED_ROW {{MAX_SPEED_ROW_PLACEHOLDER}}
+#define ACCEL_ROW {{ACCEL_ROW_PLACEHOLDER}}
+// Mechanik (aus packages/config.py)
+#define STEPS_BASE_VALUE {{STEPS_BASE_VALUE_PLACEHOLDER}}
+#define MICROSTEPS_PER_STEP {{MICROSTEPS_PER_STEP_PLACEHOLDER}}
+#define DISTANCE_COLS {{DISTANCE_COLS_PLACEHOLDER}}
+#define DISTANCE_ROWS {{DISTANCE_ROWS_PLACEHOLDER}}
 
 // Brunnenplatte
 #define COLUMNS 6
 #define ROWS 4
 
+// Korrektur je Well in Schritten [Reihe][Spalte] (aus well_calibration.json)
+#define WELL_OFFSETS_COLUMN {{WELL_OFFSETS_COLUMN_PLACEHOLDER}}
+#define WELL_OFFSETS_ROW {{WELL_OFFSETS_ROW_PLACEHOLDER}}
+
 // Laufeinstellungen
 #define REPEATS {{REPEATS_PLACEHOLDER}}
 #define PAUSE_MS {{PAUSE_PLACEHOLDER}}
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+"""
+Abgleich nach einem Verbindungsabbruch, über die Wiedergabe mit dem echten
+LinkSupervisor (python -m pytest tests).
+"""
+
+import json
+
+import pytest
+
+# packages.logger liest die RTC, die Module gibt es nur auf dem Raspberry Pi
+pytest.importorskip("board")
+pytest.importorskip("adafruit_ds3231")
+
+from packages.config import TOTAL_STATIONS  # noqa: E402
+from packages.serial_transcript import replay_transcript  # noqa: E402
+
+LAST = TOTAL_STATIONS - 1
+
+
+class Script:
+    """Baut ein Transkript aus Antworten der Firmware und erwarteten Befehlen."""
+
+    def __init__(self, repeats=2, pause_minutes=1):
+        self.t = 0.0
+        self.lines = [
+            {"type": "header", "version": 1, "started": 1760000000.0},
+            {
+                "t": 0.0,
+                "dir": "event",
+                "event": "run_start",
+                "repeats": repeats,
+                "pause_minutes": pause_minutes,
+            },
+        ]
+        self.tx("START")
+
+    def add(self, direction, seconds=0.0, **fields):
+        self.t += seconds
+        self.lines.append({"t": self.t, "dir": direction, **fields})
+
+    def rx(self, frame, seconds=0.5):
+        self.add("rx", seconds, data=f"<{frame}>\r\n")
+
+    def tx(self, command, seconds=0.0):
+        self.add("tx", seconds, data=command + "\n")
+
+    def stations(self, first, last):
+        """Stationen first..last eines Cycles wie im störungsfreien Lauf."""
+        for station in range(first, last + 1):
+            self.rx("MOVE_COMPLETED", 1.5)
+            if station < LAST:
+                self.tx("NEXT_MOVE")
+
+    def outage(self, state, probes=1):
+        """
+        Abbruch, Wiederverbindung und Antwort der Firmware auf STATUS; nach
+        einem Neustart verwirft der Bootloader die ersten STATUS (probes).
+        """
+        self.add("error", 1.0, data="device reports readiness to read")
+        self.add("event", 5.0, event="reattach", port="/dev/ttyACM1")
+        self.tx("STATUS")
+        for _ in range(probes - 1):
+            self.tx("STATUS", 1.0)
+        self.rx(state)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for entry in self.lines:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return str(path)
+
+
+def replay(tmp_path, script):
+    report = replay_transcript(script.write(tmp_path / "transcript.jsonl"))
+    assert report["divergences"] == []
+    assert report["unconsumed_events"] == 0
+    assert report["journal_events"]["link_lost"] == 1
+    return report
+
+
+def finish(script, station):
+    """Rest des Laufs ab station im ersten von zwei Cycles."""
+    script.stations(station, LAST)
+    script.rx("CYCLE_COMPLETED", 4.0)
+    script.tx("NEXT_CYCLE")
+    script.rx("MOVE_COMPLETED", 60.0)
+    script.tx("NEXT_MOVE")
+    script.stations(1, LAST)
+    script.rx("CYCLE_COMPLETED", 4.0)
+    script.tx("END")
+
+
+def test_firmware_restarted_resumes(tmp_path):
+    script = Script()
+    script.stations(0, 5)
+    script.outage("STATE_IDLE_0_0_5", probes=3)
+    script.tx("RESUME_0_6_0")
+    script.rx("RESUMED")
+    finish(script, 6)
+
+    report = replay(tmp_path, script)
+    assert report["captures"] == 2 * TOTAL_STATIONS
+    assert report["journal_events"]["link_restored"] == 1
+    assert report["journal_events"]["run_end"] == 1
+
+
+def test_lost_move_completed_is_taken_over(tmp_path):
+    script = Script()
+    script.stations(0, 5)
+    # Station 6 ist angefahren, MOVE_COMPLETED ging verloren
+    script.outage("STATE_MOVE_0_6_6")
+    script.tx("NEXT_MOVE")
+    finish(script, 7)
+
+    report = replay(tmp_path, script)
+    assert report["captures"] == 2 * TOTAL_STATIONS
+    assert "stations_skipped" not in report["journal_events"]
+
+
+def test_lost_next_move_is_repeated(tmp_path):
+    script = Script()
+    script.stations(0, 5)
+    # NEXT_MOVE nach Station 5 kam nicht an, die Firmware wartet noch dort
+    script.outage("STATE_MOVE_0_5_5")
+    script.tx("NEXT_MOVE")
+    finish(script, 6)
+
+    report = replay(tmp_path, script)
+    assert report["captures"] == 2 * TOTAL_STATIONS
+
+
+def test_lost_next_cycle_is_repeated_with_remaining_pause(tmp_path):
+    script = Script()
+    script.stations(0, LAST)
+    script.rx("CYCLE_COMPLETED", 4.0)
+    script.tx("NEXT_CYCLE")
+    # Abbruch 1 s + Wiederverbindung 5 s + Antwort 0,5 s nach NEXT_CYCLE
+    script.outage(f"STATE_CYCLE_0_{LAST}_{TOTAL_STATIONS}")
+    script.tx("NEXT_CYCLE_53500")
+    script.rx("MOVE_COMPLETED", 53.5 + 1.5)
+    script.tx("NEXT_MOVE")
+    script.stations(1, LAST)
+    script.rx("CYCLE_COMPLETED", 4.0)
+    script.tx("END")
+
+    report = replay(tmp_path, script)
+    assert report["captures"] == 2 * TOTAL_STATIONS
+    assert report["cycles_completed"] == 2
+
+
+def test_firmware_moved_on_records_gap(tmp_path):
+    script = Script()
+    script.stations(0, 5)
+    # Die Firmware ist ohne NEXT_MOVE bis Station 9 weitergefahren
+    script.outage("STATE_MOVE_0_9_9")
+    script.tx("NEXT_MOVE")
+    finish(script, 10)
+
+    report = replay(tmp_path, script)
+    assert report["captures"] == 2 * TOTAL_STATIONS - 3
+    assert report["journal_events"]["stations_skipped"] == 1
+
+
+def test_unknown_park_position_ends_run(tmp_path):
+    script = Script()
+    script.stations(0, 5)
+    script.outage("STATE_IDLE_0_0_-1")
+
+    report = replay(tmp_path, script)
+    assert report["captures"] == 6
+    assert report["journal_events"]["link_failed"] == 1
+    assert report["journal_events"]["run_end"] == 1
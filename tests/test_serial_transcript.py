@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""Wiedergabe aufgezeichneter Transkripte (python -m pytest tests)."""
+
+import os
+
+import pytest
+
+# packages.logger liest die RTC, die Module gibt es nur auf dem Raspberry Pi
+pytest.importorskip("board")
+pytest.importorskip("adafruit_ds3231")
+
+from packages.serial_transcript import (SerialRecorder,  # noqa: E402
+                                        load_transcript, replay_transcript,
+                                        synthesize_transcript,
+                                        transcript_segments)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def test_replay_reproduces_recorded_commands():
+    report = replay_transcript(os.path.join(FIXTURES, "transcript_2_cycles.jsonl"))
+
+    assert report["divergences"] == []
+    assert report["commands_sent"] == report["commands_expected"] == 49
+    assert report["unconsumed_events"] == 0
+    assert report["cycles_completed"] == 2
+    assert report["captures"] == 48
+    assert report["journal_events"]["run_end"] == 1
+
+
+def test_replay_reuses_recorded_cadence(tmp_path):
+    path = str(tmp_path / "cadence.jsonl")
+    synthesize_transcript(path, 3, 60000, cadence_ms=[95123, 42001])
+    report = replay_transcript(path)
+
+    assert report["divergences"] == []
+    assert report["cycles_completed"] == 3
+    assert report["journal_events"]["cadence"] == 2
+
+
+class LoopConnection:
+    is_open = True
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def test_recorder_rotates_and_replays_segments(tmp_path):
+    path = str(tmp_path / "transcript.jsonl")
+    recorder = SerialRecorder(LoopConnection(), path, max_bytes=2000, keep_segments=3)
+    for index in range(200):
+        recorder.write(f"NEXT_MOVE_{index}\n".encode())
+    recorder.close()
+
+    segments = transcript_segments(path)
+    assert len(segments) == 3
+    assert os.path.getsize(path) < 2000
+    header, events = load_transcript(path)
+    assert header["started"] == recorder.started
+    # Die ältesten Segmente sind gelöscht, der Rest ist lückenlos
+    commands = [int(e["data"].split("_")[-1]) for e in events if e["dir"] == "tx"]
+    assert commands == list(range(commands[0], 200))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Status-Server auf localhost (python -m pytest tests)."""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+# packages.logger liest die RTC, die Module gibt es nur auf dem Raspberry Pi
+pytest.importorskip("board")
+pytest.importorskip("adafruit_ds3231")
+Image = pytest.importorskip("PIL.Image")
+
+from packages.status_server import StatusServer  # noqa: E402
+
+
+class FakeManager:
+    def __init__(self, latest_images):
+        self.latest_images = latest_images
+        self.polling_active = True
+        self.eta = None
+        self.run_id = "run_test"
+        self.aborted = False
+
+    def get_current_cycle_count(self):
+        return 1
+
+    def get_current_move_count(self):
+        return 5
+
+    def abort_run(self):
+        self.aborted = True
+        self.polling_active = False
+
+
+@pytest.fixture
+def server(tmp_path):
+    good = tmp_path / "good.jpg"
+    Image.new("RGB", (640, 480), (40, 120, 40)).save(good)
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"kein JPEG")
+    manager = FakeManager(
+        {"A1": str(good), "A2": str(broken), "A3": str(tmp_path / "missing.jpg")}
+    )
+    status_server = StatusServer(manager, host="127.0.0.1", port=0, token="geheim")
+    status_server.start()
+    yield status_server
+    status_server.stop()
+
+
+def fetch(server, path, method="GET", headers=None):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}{path}", method=method, headers=headers or {}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers["Content-Type"], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], e.read()
+
+
+def test_state_and_index(server):
+    status, content_type, body = fetch(server, "/api/state")
+    assert status == 200
+    assert content_type == "application/json"
+    state = json.loads(body)
+    assert state["run_id"] == "run_test"
+    assert (state["cycle"], state["move"]) == (1, 5)
+    assert set(state["latest_images"]) == {"A1", "A2"}
+
+    status, content_type, _ = fetch(server, "/")
+    assert status == 200
+    assert content_type.startswith("text/html")
+
+
+def test_thumbnails(server):
+    status, content_type, body = fetch(server, "/thumbnails/A1")
+    assert (status, content_type) == (200, "image/jpeg")
+    assert body[:2] == b"\xff\xd8"
+
+    # Unlesbares Bild, gelöschtes Bild, Well ohne Aufnahme, unbekanntes Well
+    assert fetch(server, "/thumbnails/A2")[0] == 500
+    assert fetch(server, "/thumbnails/A3")[0] == 404
+    assert fetch(server, "/thumbnails/B1")[0] == 404
+    assert fetch(server, "/thumbnails/Z9")[0] == 404
+
+
+def test_abort_needs_token(server):
+    assert fetch(server, "/api/abort")[0] == 405
+    assert fetch(server, "/api/abort", method="POST")[0] == 403
+    status, _, _ = fetch(
+        server, "/api/abort", method="POST", headers={"X-Paparazzo-Token": "geheim"}
+    )
+    assert status == 200
+    assert server.manager.aborted
+    assert not server.manager.polling_active
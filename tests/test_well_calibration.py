@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Randerkennung der Well-Kalibrierung (python -m pytest tests)."""
+
+import pytest
+
+# packages.logger liest die RTC, die Module gibt es nur auf dem Raspberry Pi
+pytest.importorskip("board")
+pytest.importorskip("adafruit_ds3231")
+np = pytest.importorskip("numpy")
+
+from packages.config import CALIBRATION_TOLERANCE_PX  # noqa: E402
+from packages.well_calibration import (WellCalibrator,  # noqa: E402
+                                       find_well_rim)
+
+
+def well_image(height, width, cy, cx, radius, seed):
+    """Helles Well mit dunklem Rand auf grauem Grund, verrauscht."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.indices((height, width))
+    distance = np.hypot(yy - cy, xx - cx)
+    image = np.full((height, width), 60.0)
+    image[distance < radius] = 170
+    image[(distance >= radius) & (distance < radius + 6)] = 30
+    image += rng.normal(0, 8, (height, width))
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_rim_offset_below_tolerance(seed):
+    # Suchbild 16-fach verkleinert: ein Rasterpunkt entspräche 8 Pixeln
+    height, width = 3040, 4056
+    rng = np.random.default_rng(100 + seed)
+    dy, dx = rng.uniform(-60, 60, 2)
+    radius = rng.uniform(800, 1000)
+    image = well_image(
+        height, width, (height - 1) / 2 + dy, (width - 1) / 2 + dx, radius, seed
+    )
+
+    rim = find_well_rim(image)
+
+    assert rim is not None
+    assert np.hypot(rim["dy"] - dy, rim["dx"] - dx) < CALIBRATION_TOLERANCE_PX / 2
+    assert abs(rim["radius"] - radius) < CALIBRATION_TOLERANCE_PX
+
+
+def test_no_rim_in_noise():
+    image = np.random.default_rng(1).integers(0, 255, (760, 1014)).astype(np.uint8)
+    assert find_well_rim(image) is None
+
+
+def test_crop_fraction_relative_to_sensor():
+    # Dasselbe Well (Radius 1014, Restversatz 13,5 Sensorpixel) im Vollbild
+    # 1200x900 und im gebinnten Modus 1332x990, der nur 2664 Pixel Breite zeigt
+    fractions = []
+    for sensor_px in (4056 / 1200, 2664 / 1332):
+        calibrator = WellCalibrator(manager=None)
+        calibrator.sensor_resolution = (4056, 3040)
+        calibrator.sensor_px = sensor_px
+        results = {
+            "A1": {"radius_px": 1014 / sensor_px, "residual_px": 13.5 / sensor_px},
+            "A2": None,
+        }
+        fractions.append(calibrator.crop_fraction(results))
+
+    assert fractions[0] == pytest.approx(fractions[1], abs=1e-3)
+    assert 2 * 1014 / 3040 < fractions[0] < 1.0